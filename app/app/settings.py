@@ -43,9 +43,13 @@ INSTALLED_APPS = [
     'core',
     'user',
     'recipe',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryInspectionMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,6 +93,38 @@ DATABASES = {
     }
 }
 
+# Recipes, tags and ingredients are split by user across these aliases, from
+# DB_SHARDS=shard1,shard2 with DB_SHARD1_HOST and so on. Empty keeps every
+# user on the default database.
+DATABASE_SHARDS = [alias for alias in os.environ.get('DB_SHARDS', '').split(',')
+                   if alias]
+for alias in DATABASE_SHARDS:
+    DATABASES.setdefault(alias, {
+        **DATABASES['default'],
+        'HOST': os.environ.get(f'DB_{alias.upper()}_HOST'),
+        'NAME': os.environ.get(f'DB_{alias.upper()}_NAME',
+                               DATABASES['default']['NAME']),
+    })
+DATABASE_ROUTERS = ['core.routers.ShardRouter']
+
+# Gap between the id sequences of shards, so rows keep their ids when moved
+SHARD_ID_SPACING = 10 ** 12
+
+
+# Set CACHE_LOCATION to share the cache between worker processes, which
+# idempotency keys, cached responses and autocomplete invalidation rely on
+# once more than one process serves requests
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.environ.get('CACHE_LOCATION'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': os.environ['CACHE_LOCATION'],
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -137,4 +173,94 @@ STATIC_ROOT = '/vol/web/static'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'core.User'
+
+# Seconds to cache the per user recipe facet counts, 0 disables caching
+RECIPE_FACETS_CACHE_TIMEOUT = int(
+    os.environ.get('RECIPE_FACETS_CACHE_TIMEOUT', 0)
+)
+
+# Seconds list and facet reads without query params stay cached, 0
+# disables caching. Entries are keyed by the users change sequence
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 0))
+
+# Warm the response cache after login, '' to disable, 'thread' to warm in
+# the web process or 'queue' for a job, which needs a shared cache.
+# Warm-ups start no read after the budget in seconds
+LOGIN_WARMUP = os.environ.get('LOGIN_WARMUP', '')
+LOGIN_WARMUP_BUDGET = 2
+LOGIN_WARMUP_CONCURRENCY = 2
+
+# Per process autocomplete prefix indexes, users with more names than
+# AUTOCOMPLETE_MAX_ENTRIES are served by a database prefix query
+AUTOCOMPLETE_MAX_INDEXES = 256
+AUTOCOMPLETE_MAX_ENTRIES = 20000
+
+# Idempotency-Key handling for retried writes, all values in seconds
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# Per route request metrics exposed at /metrics/, off unless enabled
+METRICS_ENABLED = bool(int(os.environ.get('METRICS_ENABLED', 0)))
+
+# Share of requests checked for N+1 and slow queries, 0 disables checks
+QUERY_INSPECTION_SAMPLE_RATE = float(
+    os.environ.get('QUERY_INSPECTION_SAMPLE_RATE', 1 if DEBUG else 0)
+)
+QUERY_N_PLUS_ONE_THRESHOLD = 5
+SLOW_QUERY_SECONDS = 0.1
+
+# Stack sampling profiler for sampled requests or a signed X-Profile header
+PROFILING_ENABLED = bool(int(os.environ.get('PROFILING_ENABLED', 0)))
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_ROUTES = []
+PROFILING_INTERVAL = 0.005
+PROFILING_DIR = os.environ.get('PROFILING_DIR', '/vol/web/profiles')
+PROFILING_MAX_PROFILES = 200
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
+# Threads running ORM work of the async views under ASGI
+ASYNC_VIEW_THREADS = int(os.environ.get('ASYNC_VIEW_THREADS', 8))
+
+# Background job queue, durations in seconds
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BASE_DELAY = 10
+JOBS_RETRY_MAX_DELAY = 60 * 60
+JOBS_POLL_INTERVAL = 1
+# Running jobs refresh a heartbeat and are requeued once it is this old
+JOBS_HEARTBEAT_INTERVAL = 30
+JOBS_LOCK_TIMEOUT = 5 * 60
+JOBS_KEEP_FINISHED = 7 * 24 * 60 * 60
+
+# Rows deleted per transaction when purging a user, and pause in seconds
+USER_PURGE_BATCH_SIZE = 500
+USER_PURGE_PAUSE = 0
+
+# Change feed for offline clients, tombstones kept for CHANGELOG_TOMBSTONE_TTL
+# seconds before clients behind them have to sync from scratch
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_MAX_PAGE_SIZE = 1000
+CHANGELOG_TOMBSTONE_TTL = 30 * 24 * 60 * 60
+
+# Similar recipes, scored by weighted Jaccard over ingredients and tags
+SIMILAR_RECIPES_INGREDIENT_WEIGHT = 1.0
+SIMILAR_RECIPES_TAG_WEIGHT = 0.5
+SIMILAR_RECIPES_MAX_INDEXES = 64
+SIMILAR_RECIPES_MAX_DELTA = 1000
+
+# Batch endpoint limits, threads serve concurrent reads of batches
+BATCH_MAX_REQUESTS = 20
+BATCH_THREADS = int(os.environ.get('BATCH_THREADS', 4))
+
+# Admin change lists count up to this many rows, larger tables are estimated
+ADMIN_COUNT_LIMIT = 10000
+
+# Seconds writes of a user moving between shards are held off before the
+# final sync, letting requests that passed the check finish
+SHARD_MOVE_GRACE = 5
+
+# Resumable recipe image uploads, sizes in bytes. Sessions expire after
+# IMAGE_UPLOAD_TTL seconds without receiving a chunk
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+IMAGE_UPLOAD_MAX_CHUNK = 8 * 1024 * 1024
+IMAGE_UPLOAD_TTL = 24 * 60 * 60
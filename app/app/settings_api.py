@@ -0,0 +1,54 @@
+"""
+Settings for workers serving only the API.
+
+Run them with DJANGO_SETTINGS_MODULE=app.settings_api. The admin, sessions,
+messages and static files are left out so each worker imports and keeps
+less, and clients authenticate with tokens only, which need no CSRF check.
+"""
+
+from app.settings import *  # noqa: F401,F403
+from app.settings import INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+API_UNUSED_APPS = (
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+)
+API_UNUSED_CONTEXT_PROCESSORS = (
+    'django.contrib.messages.context_processors.messages',
+)
+API_UNUSED_MIDDLEWARE = (
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+)
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS
+                  if app not in API_UNUSED_APPS]
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE
+              if middleware not in API_UNUSED_MIDDLEWARE]
+
+ROOT_URLCONF = 'app.urls_api'
+
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'context_processors': [
+            processor
+            for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+            if processor not in API_UNUSED_CONTEXT_PROCESSORS
+        ],
+    },
+}]
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework.authentication.TokenAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+    ),
+}
@@ -0,0 +1,17 @@
+"""API URL Configuration
+
+Every route except the admin, served alone by workers running with
+app.settings_api.
+"""
+from django.urls import path, include
+from django.conf.urls.static import static
+from django.conf import settings
+
+from core.views import BatchView, MetricsView
+
+urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('api/batch/', BatchView.as_view(), name='batch'),
+    path('api/user/', include('user.urls')),
+    path('api/recipe/', include('recipe.urls')),
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
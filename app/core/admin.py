@@ -1,8 +1,319 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.utils import unquote
+from django.contrib.admin.views.main import ALL_VAR, ORDER_VAR, ChangeList
+from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import HttpResponseRedirect
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 from django.utils.translation import gettext as _
 
 from core import models
+from core.purge import schedule_user_purge
+from core.routers import hash_shard, shard_for_user, use_shard
+
+CURSOR_VAR = 'cursor'
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that avoids exact counts of large tables
+
+    Unfiltered PostgreSQL tables use the planner's row estimate once it is
+    over ADMIN_COUNT_LIMIT. Other counts stop at ADMIN_COUNT_LIMIT.
+    """
+    count_is_estimate = False
+    count_is_capped = False
+
+    def _estimated_rows(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if queryset.query.where or connection.vendor != 'postgresql':
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+
+        return row[0] if row else None
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        estimate = self._estimated_rows()
+        if estimate is not None and estimate > limit:
+            self.count_is_estimate = True
+            return estimate
+
+        count = self.object_list[:limit + 1].count()
+        if count > limit:
+            self.count_is_capped = True
+            return limit
+
+        return count
+
+
+class KeysetChangeList(ChangeList):
+    """Change list paging by primary key in the default -pk ordering
+
+    Each page starts below the last primary key of the previous page, so
+    deep pages cost the same as the first. Sorting by a column falls back
+    to numbered pages.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.keyset = False
+        self.next_page_url = None
+        super().__init__(request, *args, **kwargs)
+        self.params.pop(CURSOR_VAR, None)
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+
+        return params
+
+    def get_results(self, request):
+        if ORDER_VAR in self.params or ALL_VAR in self.params:
+            return super().get_results(request)
+
+        queryset = self.queryset
+        if self.cursor:
+            try:
+                queryset = queryset.filter(pk__lt=int(self.cursor))
+            except ValueError:
+                raise IncorrectLookupParameters
+
+        result_list = queryset[:self.list_per_page]
+        rows = list(result_list)
+        if (len(rows) == self.list_per_page and
+                queryset.filter(pk__lt=rows[-1].pk).exists()):
+            self.next_page_url = self.get_query_string(
+                {CURSOR_VAR: rows[-1].pk}
+            )
+
+        self.paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        self.result_count = self.paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.next_page_url)
+        self.keyset = True
+
+
+class UserFilter(admin.SimpleListFilter):
+    """Filter by owner id, linked from the owner column
+
+    Only the selected user is listed, listing every user does not scale.
+    """
+    title = _('user')
+    parameter_name = 'user'
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if not value or not value.isdigit():
+            return []
+
+        email = get_user_model().objects.filter(
+            pk=value
+        ).values_list('email', flat=True).first()
+
+        return [(value, email)] if email else []
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value is None:
+            return queryset
+        if not value.isdigit():
+            raise IncorrectLookupParameters
+
+        return queryset.filter(user_id=value)
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """Pick the database shard listed, shown when sharding is on"""
+    title = _('shard')
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in settings.DATABASE_SHARDS]
+
+    def choices(self, changelist):
+        selected = self.value() or request_shard(
+            changelist.model, changelist.params
+        )
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == selected,
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: alias}, [CURSOR_VAR]
+                ),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        # Routed by the changelist view, see ScalableAdmin
+        if self.value() not in (None, *settings.DATABASE_SHARDS):
+            raise IncorrectLookupParameters
+
+        return queryset
+
+
+def _user_shard(user_id, assign=False):
+    if (not settings.DATABASE_SHARDS or not user_id or
+            not str(user_id).isdigit()):
+        return None
+    if assign and get_user_model().objects.filter(pk=user_id).exists():
+        return shard_for_user(int(user_id))
+
+    return models.ShardAssignment.objects.filter(
+        user_id=user_id
+    ).values_list('alias', flat=True).first() or hash_shard(user_id)
+
+
+def request_shard(model, params, object_id=None):
+    """Return the shard an admin view of model works on
+
+    That is the shard holding the object, the one picked in the shard
+    filter, the one of the owner filtered or posted, or the first one.
+    """
+    shards = settings.DATABASE_SHARDS
+    if not shards:
+        return None
+
+    if object_id is not None:
+        for alias in shards:
+            try:
+                if model._default_manager.using(alias).filter(
+                        pk=unquote(object_id)).exists():
+                    return alias
+            except (ValueError, ValidationError):
+                return None
+        return None
+
+    if params.get(ShardFilter.parameter_name) in shards:
+        return params[ShardFilter.parameter_name]
+
+    return (_user_shard(params.get(UserFilter.parameter_name)) or
+            shards[0])
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Admin for large user owned tables
+
+    Avoids exact counts, joins the owner in the list query, uses raw id
+    widgets instead of listing every related row and pages by cursor.
+    Searches for a number match the id, searches for an email the owner.
+    Views run on a single database shard, picked by request_shard.
+    """
+    ordering = ('-id',)
+    list_per_page = 50
+    list_select_related = ('user',)
+    list_filter = (ShardFilter, UserFilter)
+    raw_id_fields = ('user',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    change_list_template = 'admin/core/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def refuse_while_moving(self, request, shard, object_ids=()):
+        """Send a POST back if it writes data of a user being moved
+
+        Writes to the shard a user is moved from would be lost, the API
+        refuses them in UserShardMixin. Actions on all rows are refused
+        while any user on the shard moves.
+        """
+        if request.method != 'POST' or not shard:
+            return None
+
+        moving = models.ShardAssignment.objects.filter(alias=shard,
+                                                       moving=True)
+        if request.POST.get('select_across') != '1':
+            try:
+                owners = set(self.model._default_manager.using(shard).filter(
+                    pk__in=[unquote(pk) for pk in object_ids]
+                ).values_list('user_id', flat=True))
+            except (ValueError, ValidationError):
+                owners = set()
+            posted = request.POST.get('user', '')
+            if posted.isdigit():
+                owners.add(int(posted))
+            moving = moving.filter(user_id__in=owners)
+        if not moving.exists():
+            return None
+
+        self.message_user(request, _('The data of this user is being moved '
+                                     'between shards, try again shortly.'),
+                          messages.ERROR)
+        return HttpResponseRedirect(request.get_full_path())
+
+    def changelist_view(self, request, extra_context=None):
+        shard = request_shard(self.model, request.GET)
+        refused = self.refuse_while_moving(
+            request, shard, request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)
+        )
+        if refused:
+            return refused
+        with use_shard(shard):
+            return super().changelist_view(request, extra_context)
+
+    def changeform_view(self, request, object_id=None, form_url='',
+                        extra_context=None):
+        if object_id is None:
+            shard = _user_shard(request.POST.get('user'), assign=True)
+        else:
+            shard = request_shard(self.model, request.GET, object_id)
+        refused = self.refuse_while_moving(request, shard,
+                                           [object_id] if object_id else [])
+        if refused:
+            return refused
+        with use_shard(shard):
+            return super().changeform_view(request, object_id, form_url,
+                                           extra_context)
+
+    def delete_view(self, request, object_id, extra_context=None):
+        shard = request_shard(self.model, request.GET, object_id)
+        refused = self.refuse_while_moving(request, shard, [object_id])
+        if refused:
+            return refused
+        with use_shard(shard):
+            return super().delete_view(request, object_id, extra_context)
+
+    def history_view(self, request, object_id, extra_context=None):
+        with use_shard(request_shard(self.model, request.GET, object_id)):
+            return super().history_view(request, object_id, extra_context)
+
+    def owner(self, obj):
+        return format_html('<a href="?{}={}">{}</a>',
+                           UserFilter.parameter_name, obj.user_id,
+                           obj.user.email)
+    owner.short_description = _('user')
+    owner.admin_order_field = 'user_id'
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if search_term.isdigit():
+            return queryset.filter(pk=int(search_term)), False
+        if '@' in search_term:
+            return queryset.filter(user__email=search_term), False
+
+        return super().get_search_results(request, queryset, search_term)
 
 
 class UserAdmin(BaseUserAdmin):
@@ -24,8 +335,30 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+    def get_deleted_objects(self, objs, request):
+        """List only the users, their data is purged in the background"""
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        schedule_user_purge(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            schedule_user_purge(user)
+
+
+class UserAttrAdmin(ScalableAdmin):
+    list_display = ('id', 'name', 'owner')
+    search_fields = ('^name',)
+
+
+class RecipeAdmin(ScalableAdmin):
+    list_display = ('id', 'title', 'owner', 'price', 'time_minutes')
+    search_fields = ('^title',)
+    raw_id_fields = ('user', 'tags', 'ingredients')
+
 
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredients)
-admin.site.register(models.Recipe)
+admin.site.register(models.Tag, UserAttrAdmin)
+admin.site.register(models.Ingredients, UserAttrAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
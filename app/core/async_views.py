@@ -0,0 +1,128 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import QuerySet
+from django.http import Http404, HttpResponse
+
+from rest_framework import exceptions, status
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from core.profiling import follow_thread
+from core.routers import shard_for_user, use_shard
+
+# QuerySets can be iterated with "async for" from Django 4.1 onwards
+HAS_ASYNC_ORM = hasattr(QuerySet, '__aiter__')
+
+_executor = None
+
+
+def get_executor():
+    """Return the thread pool running blocking work of async views"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_VIEW_THREADS,
+            thread_name_prefix='async-view',
+        )
+
+    return _executor
+
+
+def _call_closing_connections(func, *args):
+    try:
+        with follow_thread():
+            return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(func, *args):
+    """Run blocking code, usually ORM access, in the sized thread pool
+
+    Unlike sync_to_async(thread_sensitive=True), calls from concurrent
+    requests run in parallel instead of queueing on one thread. The call
+    sees the context variables of the caller, like the database shard and
+    the query wrappers and profiler of the request.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(),
+        functools.partial(context.run, _call_closing_connections, func, *args)
+    )
+
+
+async def fetch_values(queryset, *fields):
+    """Return rows of a queryset as dicts using async ORM when available"""
+    queryset = queryset.values(*fields)
+    if HAS_ASYNC_ORM:
+        return [row async for row in queryset]
+
+    return await run_sync(list, queryset)
+
+
+def _token_user(key):
+    try:
+        token = Token.objects.select_related('user').get(key=key)
+    except Token.DoesNotExist:
+        return None
+
+    return token.user if token.user.is_active else None
+
+
+async def authenticate(request):
+    """Return the user of the request's token, None when missing/invalid"""
+    keyword, _, key = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if keyword != 'Token' or not key or ' ' in key:
+        return None
+
+    return await run_sync(_token_user, key)
+
+
+def _render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status_code,
+                        content_type='application/json')
+
+
+def async_api_view(view):
+    """Turn an async function into a token authenticated read only endpoint
+
+    The wrapped function receives the request, the authenticated user and
+    the URL kwargs, and returns data rendered as JSON the way DRF would.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return _render({'detail': f'Method "{request.method}" not '
+                                      f'allowed.'},
+                           status.HTTP_405_METHOD_NOT_ALLOWED)
+
+        user = await authenticate(request)
+        if user is None:
+            response = _render(
+                {'detail': str(exceptions.NotAuthenticated.default_detail)},
+                status.HTTP_401_UNAUTHORIZED
+            )
+            response['WWW-Authenticate'] = 'Token'
+            return response
+        # Set like DRF does, for the middleware reading the user
+        request.user = user
+
+        try:
+            # Under WSGI the view runs on the event loop thread of
+            # async_to_sync, not on the thread the profiler started on
+            with follow_thread(), \
+                    use_shard(await run_sync(shard_for_user, user.pk)):
+                return _render(await view(request, user, *args, **kwargs))
+        except Http404:
+            return _render({'detail': str(exceptions.NotFound.default_detail)},
+                           status.HTTP_404_NOT_FOUND)
+        except exceptions.APIException as exc:
+            return _render(exc.detail, exc.status_code)
+
+    return wrapper
@@ -0,0 +1,153 @@
+import asyncio
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.http import Http404
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+# Request headers of the batch passed on to every sub-request
+INHERITED_META = ('SERVER_NAME', 'SERVER_PORT', 'REMOTE_ADDR', 'HTTP_HOST',
+                  'HTTP_AUTHORIZATION', 'HTTP_USER_AGENT')
+
+# Response headers returned for each sub-request
+RETURNED_HEADERS = ('Content-Type', 'Location', 'Allow',
+                    'Idempotent-Replayed')
+
+BATCH_URL_NAME = 'batch'
+
+_executor = None
+
+
+def get_executor():
+    """Return the thread pool running concurrent reads of batches"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BATCH_THREADS,
+            thread_name_prefix='batch',
+        )
+
+    return _executor
+
+
+def build_request(request, item):
+    """Return a sub-request authenticated as the user of the batch"""
+    url = urlsplit(item['path'])
+    body = b''
+    if item.get('body') is not None:
+        body = json.dumps(item['body']).encode()
+
+    environ = {key: request.META[key] for key in INHERITED_META
+               if key in request.META}
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': request.scheme,
+    })
+    for name, value in item.get('headers', {}).items():
+        environ[f'HTTP_{name.upper().replace("-", "_")}'] = value
+
+    sub_request = WSGIRequest(environ)
+    # DRF views use these instead of authenticating the request again
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+
+    return sub_request
+
+
+def _result(status_code, body, headers=None):
+    return {'status': status_code, 'headers': headers or {}, 'body': body}
+
+
+def _response_result(response):
+    if hasattr(response, 'render'):
+        response.render()
+
+    content_type = response.get('Content-Type', '')
+    if response.streaming:
+        body = None
+    elif 'json' in content_type and response.content:
+        body = json.loads(response.content)
+    else:
+        body = response.content.decode(response.charset, 'replace')
+
+    return _result(response.status_code, body, {
+        name: response[name] for name in RETURNED_HEADERS
+        if response.has_header(name)
+    })
+
+
+async def _wait(coroutine):
+    return await coroutine
+
+
+def dispatch(request):
+    """Run a sub-request through the URL resolver, skipping middleware"""
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return _result(404, {'detail': 'Not found.'})
+    if match.view_name == BATCH_URL_NAME:
+        return _result(400, {'detail': 'Batches cannot be nested.'})
+
+    request.resolver_match = match
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+        if asyncio.iscoroutine(response):
+            response = async_to_sync(_wait)(response)
+        return _response_result(response)
+    except Http404:
+        return _result(404, {'detail': 'Not found.'})
+    except Exception:
+        logger.exception('Batched request to %s failed', request.path)
+        return _result(500, {'detail': 'A server error occurred.'})
+
+
+def _dispatch_closing_connections(request):
+    try:
+        return dispatch(request)
+    finally:
+        close_old_connections()
+
+
+def run_batch(request, items, parallel=False):
+    """Return the result of every item, in order
+
+    Items run one after the other on the connection of the batch. With
+    parallel, consecutive GET items run concurrently in the batch thread
+    pool instead, each thread using its own connection.
+    """
+    sub_requests = [build_request(request, item) for item in items]
+    results = []
+    start = 0
+    while start < len(sub_requests):
+        end = start + 1
+        if parallel:
+            while (end < len(sub_requests) and
+                   sub_requests[start].method == 'GET' and
+                   sub_requests[end].method == 'GET'):
+                end += 1
+
+        if end - start > 1:
+            results.extend(get_executor().map(
+                _dispatch_closing_connections, sub_requests[start:end]
+            ))
+        else:
+            results.append(dispatch(sub_requests[start]))
+        start = end
+
+    return results
@@ -0,0 +1,139 @@
+import datetime
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from core.models import ChangeLog, ChangeSequence
+
+_state = threading.local()
+
+
+@contextmanager
+def muted():
+    """Stop recording changes in the current thread, e.g. while purging"""
+    previous = getattr(_state, 'muted', False)
+    _state.muted = True
+    try:
+        yield
+    finally:
+        _state.muted = previous
+
+
+def is_muted():
+    """Return whether changes are not recorded in the current thread"""
+    return getattr(_state, 'muted', False)
+
+
+def allocate(user_id, count=1):
+    """Reserve count sequence numbers of a user, returning the last one
+
+    The sequence row stays locked until the surrounding transaction ends.
+    """
+    sequences = ChangeSequence.objects.filter(user_id=user_id)
+    if not sequences.update(last_seq=F('last_seq') + count):
+        ChangeSequence.objects.get_or_create(user_id=user_id)
+        sequences.update(last_seq=F('last_seq') + count)
+
+    return sequences.values_list('last_seq', flat=True).get()
+
+
+def record(user_id, model, object_ids, deleted=False):
+    """Append changelog entries for objects of a user"""
+    object_ids = sorted(set(object_ids))
+    if not object_ids or is_muted():
+        return
+
+    with transaction.atomic(using=ChangeLog.objects.db):
+        first = allocate(user_id, len(object_ids)) - len(object_ids) + 1
+        ChangeLog.objects.bulk_create([
+            ChangeLog(user_id=user_id, seq=first + i, model=model,
+                      object_id=object_id, deleted=deleted)
+            for i, object_id in enumerate(object_ids)
+        ])
+
+
+def last_seq(user_id):
+    """Return the sequence number of a user's latest change"""
+    return ChangeSequence.objects.filter(
+        user_id=user_id
+    ).values_list('last_seq', flat=True).first() or 0
+
+
+def horizon(user_id):
+    """Return the cursor below which a user's tombstones were dropped"""
+    return ChangeSequence.objects.filter(
+        user_id=user_id
+    ).values_list('compacted_seq', flat=True).first() or 0
+
+
+def drop_superseded(batch_size=1000):
+    """Delete entries followed by a later entry for the same object
+
+    Walks the changelog in pages of ids, so each entry is checked once.
+    The latest entry of an object is never deleted, deleting in one page
+    does not change which entries of later pages are superseded.
+    """
+    superseded = ChangeLog.objects.filter(Exists(ChangeLog.objects.filter(
+        user_id=OuterRef('user_id'),
+        model=OuterRef('model'),
+        object_id=OuterRef('object_id'),
+        seq__gt=OuterRef('seq'),
+    )))
+    total = 0
+    last_id = 0
+    while True:
+        page = list(ChangeLog.objects.filter(
+            id__gt=last_id
+        ).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not page:
+            return total
+
+        ids = list(superseded.filter(
+            id__gt=last_id, id__lte=page[-1]
+        ).values_list('id', flat=True))
+        if ids:
+            total += ChangeLog.objects.filter(id__in=ids).delete()[0]
+        last_id = page[-1]
+
+
+def drop_tombstones(max_age=None, batch_size=1000):
+    """Delete old tombstones, moving each user's horizon past them
+
+    Clients syncing from before the horizon have missed a delete and must
+    download everything again.
+    """
+    if max_age is None:
+        max_age = settings.CHANGELOG_TOMBSTONE_TTL
+    cutoff = timezone.now() - datetime.timedelta(seconds=max_age)
+    expired = ChangeLog.objects.filter(deleted=True, created_at__lt=cutoff)
+
+    total = 0
+    while True:
+        batch = list(expired.order_by('id').values_list(
+            'id', 'user_id', 'seq'
+        )[:batch_size])
+        if not batch:
+            return total
+
+        horizons = {}
+        for _, user_id, seq in batch:
+            horizons[user_id] = max(seq, horizons.get(user_id, 0))
+
+        with transaction.atomic(using=ChangeLog.objects.db):
+            for user_id, seq in horizons.items():
+                ChangeSequence.objects.filter(
+                    user_id=user_id, compacted_seq__lt=seq
+                ).update(compacted_seq=seq)
+            total += ChangeLog.objects.filter(
+                id__in=[entry_id for entry_id, _, _ in batch]
+            ).delete()[0]
+
+
+def compact(max_age=None, batch_size=1000):
+    """Keep the latest entry per object and drop expired tombstones"""
+    return (drop_superseded(batch_size),
+            drop_tombstones(max_age, batch_size))
@@ -0,0 +1,120 @@
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+# Seconds a client is asked to wait before retrying an in-flight key
+RETRY_AFTER = 1
+
+
+def request_fingerprint(request):
+    """Return a digest identifying the method, path and payload"""
+    if hasattr(request.data, 'lists'):
+        items = request.data.lists()
+    else:
+        items = request.data.items()
+
+    payload = []
+    for key, values in items:
+        if not isinstance(values, list):
+            values = [values]
+        payload.append((key, [
+            (value.name, value.size) if hasattr(value, 'size') else value
+            for value in values
+        ]))
+
+    payload.sort(key=repr)
+    digest = hashlib.sha256(
+        repr((request.method, request.path, payload)).encode()
+    )
+    return digest.hexdigest()
+
+
+def _cache_keys(request, key):
+    owner = request.user.pk if request.user.is_authenticated else 'anon'
+    key_digest = hashlib.sha256(key.encode()).hexdigest()
+    base = f'idempotency:{owner}:{request.path}:{key_digest}'
+
+    return f'{base}:response', f'{base}:lock'
+
+
+def _replay(stored, fingerprint):
+    stored_fingerprint, status_code, data, headers = stored
+    if stored_fingerprint != fingerprint:
+        return Response(
+            {'detail': 'Idempotency-Key was used with a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    response = Response(data, status=status_code, headers=headers)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """Honour the Idempotency-Key header on a DRF view method
+
+    The first response for a key is stored for IDEMPOTENCY_KEY_TTL seconds
+    and replayed for retries without running the view again. A retry
+    arriving while the first request is still running gets a 409 with a
+    Retry-After header instead of executing the write a second time, the
+    worker is not held waiting for the first one. Server errors are not
+    stored, so they can be retried.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': 'Idempotency-Key is too long.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_fingerprint(request)
+        response_key, lock_key = _cache_keys(request, key)
+
+        stored = cache.get(response_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        if not cache.add(lock_key, fingerprint,
+                         settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            return Response(
+                {'detail': 'A request with this Idempotency-Key is '
+                           'still in progress.'},
+                status=status.HTTP_409_CONFLICT,
+                headers={'Retry-After': str(RETRY_AFTER)}
+            )
+
+        try:
+            # The first request may have finished between the read above
+            # and taking the lock
+            stored = cache.get(response_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code < 500:
+                headers = {name: response[name] for name in ('Location',)
+                           if response.has_header(name)}
+                cache.set(
+                    response_key,
+                    (fingerprint, response.status_code, response.data,
+                     headers),
+                    settings.IDEMPOTENCY_KEY_TTL
+                )
+        finally:
+            cache.delete(lock_key)
+
+        return response
+
+    return wrapper
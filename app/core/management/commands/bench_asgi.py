@@ -0,0 +1,148 @@
+import asyncio
+import io
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+
+from rest_framework.authtoken.models import Token
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ('Compare the sync API under WSGI worker threads with the async '
+            'API under ASGI when clients are slow to send their requests')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument('--client-delay', type=float, default=0.2,
+                            help='Seconds each client takes to send')
+        parser.add_argument('--wsgi-threads', type=int, default=4)
+        parser.add_argument('--sync-path', default='/api/recipe/tags/')
+        parser.add_argument('--async-path',
+                            default='/api/recipe/async/tags/')
+
+    def _host(self):
+        hosts = [host for host in settings.ALLOWED_HOSTS
+                 if host != '*' and not host.startswith('.')]
+        return hosts[0] if hosts else 'localhost'
+
+    def _run_wsgi(self, path, token, clients, delay, threads):
+        handler = WSGIHandler()
+        host = self._host()
+
+        def client(started):
+            # A sync worker thread is held while a slow client sends
+            time.sleep(delay)
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SERVER_NAME': host,
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': host,
+                'HTTP_AUTHORIZATION': f'Token {token}',
+                'wsgi.input': io.BytesIO(),
+                'wsgi.url_scheme': 'http',
+            }
+            statuses = []
+            response = handler(environ, lambda status, headers:
+                               statuses.append(status))
+            b''.join(response)
+            response.close()
+            return time.perf_counter() - started, statuses[0]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(client, [started] * clients))
+
+        return time.perf_counter() - started, results
+
+    def _run_asgi(self, path, token, clients, delay):
+        handler = ASGIHandler()
+        host = self._host()
+
+        async def client(started):
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': b'',
+                'root_path': '',
+                'headers': [
+                    (b'host', host.encode()),
+                    (b'authorization', f'Token {token}'.encode()),
+                ],
+                'client': ('127.0.0.1', 0),
+                'server': (host, 80),
+            }
+            statuses = []
+
+            async def receive():
+                # The event loop serves other clients while this one sends
+                await asyncio.sleep(delay)
+                return {'type': 'http.request', 'body': b'',
+                        'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            await handler(scope, receive, send)
+            return time.perf_counter() - started, statuses[0]
+
+        async def run():
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *[client(started) for _ in range(clients)]
+            )
+            return time.perf_counter() - started, results
+
+        return asyncio.run(run())
+
+    def _report(self, label, total, results):
+        latencies = [latency for latency, _ in results]
+        errors = sum(1 for _, status in results
+                     if not str(status).startswith('2'))
+        self.stdout.write(
+            f'{label}: {len(results)} requests in {total:.3f}s '
+            f'({len(results) / total:.1f} req/s), '
+            f'p50 {percentile(latencies, 0.5) * 1000:.1f} ms, '
+            f'p99 {percentile(latencies, 0.99) * 1000:.1f} ms, '
+            f'errors {errors}'
+        )
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create_user(
+            f'bench-{uuid.uuid4().hex}@example.com', uuid.uuid4().hex
+        )
+        token = Token.objects.create(user=user).key
+        try:
+            total, results = self._run_wsgi(
+                options['sync_path'], token, options['clients'],
+                options['client_delay'], options['wsgi_threads']
+            )
+            self._report(f'WSGI ({options["wsgi_threads"]} threads)',
+                         total, results)
+
+            total, results = self._run_asgi(
+                options['async_path'], token, options['clients'],
+                options['client_delay']
+            )
+            self._report('ASGI', total, results)
+        finally:
+            user.delete()
@@ -0,0 +1,59 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand
+
+# Run in a fresh interpreter: load the app as a WSGI worker would, resolve
+# every URL pattern so all views are imported, then report
+STARTUP_SCRIPT = '''
+import json, resource, sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+modules = len(sys.modules)
+print(json.dumps({'seconds': seconds, 'rss': rss, 'modules': modules}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Measure the time and memory a worker takes to load the app, '
+            'for each settings module')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'settings_modules', nargs='*',
+            help='Defaults to the current and the API-only settings'
+        )
+        parser.add_argument('--runs', type=int, default=5)
+
+    def _start(self, settings_module):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT], env=env, check=True,
+            stdout=subprocess.PIPE, universal_newlines=True,
+        ).stdout
+
+        return json.loads(output.splitlines()[-1])
+
+    def handle(self, *args, **options):
+        settings_modules = options['settings_modules'] or [
+            os.environ.get('DJANGO_SETTINGS_MODULE', 'app.settings'),
+            'app.settings_api',
+        ]
+        for settings_module in settings_modules:
+            runs = [self._start(settings_module)
+                    for _ in range(options['runs'])]
+            self.stdout.write(
+                f'{settings_module}: startup '
+                f'{statistics.median(r["seconds"] for r in runs) * 1000:.1f} '
+                f'ms, RSS '
+                f'{statistics.median(r["rss"] for r in runs) / 2 ** 20:.1f} '
+                f'MiB, {runs[0]["modules"]} modules'
+            )
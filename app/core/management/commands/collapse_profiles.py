@@ -0,0 +1,35 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from core.profiling import profile_store, read_profile
+
+
+class Command(BaseCommand):
+    help = 'Aggregate stored profiles into one collapsed stack file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the collapsed stack file')
+        parser.add_argument(
+            '--route',
+            help='Only aggregate profiles of this route, e.g. recipe-list'
+        )
+
+    def handle(self, *args, **options):
+        route = options['route']
+        paths = profile_store().paths()
+        if route:
+            label = route.replace(':', '.')
+            paths = [path for path in paths if label in path]
+
+        stacks = Counter()
+        for path in paths:
+            stacks.update(read_profile(path))
+
+        with open(options['output'], 'w') as output:
+            for stack, count in sorted(stacks.items()):
+                output.write(f'{stack} {count}\n')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Collapsed {len(paths)} profiles into {options["output"]}'
+        ))
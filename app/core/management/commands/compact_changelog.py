@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.changes import compact
+from core.routers import each_shard
+
+
+class Command(BaseCommand):
+    help = ('Keep the latest change feed entry per object and drop '
+            'tombstones older than the given age')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int,
+                            help='Tombstone age in seconds, defaults to '
+                                 'CHANGELOG_TOMBSTONE_TTL')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        superseded = tombstones = 0
+        for _ in each_shard():
+            removed = compact(options['max_age'], options['batch_size'])
+            superseded += removed[0]
+            tombstones += removed[1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {superseded} superseded entries and '
+            f'{tombstones} tombstones'
+        ))
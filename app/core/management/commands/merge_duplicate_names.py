@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core.merge import merge_duplicate_names
+from core.models import Tag, Ingredients, Recipe
+from core.routers import each_shard
+
+
+class Command(BaseCommand):
+    help = 'Merge tags and ingredients a user has created more than once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        tags = ingredients = 0
+        for _ in each_shard():
+            tags += merge_duplicate_names(
+                Tag, Recipe.tags.through, 'tag', batch_size
+            )
+            ingredients += merge_duplicate_names(
+                Ingredients, Recipe.ingredients.through, 'ingredients',
+                batch_size
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {tags} duplicate tags and '
+            f'{ingredients} duplicate ingredients'
+        ))
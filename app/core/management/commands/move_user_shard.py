@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.shards import ShardMoveError, move_user
+
+
+class Command(BaseCommand):
+    help = ('Move the recipes, tags and ingredients of a user to another '
+            'database shard while the user stays online')
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int)
+        parser.add_argument('shard', help='Alias of the target shard')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--grace', type=float,
+                            help='Seconds writes pause before the switch, '
+                                 'defaults to SHARD_MOVE_GRACE')
+
+    def handle(self, *args, **options):
+        try:
+            move_user(options['user_id'], options['shard'],
+                      batch_size=options['batch_size'],
+                      grace=options['grace'], log=self.stdout.write)
+        except ShardMoveError as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved user {options["user_id"]} to {options["shard"]}'
+        ))
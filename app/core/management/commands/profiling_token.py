@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from core.profiling import profiling_token
+
+
+class Command(BaseCommand):
+    help = 'Print a signed X-Profile header value forcing a profile'
+
+    def handle(self, *args, **options):
+        self.stdout.write(profiling_token())
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.models import UserPurge
+from core.purge import purge_user
+
+
+class Command(BaseCommand):
+    help = 'Finish interrupted user purges in the foreground'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        pending = UserPurge.objects.filter(finished_at__isnull=True)
+        for user_id in pending.values_list('user_id', flat=True):
+            purge = purge_user(user_id, options['batch_size'])
+            self.stdout.write(
+                f'Purged user {user_id}: {purge.deleted_rows} rows'
+            )
+
+        self.stdout.write(self.style.SUCCESS('All user purges finished'))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.shards import ShardMoveError, reserve_id_range
+
+
+class Command(BaseCommand):
+    help = ('Start the id sequences of every shard in its own range, run '
+            'once after migrating a new shard')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_SHARDS:
+            raise CommandError('DATABASE_SHARDS is empty')
+
+        for alias in settings.DATABASE_SHARDS:
+            try:
+                reserve_id_range(alias)
+            except ShardMoveError as exc:
+                raise CommandError(exc)
+            self.stdout.write(f'Reserved the id range of {alias}')
+
+        self.stdout.write(self.style.SUCCESS('Shard id ranges reserved'))
@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models import Count, Min
+from django.db.models.functions import Upper
+
+
+def duplicate_name_groups(model):
+    """Return (user_id, upper name, kept id) for names used more than once"""
+    return model.objects.annotate(
+        key=Upper('name')
+    ).values('user_id', 'key').annotate(
+        keep=Min('id'),
+        copies=Count('id'),
+    ).filter(copies__gt=1).values_list('user_id', 'key', 'keep')
+
+
+def merge_group(model, through, field, user_id, key, keep):
+    """Merge one group of duplicate names into the row with the lowest id"""
+    duplicates = list(model.objects.annotate(key=Upper('name')).filter(
+        user_id=user_id, key=key
+    ).exclude(id=keep).values_list('id', flat=True))
+
+    field_id = f'{field}_id'
+    linked = set(through.objects.filter(
+        **{f'{field_id}__in': duplicates + [keep]}
+    ).values_list('recipe_id', field_id))
+    already_kept = {recipe_id for recipe_id, obj_id in linked
+                    if obj_id == keep}
+    relinked = {recipe_id for recipe_id, _ in linked} - already_kept
+
+    through.objects.filter(**{f'{field_id}__in': duplicates}).delete()
+    through.objects.bulk_create([
+        through(recipe_id=recipe_id, **{field_id: keep})
+        for recipe_id in sorted(relinked)
+    ])
+    model.objects.filter(id__in=duplicates).delete()
+
+    return len(duplicates)
+
+
+def merge_duplicate_names(model, through, field, batch_size=500):
+    """Merge rows of model sharing a case insensitive name per user
+
+    Recipe links held by the duplicates in the through table are moved to
+    the kept row. Groups are merged batch_size at a time, each batch in its
+    own short transaction. Returns the number of rows removed.
+    """
+    removed = 0
+    while True:
+        groups = list(duplicate_name_groups(model)[:batch_size])
+        if not groups:
+            return removed
+
+        with transaction.atomic(using=model.objects.db):
+            for user_id, key, keep in groups:
+                removed += merge_group(model, through, field,
+                                       user_id, key, keep)
@@ -0,0 +1,206 @@
+import contextlib
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from rest_framework import serializers
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_request_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class Histogram:
+    """Fixed bucket histogram, cumulated when rendered"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        """Yield (le, cumulative count) pairs including +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """In process histograms labelled by route
+
+    Collectors are callables returning extra lines of Prometheus text,
+    used for gauges that are computed when metrics are scraped.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, name, description, buckets):
+        self._metrics[name] = (description, buckets)
+
+    def register_collector(self, collector):
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def observe(self, name, route, value):
+        key = (name, route)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(self._metrics[name][1])
+                self._histograms[key] = histogram
+            histogram.observe(value)
+
+    def get(self, name, route):
+        return self._histograms.get((name, route))
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            lines = []
+            for name, (description, _) in sorted(self._metrics.items()):
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, route), histogram in histograms:
+                    if metric != name:
+                        continue
+                    label = f'route="{route}"'
+                    for bound, total in histogram.samples():
+                        lines.append(
+                            f'{name}_bucket{{{label},le="{bound}"}} {total}'
+                        )
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+        for collector in self._collectors:
+            lines.extend(collector())
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+registry.register('http_request_duration_seconds',
+                  'Wall time spent handling the request', TIME_BUCKETS)
+registry.register('http_request_db_seconds',
+                  'Time spent executing SQL', TIME_BUCKETS)
+registry.register('http_request_queries',
+                  'Number of SQL queries executed', COUNT_BUCKETS)
+registry.register('http_request_serializer_seconds',
+                  'Time spent building serializer data', TIME_BUCKETS)
+registry.register('http_response_bytes',
+                  'Size of the response body', SIZE_BUCKETS)
+registry.register('http_first_request_cold_seconds',
+                  'Wall time of the first request after a login that '
+                  'warmed no caches', TIME_BUCKETS)
+registry.register('http_first_request_warm_seconds',
+                  'Wall time of the first request after a login that '
+                  'warmed the response cache', TIME_BUCKETS)
+
+# Logins waiting for their first request, kept at most this many seconds
+FIRST_REQUEST_TIMEOUT = 60 * 60
+
+
+def _first_request_key(user_id):
+    return f'first-request:{user_id}'
+
+
+def mark_login(user_id, warmed):
+    """Remember a login so its first request is timed separately"""
+    cache.set(_first_request_key(user_id), 'warm' if warmed else 'cold',
+              FIRST_REQUEST_TIMEOUT)
+
+
+def pop_login(user_id):
+    """Return 'warm' or 'cold' for the first request after a login"""
+    key = _first_request_key(user_id)
+    state = cache.get(key)
+    if state is not None:
+        cache.delete(key)
+
+    return state
+
+
+class RequestMetrics:
+    """Measurements collected while handling a single request"""
+
+    def __init__(self):
+        self.db_time = 0
+        self.queries = 0
+        self.serializer_time = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Database execute wrapper timing every query"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+@contextlib.contextmanager
+def collect_request_metrics():
+    """Collect the metrics of the code run inside the block"""
+    metrics = RequestMetrics()
+    token = _request_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _request_metrics.reset(token)
+
+
+@contextlib.contextmanager
+def serializer_timer():
+    """Add the time spent in the block to the current request"""
+    metrics = _request_metrics.get()
+    if metrics is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - start
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """List serializer recording the time spent building its data"""
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
+class TimedSerializerMixin:
+    """Serializer mixin recording the time spent building its data
+
+    Serializers using it should set list_serializer_class to
+    TimedListSerializer in their Meta so lists are timed as well.
+    """
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
@@ -0,0 +1,209 @@
+import asyncio
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+from django.utils.functional import SimpleLazyObject
+
+from core.async_views import run_sync
+from core.metrics import collect_request_metrics, pop_login, registry
+from core.profiling import StackSampler, is_valid_token, profile_store
+from core.queries import QueryReport, log_report, wrap_queries
+
+
+class AsyncCapableMiddleware:
+    """Middleware running in the mode of the handler it wraps
+
+    Django passes an async get_response under ASGI or when the views below
+    are async, subclasses then handle requests in acall() so the request
+    does not cross to a thread and back.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function, as Django's
+            # MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.acall(request)
+
+        return self.call(request)
+
+
+def _authenticated_user(request):
+    """Return the user DRF or an async view authenticated, if any"""
+    user = getattr(request, 'user', None)
+    # The session user of other views is loaded lazily, with a query
+    if isinstance(user, SimpleLazyObject) or user is None:
+        return None
+
+    return user if user.is_authenticated else None
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """Record timings and sizes of every request, labelled by route
+
+    Removed from the middleware chain unless METRICS_ENABLED is set.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def _observe(self, request, response, metrics, duration):
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        size = 0 if response.streaming else len(response.content)
+
+        registry.observe('http_request_duration_seconds', route, duration)
+        registry.observe('http_request_db_seconds', route, metrics.db_time)
+        registry.observe('http_request_queries', route, metrics.queries)
+        registry.observe('http_request_serializer_seconds', route,
+                         metrics.serializer_time)
+        registry.observe('http_response_bytes', route, size)
+
+        return route
+
+    def call(self, request):
+        start = time.perf_counter()
+        with collect_request_metrics() as metrics, \
+                wrap_queries(metrics.execute_wrapper):
+            response = self.get_response(request)
+
+        duration = time.perf_counter() - start
+        route = self._observe(request, response, metrics, duration)
+        user = _authenticated_user(request)
+        if user is not None:
+            state = pop_login(user.pk)
+            if state is not None:
+                registry.observe(f'http_first_request_{state}_seconds',
+                                 route, duration)
+
+        return response
+
+    async def acall(self, request):
+        start = time.perf_counter()
+        with collect_request_metrics() as metrics, \
+                wrap_queries(metrics.execute_wrapper):
+            response = await self.get_response(request)
+
+        duration = time.perf_counter() - start
+        route = self._observe(request, response, metrics, duration)
+        user = _authenticated_user(request)
+        if user is not None:
+            state = await run_sync(pop_login, user.pk)
+            if state is not None:
+                registry.observe(f'http_first_request_{state}_seconds',
+                                 route, duration)
+
+        return response
+
+
+class QueryInspectionMiddleware(AsyncCapableMiddleware):
+    """Flag probable N+1 queries and slow queries of sampled requests
+
+    A QUERY_INSPECTION_SAMPLE_RATE of 0 removes the middleware, 1 inspects
+    every request.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTION_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def _sampled(self):
+        return random.random() < settings.QUERY_INSPECTION_SAMPLE_RATE
+
+    def _log(self, request, report):
+        match = request.resolver_match
+        log_report(report, match.view_name if match else request.path)
+
+    def call(self, request):
+        if not self._sampled():
+            return self.get_response(request)
+
+        report = QueryReport()
+        with wrap_queries(report):
+            response = self.get_response(request)
+        self._log(request, report)
+
+        return response
+
+    async def acall(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        report = QueryReport()
+        with wrap_queries(report):
+            response = await self.get_response(request)
+        self._log(request, report)
+
+        return response
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """Sample the stack of profiled requests into the profile store
+
+    A request is profiled when it carries a valid signed X-Profile header
+    or, for routes in PROFILING_ROUTES (all routes when empty), with a
+    probability of PROFILING_SAMPLE_RATE. Removed from the middleware
+    chain unless PROFILING_ENABLED is set. Blocking calls the request
+    makes through run_sync() are sampled on their own threads.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.store = profile_store()
+
+    def _route(self, request):
+        try:
+            return resolve(request.path_info).view_name
+        except Resolver404:
+            return 'unmatched'
+
+    def _should_profile(self, request, route):
+        token = request.META.get('HTTP_X_PROFILE')
+        if token:
+            return is_valid_token(token)
+
+        if (settings.PROFILING_ROUTES and
+                route not in settings.PROFILING_ROUTES):
+            return False
+
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def call(self, request):
+        route = self._route(request)
+        if not self._should_profile(request, route):
+            return self.get_response(request)
+
+        with StackSampler(settings.PROFILING_INTERVAL) as sampler:
+            response = self.get_response(request)
+
+        if sampler.stacks:
+            self.store.save(route, sampler.stacks)
+
+        return response
+
+    async def acall(self, request):
+        route = self._route(request)
+        if not self._should_profile(request, route):
+            return await self.get_response(request)
+
+        with StackSampler(settings.PROFILING_INTERVAL) as sampler:
+            response = await self.get_response(request)
+
+        if sampler.stacks:
+            await run_sync(self.store.save, route, sampler.stacks)
+
+        return response
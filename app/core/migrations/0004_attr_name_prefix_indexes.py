@@ -0,0 +1,38 @@
+from django.db import migrations
+
+INDEXED_TABLES = ('core_tag', 'core_ingredients')
+
+
+def name_prefix_sql(vendor, table):
+    """Index matching the SQL Django emits for name__istartswith"""
+    if vendor == 'postgresql':
+        expression = 'UPPER("name"::text) text_pattern_ops'
+    else:
+        expression = 'UPPER("name")'
+
+    return (
+        f'CREATE INDEX "{table}_user_name_prefix_idx" '
+        f'ON "{table}" ("user_id", {expression})'
+    )
+
+
+def create_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in INDEXED_TABLES:
+        schema_editor.execute(name_prefix_sql(vendor, table))
+
+
+def drop_indexes(apps, schema_editor):
+    for table in INDEXED_TABLES:
+        schema_editor.execute(f'DROP INDEX "{table}_user_name_prefix_idx"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_recipe_range_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,96 @@
+from django.db import migrations, transaction
+from django.db.models import Count, Min
+from django.db.models.functions import Upper
+
+INDEXED_TABLES = ('core_tag', 'core_ingredients')
+
+
+def name_index_sql(vendor, table, unique):
+    """Index matching the SQL Django emits for name__iexact/istartswith"""
+    if vendor == 'postgresql':
+        expression = 'UPPER("name"::text) text_pattern_ops'
+    else:
+        expression = 'UPPER("name")'
+
+    return (
+        f'CREATE {"UNIQUE " if unique else ""}INDEX '
+        f'"{table}_user_name_prefix_idx" ON "{table}" ("user_id", {expression})'
+    )
+
+
+# Copy of core.merge as of this migration, running on historical models
+
+
+def merge_group(db, model, through, field, user_id, key, keep):
+    """Merge one group of duplicate names into the row with the lowest id"""
+    duplicates = list(model.objects.using(db).annotate(
+        key=Upper('name')
+    ).filter(user_id=user_id, key=key).exclude(
+        id=keep
+    ).values_list('id', flat=True))
+
+    field_id = f'{field}_id'
+    links = through.objects.using(db)
+    linked = set(links.filter(
+        **{f'{field_id}__in': duplicates + [keep]}
+    ).values_list('recipe_id', field_id))
+    already_kept = {recipe_id for recipe_id, obj_id in linked
+                    if obj_id == keep}
+    relinked = {recipe_id for recipe_id, _ in linked} - already_kept
+
+    links.filter(**{f'{field_id}__in': duplicates}).delete()
+    links.bulk_create([
+        through(recipe_id=recipe_id, **{field_id: keep})
+        for recipe_id in sorted(relinked)
+    ])
+    model.objects.using(db).filter(id__in=duplicates).delete()
+
+
+def merge_duplicate_names(db, model, through, field, batch_size=500):
+    """Merge rows of model sharing a case insensitive name per user"""
+    groups = model.objects.using(db).annotate(
+        key=Upper('name')
+    ).values('user_id', 'key').annotate(
+        keep=Min('id'),
+        copies=Count('id'),
+    ).filter(copies__gt=1).values_list('user_id', 'key', 'keep')
+    while True:
+        batch = list(groups[:batch_size])
+        if not batch:
+            return
+
+        with transaction.atomic(using=db):
+            for user_id, key, keep in batch:
+                merge_group(db, model, through, field, user_id, key, keep)
+
+
+def merge_duplicates(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    db = schema_editor.connection.alias
+    merge_duplicate_names(db, apps.get_model('core', 'Tag'),
+                          Recipe.tags.through, 'tag')
+    merge_duplicate_names(db, apps.get_model('core', 'Ingredients'),
+                          Recipe.ingredients.through, 'ingredients')
+
+
+def replace_indexes(unique):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for table in INDEXED_TABLES:
+            schema_editor.execute(f'DROP INDEX "{table}_user_name_prefix_idx"')
+            schema_editor.execute(name_index_sql(vendor, table, unique))
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_attr_name_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.RunPython(replace_indexes(unique=True),
+                             replace_indexes(unique=False)),
+    ]
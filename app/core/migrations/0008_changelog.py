@@ -0,0 +1,80 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_MODELS = (
+    ('Recipe', 'recipe'),
+    ('Tag', 'tag'),
+    ('Ingredients', 'ingredient'),
+)
+
+
+def backfill_changelog(apps, schema_editor):
+    """Log every existing object so a sync from 0 returns everything"""
+    ChangeLog = apps.get_model('core', 'ChangeLog')
+    ChangeSequence = apps.get_model('core', 'ChangeSequence')
+    User = apps.get_model('core', 'User')
+    db = schema_editor.connection.alias
+
+    users = User.objects.using(db).values_list('id', flat=True)
+    for user_id in users.iterator():
+        seq = 0
+        entries = []
+        for model_name, label in BACKFILL_MODELS:
+            model = apps.get_model('core', model_name)
+            ids = model.objects.using(db).filter(
+                user_id=user_id
+            ).order_by('id').values_list('id', flat=True)
+            for object_id in ids.iterator():
+                seq += 1
+                entries.append(ChangeLog(user_id=user_id, seq=seq,
+                                         model=label, object_id=object_id))
+                if len(entries) >= 1000:
+                    ChangeLog.objects.using(db).bulk_create(entries)
+                    entries = []
+        ChangeLog.objects.using(db).bulk_create(entries)
+        if seq:
+            ChangeSequence.objects.using(db).create(user_id=user_id,
+                                                    last_seq=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_userpurge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='core.user')),
+                ('last_seq', models.BigIntegerField(default=0)),
+                ('compacted_seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField()),
+                ('model', models.CharField(choices=[('recipe', 'Recipe'), ('tag', 'Tag'), ('ingredient', 'Ingredient')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['user', 'model', 'object_id', 'seq'], name='changelog_object_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='changelog',
+            constraint=models.UniqueConstraint(fields=('user', 'seq'), name='changelog_user_seq_unique'),
+        ),
+        migrations.RunPython(backfill_changelog, migrations.RunPython.noop),
+    ]
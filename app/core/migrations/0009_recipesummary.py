@@ -0,0 +1,95 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def _links(db, through, field, recipe_ids):
+    """Return (ids, names) of linked objects per recipe, ordered by name"""
+    rows = through.objects.using(db).filter(
+        recipe_id__in=recipe_ids
+    ).order_by(f'{field}__name', f'{field}_id').values_list(
+        'recipe_id', f'{field}_id', f'{field}__name'
+    )
+    links = {}
+    for recipe_id, obj_id, name in rows:
+        ids, names = links.setdefault(recipe_id, ([], []))
+        ids.append(obj_id)
+        names.append(name)
+
+    return links
+
+
+def backfill_summaries(apps, schema_editor):
+    """Summarize every existing recipe so summary lists are complete"""
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeSummary = apps.get_model('core', 'RecipeSummary')
+    db = schema_editor.connection.alias
+    recipes = Recipe.objects.using(db).order_by('id')
+
+    last_id = 0
+    while True:
+        rows = list(recipes.filter(id__gt=last_id).values_list(
+            'id', 'user_id', 'title', 'time_minutes', 'price', 'image'
+        )[:BATCH_SIZE])
+        if not rows:
+            return
+        ids = [row[0] for row in rows]
+        tags = _links(db, Recipe.tags.through, 'tag', ids)
+        ingredients = _links(db, Recipe.ingredients.through, 'ingredients',
+                             ids)
+        summaries = []
+        for recipe_id, user_id, title, time_minutes, price, image in rows:
+            tag_ids, tag_names = tags.get(recipe_id, ([], []))
+            ingredient_ids, ingredient_names = ingredients.get(recipe_id,
+                                                               ([], []))
+            summaries.append(RecipeSummary(
+                recipe_id=recipe_id, user_id=user_id, title=title,
+                time_minutes=time_minutes, price=price, image=image or '',
+                tag_ids=tag_ids, tag_names=tag_names,
+                ingredient_ids=ingredient_ids,
+                ingredient_names=ingredient_names,
+            ))
+        RecipeSummary.objects.using(db).bulk_create(summaries)
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSummary',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='core.recipe')),
+                ('title', models.CharField(max_length=255)),
+                ('time_minutes', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('image', models.CharField(blank=True, max_length=255)),
+                ('tag_ids', models.JSONField(default=list)),
+                ('tag_names', models.JSONField(default=list)),
+                ('ingredient_ids', models.JSONField(default=list)),
+                ('ingredient_names', models.JSONField(default=list)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipesummary',
+            index=models.Index(fields=['user', 'recipe'], name='summary_user_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipesummary',
+            index=models.Index(fields=['user', 'price', 'recipe'], name='summary_user_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipesummary',
+            index=models.Index(fields=['user', 'time_minutes', 'recipe'], name='summary_user_time_idx'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+# Columns searched by prefix from the admin, across all users
+SEARCHED_COLUMNS = (
+    ('core_recipe', 'title'),
+    ('core_tag', 'name'),
+    ('core_ingredients', 'name'),
+)
+
+
+def prefix_sql(vendor, table, column):
+    """Index matching the SQL Django emits for istartswith lookups"""
+    if vendor == 'postgresql':
+        expression = f'UPPER("{column}"::text) text_pattern_ops'
+    else:
+        expression = f'UPPER("{column}")'
+
+    return (
+        f'CREATE INDEX "{table}_{column}_prefix_idx" '
+        f'ON "{table}" ({expression})'
+    )
+
+
+def create_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, column in SEARCHED_COLUMNS:
+        schema_editor.execute(prefix_sql(vendor, table, column))
+
+
+def drop_indexes(apps, schema_editor):
+    for table, column in SEARCHED_COLUMNS:
+        schema_editor.execute(f'DROP INDEX "{table}_{column}_prefix_idx"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipesummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
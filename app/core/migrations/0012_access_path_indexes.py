@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:34
+
+from django.db import migrations, models
+
+# Links looked up from the tag or ingredient side, covering the recipe id
+REVERSE_LINK_INDEXES = (
+    ('core_recipe_tags', 'tag_id'),
+    ('core_recipe_ingredients', 'ingredients_id'),
+)
+
+
+def create_link_indexes(apps, schema_editor):
+    for table, column in REVERSE_LINK_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX "{table}_reverse_idx" '
+            f'ON "{table}" ("{column}", "recipe_id")'
+        )
+
+
+def drop_link_indexes(apps, schema_editor):
+    for table, _ in REVERSE_LINK_INDEXES:
+        schema_editor.execute(f'DROP INDEX "{table}_reverse_idx"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_shardassignment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredients',
+            index=models.Index(fields=['user', '-name'], name='ingredients_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'id'], name='recipe_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-name'], name='tag_user_name_idx'),
+        ),
+        migrations.RunPython(create_link_indexes, drop_link_indexes),
+    ]
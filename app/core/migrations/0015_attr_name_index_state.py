@@ -0,0 +1,64 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:19
+
+import core.models
+from django.db import migrations
+
+# The unique indexes 0005 created with SQL, named as the model declares them
+RENAMED_INDEXES = (
+    ('core_tag', 'core_tag_user_name_prefix_idx', 'tag_user_upper_name_uniq'),
+    ('core_ingredients', 'core_ingredients_user_name_prefix_idx',
+     'ingredients_upper_name_uniq'),
+)
+
+
+def _index_sql(vendor, table, name):
+    if vendor == 'postgresql':
+        expression = 'UPPER("name"::text) text_pattern_ops'
+    else:
+        expression = 'UPPER("name")'
+
+    return (f'CREATE UNIQUE INDEX "{name}" ON "{table}" '
+            f'("user_id", {expression})')
+
+
+def rename_indexes(forwards):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for table, old_name, new_name in RENAMED_INDEXES:
+            if not forwards:
+                old_name, new_name = new_name, old_name
+            if vendor == 'postgresql':
+                schema_editor.execute(
+                    f'ALTER INDEX "{old_name}" RENAME TO "{new_name}"'
+                )
+            else:
+                schema_editor.execute(f'DROP INDEX "{old_name}"')
+                schema_editor.execute(_index_sql(vendor, table, new_name))
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_job_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(rename_indexes(forwards=True),
+                                     rename_indexes(forwards=False)),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='ingredients',
+                    index=core.models.UpperNameIndex(name='ingredients_upper_name_uniq', unique=True),
+                ),
+                migrations.AddIndex(
+                    model_name='tag',
+                    index=core.models.UpperNameIndex(name='tag_user_upper_name_uniq', unique=True),
+                ),
+            ],
+        ),
+    ]
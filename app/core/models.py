@@ -5,6 +5,7 @@ from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
                                         PermissionsMixin
 
 from django.conf import settings
+from django.utils import timezone
 
 
 def recipe_image_filepath(instance, filename):
@@ -49,6 +50,50 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+class UpperNameIndex(models.Index):
+    """Index on the user and UPPER(name), unique per user if unique is set
+
+    Serves the SQL Django emits for name__iexact and name__istartswith.
+    Indexes on expressions need Django 4.0, so the SQL is written here.
+    """
+
+    def __init__(self, *, name, unique=False):
+        super().__init__(fields=['user', 'name'], name=name)
+        self.unique = unique
+
+    def deconstruct(self):
+        path, _, _ = super().deconstruct()
+        return path, (), {'name': self.name, 'unique': self.unique}
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        quote = schema_editor.quote_name
+        if schema_editor.connection.vendor == 'postgresql':
+            expression = 'UPPER("name"::text) text_pattern_ops'
+        else:
+            expression = 'UPPER("name")'
+
+        return (
+            f'CREATE {"UNIQUE " if self.unique else ""}INDEX '
+            f'{quote(self.name)} ON {quote(model._meta.db_table)} '
+            f'("user_id", {expression})'
+        )
+
+
+class UserAttrManager(models.Manager):
+
+    def get_or_create_for_user(self, user, name):
+        """Return the users object with this name, creating it if needed
+
+        Names are unique per user ignoring case, enforced by a functional
+        unique index, so concurrent creates resolve to the same row.
+        """
+        return self.get_or_create(
+            user=user,
+            name__iexact=name,
+            defaults={'name': name}
+        )
+
+
 class Tag(models.Model):
     """Tag to be used for recipe"""
     name = models.CharField(max_length=255)
@@ -57,6 +102,14 @@ class Tag(models.Model):
         on_delete=models.CASCADE
     )
 
+    objects = UserAttrManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-name'], name='tag_user_name_idx'),
+            UpperNameIndex(name='tag_user_upper_name_uniq', unique=True),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -69,6 +122,15 @@ class Ingredients(models.Model):
         on_delete=models.CASCADE
     )
 
+    objects = UserAttrManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-name'],
+                         name='ingredients_user_name_idx'),
+            UpperNameIndex(name='ingredients_upper_name_uniq', unique=True),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -86,5 +148,218 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag')
     image = models.ImageField(null=True, upload_to=recipe_image_filepath)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='recipe_user_id_idx'),
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='recipe_user_price_id_idx'
+            ),
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='recipe_user_time_id_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.title
+
+
+class UploadSession(models.Model):
+    """Resumable upload of a recipe image
+
+    Chunks are written in place into the file at name, offset counts the
+    bytes received so far from the start.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'],
+                         name='uploadsession_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f'Upload of {self.name} ({self.offset}/{self.size})'
+
+
+class RecipeSummary(models.Model):
+    """Denormalized recipe card, read by lists in a single scan
+
+    Kept in step with recipes, their links and tag and ingredient names
+    by recipe.summaries.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='summary'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    title = models.CharField(max_length=255)
+    time_minutes = models.IntegerField()
+    price = models.DecimalField(max_digits=5, decimal_places=2)
+    image = models.CharField(max_length=255, blank=True)
+    tag_ids = models.JSONField(default=list)
+    tag_names = models.JSONField(default=list)
+    ingredient_ids = models.JSONField(default=list)
+    ingredient_names = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'],
+                name='summary_user_recipe_idx'
+            ),
+            models.Index(
+                fields=['user', 'price', 'recipe'],
+                name='summary_user_price_idx'
+            ),
+            models.Index(
+                fields=['user', 'time_minutes', 'recipe'],
+                name='summary_user_time_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class ChangeSequence(models.Model):
+    """Last change sequence number handed out for a user
+
+    Allocating a number locks the row until the transaction commits, so
+    a users changes become visible in sequence order.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    last_seq = models.BigIntegerField(default=0)
+    compacted_seq = models.BigIntegerField(default=0)
+
+
+class ChangeLog(models.Model):
+    """Append only log of changes to a users recipes, tags and ingredients
+
+    Compaction keeps only the latest entry per object, so deleted objects
+    are remembered by a tombstone entry until it expires.
+    """
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    MODEL_CHOICES = (
+        (RECIPE, 'Recipe'),
+        (TAG, 'Tag'),
+        (INGREDIENT, 'Ingredient'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    seq = models.BigIntegerField()
+    model = models.CharField(max_length=16, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'seq'],
+                                    name='changelog_user_seq_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'model', 'object_id', 'seq'],
+                         name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id} at {self.seq}'
+
+
+class UserPurge(models.Model):
+    """Progress of deleting a user and their data in small batches"""
+    user_id = models.BigIntegerField(unique=True)
+    stage = models.CharField(max_length=32, blank=True)
+    deleted_rows = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f'Purge of user {self.user_id} ({self.stage or "pending"})'
+
+
+class ShardAssignment(models.Model):
+    """Database shard holding the recipes, tags and ingredients of a user"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL,
+                                on_delete=models.CASCADE, primary_key=True,
+                                related_name='shard_assignment')
+    alias = models.CharField(max_length=64)
+    moving = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'User {self.user_id} on {self.alias}'
+
+
+class Job(models.Model):
+    """Deferred work run by the background workers"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    task = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    priority = models.IntegerField(default=0)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES,
+                              default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    heartbeat_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    idempotency_key = models.CharField(max_length=255, null=True,
+                                       unique=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_at', 'id'],
+                name='job_claim_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.task} ({self.status})'
@@ -0,0 +1,152 @@
+import contextlib
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+SIGNING_SALT = 'core.profiling'
+PROFILE_SUFFIX = '.folded'
+
+_sampler = contextvars.ContextVar('sampler', default=None)
+
+
+def collapse_stack(frame):
+    """Return a frame and its callers as a semicolon separated stack"""
+    names = []
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?')
+        names.append(f'{module}:{frame.f_code.co_name}')
+        frame = frame.f_back
+
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Sample the stack of the current thread from a background thread
+
+    Threads the block hands work to are sampled as well while they run
+    inside follow_thread(). Counts of identical stacks form a collapsed
+    stack profile that can be rendered as a flame graph.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._targets = {threading.get_ident()}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._token = _sampler.set(self)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        _sampler.reset(self._token)
+        self._stop.set()
+        self._thread.join()
+
+    @contextlib.contextmanager
+    def follow(self):
+        """Sample the current thread too while the block runs"""
+        ident = threading.get_ident()
+        if ident in self._targets:
+            yield
+            return
+
+        self._targets.add(ident)
+        try:
+            yield
+        finally:
+            self._targets.discard(ident)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for target in tuple(self._targets):
+                frame = frames.get(target)
+                if frame is not None:
+                    self.stacks[collapse_stack(frame)] += 1
+
+
+def follow_thread():
+    """Sample the current thread while the block runs, if profiling"""
+    sampler = _sampler.get()
+
+    return sampler.follow() if sampler else contextlib.nullcontext()
+
+
+class ProfileStore:
+    """Directory keeping the most recent profiles, oldest removed first"""
+
+    def __init__(self, directory, max_profiles):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def paths(self):
+        """Return stored profile paths, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+
+        return [os.path.join(self.directory, name) for name in sorted(names)
+                if name.endswith(PROFILE_SUFFIX)]
+
+    def save(self, route, stacks):
+        """Write a collapsed stack profile and drop the oldest ones"""
+        os.makedirs(self.directory, exist_ok=True)
+        label = re.sub(r'[^\w.-]', '.', route)
+        name = f'{time.time_ns():020d}-{os.getpid()}-{label}{PROFILE_SUFFIX}'
+        path = os.path.join(self.directory, name)
+
+        with open(path + '.tmp', 'w') as profile:
+            for stack, count in stacks.items():
+                profile.write(f'{stack} {count}\n')
+        os.replace(path + '.tmp', path)
+
+        for old_path in self.paths()[:-self.max_profiles]:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+
+        return path
+
+
+def read_profile(path):
+    """Return the stack counts stored in a profile"""
+    stacks = Counter()
+    with open(path) as profile:
+        for line in profile:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[stack] += int(count)
+
+    return stacks
+
+
+def profile_store():
+    return ProfileStore(settings.PROFILING_DIR,
+                        settings.PROFILING_MAX_PROFILES)
+
+
+def profiling_token():
+    """Return a value for the X-Profile header forcing a profile"""
+    return signing.dumps('profile', salt=SIGNING_SALT)
+
+
+def is_valid_token(token):
+    try:
+        signing.loads(token, salt=SIGNING_SALT,
+                      max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+
+    return True
@@ -0,0 +1,90 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from core import changes
+from core.models import (ChangeLog, Tag, Ingredients, Recipe,
+                         ShardAssignment, UploadSession, UserPurge)
+from core.routers import use_shard
+from jobs.queue import enqueue
+
+# Deleted in this order, uploads first so their files are deleted with
+# them, recipes before the tags and ingredients their links point to.
+# Deletes are not logged in the change feed, which goes last.
+PURGE_STAGES = (
+    ('uploads', UploadSession),
+    ('recipes', Recipe),
+    ('tags', Tag),
+    ('ingredients', Ingredients),
+    ('changes', ChangeLog),
+)
+
+
+def schedule_user_purge(user):
+    """Deactivate a user now and queue the deletion of their data"""
+    with transaction.atomic():
+        get_user_model().objects.filter(pk=user.pk).update(is_active=False)
+        Token.objects.filter(user_id=user.pk).delete()
+        UserPurge.objects.get_or_create(user_id=user.pk)
+        enqueue('core.tasks.purge_user', {'user_id': user.pk},
+                idempotency_key=f'purge-user-{user.pk}')
+
+
+def _delete_batch(model, user_id, batch_size):
+    """Delete one batch of a users rows, returning the number removed"""
+    ids = list(model.objects.filter(
+        user_id=user_id
+    ).order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return 0
+
+    return model.objects.filter(id__in=ids).delete()[0]
+
+
+def purge_user(user_id, batch_size=None):
+    """Delete a user and their data in short transactions
+
+    Each batch is committed together with the progress record, so an
+    interrupted purge resumes from the stage it reached.
+    """
+    batch_size = batch_size or settings.USER_PURGE_BATCH_SIZE
+    purge, _ = UserPurge.objects.get_or_create(user_id=user_id)
+    if purge.finished_at:
+        return purge
+
+    stages = [name for name, _ in PURGE_STAGES]
+    start = stages.index(purge.stage) if purge.stage in stages else 0
+    shard = ShardAssignment.objects.filter(
+        user_id=user_id
+    ).values_list('alias', flat=True).first()
+
+    for name, model in PURGE_STAGES[start:]:
+        while True:
+            with use_shard(shard), changes.muted(), \
+                    transaction.atomic(using=model.objects.db), \
+                    transaction.atomic():
+                deleted = _delete_batch(model, user_id, batch_size)
+                UserPurge.objects.filter(pk=purge.pk).update(
+                    stage=name,
+                    deleted_rows=purge.deleted_rows + deleted,
+                )
+                purge.deleted_rows += deleted
+            if not deleted:
+                break
+            time.sleep(settings.USER_PURGE_PAUSE)
+
+    if shard and shard != DEFAULT_DB_ALIAS:
+        # The copy of the user keeping foreign keys valid on the shard
+        get_user_model().objects.using(shard).filter(pk=user_id).delete()
+    with transaction.atomic():
+        get_user_model().objects.filter(pk=user_id).delete()
+        purge.stage = 'done'
+        purge.finished_at = timezone.now()
+        purge.save()
+
+    return purge
@@ -0,0 +1,135 @@
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+_execute_wrappers = contextvars.ContextVar('execute_wrappers', default=())
+
+# Instrumentation frames are never the origin of a query
+_SKIPPED_FILES = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('queries.py', 'metrics.py', 'middleware.py', 'testing.py')
+}
+
+
+def _execute(execute, sql, params, many, context):
+    """Database execute wrapper running the wrappers of the context"""
+    for wrapper in reversed(_execute_wrappers.get()):
+        execute = functools.partial(wrapper, execute)
+
+    return execute(sql, params, many, context)
+
+
+def install_execute_wrapper(sender, connection, **kwargs):
+    """Route the queries of a new connection through wrap_queries()"""
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+@contextlib.contextmanager
+def wrap_queries(wrapper):
+    """Run the queries of the block through a database execute wrapper
+
+    Unlike connection.execute_wrapper(), the wrapper follows the context
+    instead of the thread, so blocking code the request hands to
+    run_sync() or sync_to_async() is wrapped too.
+    """
+    token = _execute_wrappers.set(_execute_wrappers.get() + (wrapper,))
+    try:
+        yield
+    finally:
+        _execute_wrappers.reset(token)
+
+
+def fingerprint(sql):
+    """Normalize literals and IN lists so repeated queries compare equal"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _origin_frame():
+    """Return file:line of the innermost project frame running the query"""
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(base_dir) and filename not in _SKIPPED_FILES
+                and 'site-packages' not in filename):
+            return (f'{os.path.relpath(filename, base_dir)}:'
+                    f'{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+
+    return None
+
+
+class QueryReport:
+    """Queries executed inside a block, grouped by fingerprint"""
+
+    def __init__(self):
+        self.queries = []
+        self.counts = Counter()
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper recording every query"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            key = fingerprint(sql)
+            origin = _origin_frame()
+            self.counts[key] += 1
+            self.origins.setdefault(key, origin)
+            self.queries.append((key, sql, duration, origin))
+
+    def repeated(self, threshold):
+        """Return fingerprints executed at least threshold times"""
+        return {key: count for key, count in self.counts.items()
+                if count >= threshold}
+
+    def slow(self, threshold):
+        """Return (sql, duration, origin) of queries slower than threshold"""
+        return [(sql, duration, origin)
+                for _, sql, duration, origin in self.queries
+                if duration >= threshold]
+
+    def describe_repeated(self, threshold):
+        return '\n'.join(
+            f'{count}x {key} (from {self.origins[key]})'
+            for key, count in sorted(self.repeated(threshold).items(),
+                                     key=lambda item: -item[1])
+        )
+
+
+def log_report(report, view_name):
+    """Log probable N+1 patterns and slow queries of a request"""
+    for key, count in report.repeated(
+            settings.QUERY_N_PLUS_ONE_THRESHOLD).items():
+        logger.warning(
+            'Probable N+1 in %s: %d queries like %s (from %s)',
+            view_name, count, key, report.origins[key]
+        )
+
+    for sql, duration, origin in report.slow(settings.SLOW_QUERY_SECONDS):
+        logger.warning(
+            'Slow query in %s: %.1f ms %s (from %s)',
+            view_name, duration * 1000, sql, origin
+        )
@@ -0,0 +1,170 @@
+import contextvars
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_framework import exceptions, status
+from rest_framework.permissions import SAFE_METHODS
+
+# Tables holding per user data, split across DATABASE_SHARDS
+SHARDED_MODELS = {
+    'core.recipe', 'core.recipe_tags', 'core.recipe_ingredients',
+    'core.tag', 'core.ingredients', 'core.recipesummary',
+    'core.changelog', 'core.changesequence', 'core.uploadsession',
+}
+
+_current_shard = contextvars.ContextVar('current_shard', default=None)
+
+
+class CrossShardQuery(Exception):
+    """Raised when a query would mix rows of different shards"""
+
+
+class ShardMoving(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your data is being moved, try again shortly.'
+    default_code = 'shard_moving'
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def hash_shard(user_id):
+    """Return the shard a user hashes to, stable across processes"""
+    shards = settings.DATABASE_SHARDS
+    return shards[zlib.crc32(str(user_id).encode()) % len(shards)]
+
+
+def copy_user(user_id, alias):
+    """Copy a user row to a shard so foreign keys to it hold there"""
+    User = get_user_model()
+    if alias == DEFAULT_DB_ALIAS or User.objects.using(alias).filter(
+            pk=user_id).exists():
+        return
+
+    User.objects.using(alias).bulk_create(
+        [User.objects.using(DEFAULT_DB_ALIAS).get(pk=user_id)]
+    )
+
+
+def get_assignment(user_id):
+    """Return the directory entry of a user, assigning a shard if needed
+
+    New users are placed by hash. The directory keeps them on that shard
+    when shards are added, until they are moved explicitly.
+    """
+    from core.models import ShardAssignment
+
+    assignment = ShardAssignment.objects.filter(user_id=user_id).first()
+    if assignment is None:
+        assignment, created = ShardAssignment.objects.get_or_create(
+            user_id=user_id, defaults={'alias': hash_shard(user_id)}
+        )
+        copy_user(user_id, assignment.alias)
+
+    return assignment
+
+
+def shard_for_user(user_id):
+    """Return the alias of a user's shard, None when not sharding"""
+    if not settings.DATABASE_SHARDS:
+        return None
+
+    return get_assignment(user_id).alias
+
+
+@contextmanager
+def use_shard(alias):
+    """Route queries of sharded models in this context to alias"""
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+def current_shard():
+    return _current_shard.get()
+
+
+def each_shard():
+    """Yield every shard alias with queries routed to it
+
+    Yields None once, without routing, when sharding is off.
+    """
+    if not settings.DATABASE_SHARDS:
+        yield None
+        return
+
+    for alias in settings.DATABASE_SHARDS:
+        with use_shard(alias):
+            yield alias
+
+
+class ShardRouter:
+    """Route per user tables to the shard of the user being served
+
+    Code serving a user runs inside use_shard(), which views do through
+    UserShardMixin. A query for an object loaded from another shard than
+    the current one raises CrossShardQuery. Outside a shard context,
+    objects stay on the database they were loaded from and new queries go
+    to the default database. Every database gets the full schema.
+    """
+
+    def _db(self, model, **hints):
+        if not settings.DATABASE_SHARDS or not is_sharded(model):
+            return None
+
+        alias = _current_shard.get()
+        instance = hints.get('instance')
+        instance_db = None
+        if instance is not None and is_sharded(type(instance)):
+            instance_db = instance._state.db
+
+        if alias and instance_db and instance_db != alias:
+            raise CrossShardQuery(
+                f'{type(instance).__name__} {instance.pk} is on '
+                f'{instance_db}, queries are routed to {alias}'
+            )
+
+        return alias or instance_db
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not settings.DATABASE_SHARDS:
+            return None
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+            return obj1._state.db == obj2._state.db
+
+        # Users are copied to the shards holding their data
+        return True
+
+
+class UserShardMixin:
+    """Route the queries of a view to the shard of the requesting user
+
+    Writes are refused while the user's data moves between shards.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not settings.DATABASE_SHARDS:
+            return
+
+        assignment = get_assignment(request.user.pk)
+        if assignment.moving and request.method not in SAFE_METHODS:
+            raise ShardMoving
+        self._shard_token = _current_shard.set(assignment.alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = self.__dict__.pop('_shard_token', None)
+        if token is not None:
+            _current_shard.reset(token)
+
+        return super().finalize_response(request, response, *args, **kwargs)
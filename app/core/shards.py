@@ -0,0 +1,246 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Q
+
+from core import changes
+from core.models import (ChangeLog, ChangeSequence, Ingredients, Recipe,
+                         RecipeSummary, ShardAssignment, Tag, UploadSession)
+from core.purge import PURGE_STAGES
+from core.routers import copy_user, get_assignment, use_shard
+
+TagLink = Recipe.tags.through
+IngredientLink = Recipe.ingredients.through
+
+# Copied in this order, so rows are created after those they point to
+MOVED_MODELS = (Tag, Ingredients, Recipe, TagLink, IngredientLink,
+                RecipeSummary, UploadSession, ChangeSequence, ChangeLog)
+
+# Tables with id sequences, started in a separate range on each shard
+SEQUENCE_MODELS = (Tag, Ingredients, Recipe, TagLink, IngredientLink,
+                   ChangeLog)
+
+# Change feed names of the objects synced after the copy
+SYNCED_MODELS = (
+    (ChangeLog.TAG, Tag),
+    (ChangeLog.INGREDIENT, Ingredients),
+    (ChangeLog.RECIPE, Recipe),
+)
+
+# Recipe links replaced when their recipe or linked object changed
+SYNCED_LINKS = (
+    (TagLink, 'tag_id', ChangeLog.TAG),
+    (IngredientLink, 'ingredients_id', ChangeLog.INGREDIENT),
+)
+
+
+class ShardMoveError(Exception):
+    """Raised when a user cannot be moved to a shard"""
+
+
+def reserve_id_range(alias):
+    """Start the id sequences of a shard past SHARD_ID_SPACING times its
+    position, so moved rows keep ids no other shard hands out
+    """
+    start = max(settings.DATABASE_SHARDS.index(alias) *
+                settings.SHARD_ID_SPACING, 1)
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for model in SEQUENCE_MODELS:
+            table = connection.ops.quote_name(model._meta.db_table)
+            cursor.execute(f'SELECT MAX(id) FROM {table}')
+            value = max(start, cursor.fetchone()[0] or 0)
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)",
+                    [model._meta.db_table, value]
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s',
+                               [model._meta.db_table])
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) '
+                               'VALUES (%s, %s)',
+                               [model._meta.db_table, value])
+            else:
+                raise ShardMoveError(
+                    f'Id ranges are not supported on {connection.vendor}'
+                )
+
+
+def unapplied_migrations(alias):
+    executor = MigrationExecutor(connections[alias])
+    return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+def user_rows(model, user_id):
+    """Return the rows of a user in one of MOVED_MODELS"""
+    if model in (TagLink, IngredientLink):
+        return model.objects.filter(recipe__user_id=user_id)
+
+    return model.objects.filter(user_id=user_id)
+
+
+def _copy(queryset, target, batch_size):
+    """Insert the rows of queryset into target with their ids"""
+    copied = 0
+    last_pk = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        rows = list(batch[:batch_size])
+        if not rows:
+            return copied
+
+        queryset.model.objects.using(target).bulk_create(rows)
+        copied += len(rows)
+        last_pk = rows[-1].pk
+
+
+def release_uploads(user_id):
+    """Delete the upload sessions of a user, keeping their files
+
+    The files are on storage shared by the shards and belong to the
+    sessions copied to the other shard.
+    """
+    sessions = UploadSession.objects.filter(user_id=user_id)
+    sessions.update(name='')
+    sessions.delete()
+
+
+def delete_user_rows(user_id, alias, batch_size):
+    """Delete the data of a user on a shard in short transactions"""
+    with use_shard(alias), changes.muted():
+        release_uploads(user_id)
+        for _, model in PURGE_STAGES:
+            while True:
+                with transaction.atomic(using=alias):
+                    ids = list(model.objects.filter(
+                        user_id=user_id
+                    ).order_by('id').values_list('id', flat=True)[:batch_size])
+                    if not ids:
+                        break
+                    model.objects.filter(id__in=ids).delete()
+        ChangeSequence.objects.filter(user_id=user_id).delete()
+
+
+def copy_user_rows(user_id, source, target, batch_size):
+    """Copy the data of a user from source to target, in batches"""
+    with use_shard(source):
+        querysets = [user_rows(model, user_id) for model in MOVED_MODELS]
+        return sum(_copy(queryset, target, batch_size)
+                   for queryset in querysets)
+
+
+def _sync_objects(model, ids, source, target):
+    """Make the objects ids of model on target match those on source"""
+    current = {obj.pk: obj
+               for obj in model.objects.using(source).filter(pk__in=ids)}
+    existing = set(model.objects.using(target).filter(
+        pk__in=list(current)
+    ).values_list('pk', flat=True))
+
+    fields = [field.name for field in model._meta.concrete_fields
+              if not field.primary_key]
+    model.objects.using(target).bulk_update(
+        [obj for pk, obj in current.items() if pk in existing], fields
+    )
+    model.objects.using(target).bulk_create(
+        [obj for pk, obj in current.items() if pk not in existing]
+    )
+
+    return set(ids) - set(current)
+
+
+def sync_changes(user_id, source, target, since):
+    """Apply to target the changes source logged after seq since"""
+    changed = {name: set() for name, _ in SYNCED_MODELS}
+    entries = ChangeLog.objects.using(source).filter(
+        user_id=user_id, seq__gt=since
+    ).values_list('model', 'object_id')
+    for name, object_id in entries.iterator():
+        changed[name].add(object_id)
+
+    gone = {}
+    for name, model in SYNCED_MODELS:
+        gone[model] = _sync_objects(model, changed[name], source, target)
+
+    with use_shard(target), changes.muted():
+        release_uploads(user_id)
+        for model, ids in gone.items():
+            model.objects.filter(pk__in=ids).delete()
+
+    recipe_ids = changed[ChangeLog.RECIPE]
+    for through, column, name in SYNCED_LINKS:
+        links = through.objects.filter(
+            Q(recipe_id__in=recipe_ids) | Q(**{f'{column}__in': changed[name]})
+        )
+        links.using(target).delete()
+        through.objects.using(target).bulk_create(links.using(source))
+
+    RecipeSummary.objects.using(target).filter(
+        recipe_id__in=recipe_ids
+    ).delete()
+    RecipeSummary.objects.using(target).bulk_create(
+        RecipeSummary.objects.using(source).filter(recipe_id__in=recipe_ids)
+    )
+
+    # Upload sessions are not in the change feed and a user has few
+    UploadSession.objects.using(target).bulk_create(
+        user_rows(UploadSession, user_id).using(source)
+    )
+
+    for model, rows in ((ChangeSequence, user_rows(ChangeSequence, user_id)),
+                        (ChangeLog, user_rows(ChangeLog, user_id).filter(
+                            seq__gt=since))):
+        rows.using(target).delete()
+        model.objects.using(target).bulk_create(rows.using(source))
+
+
+def move_user(user_id, target, batch_size=1000, grace=None, log=None):
+    """Move the data of a user to another shard while they keep using it
+
+    Rows are copied while the user reads and writes on the source shard.
+    Writes are then refused for grace seconds, letting requests that
+    passed the check finish, and the changes logged since the copy began
+    are applied to the target before the user is switched over. The rows
+    left on the source are deleted last.
+    """
+    log = log or (lambda message: None)
+    grace = settings.SHARD_MOVE_GRACE if grace is None else grace
+    if target not in settings.DATABASE_SHARDS:
+        raise ShardMoveError(f'{target} is not one of DATABASE_SHARDS')
+
+    source = get_assignment(user_id).alias
+    if source == target:
+        raise ShardMoveError(f'User {user_id} is already on {target}')
+    for alias in (source, target):
+        if unapplied_migrations(alias):
+            raise ShardMoveError(f'{alias} has unapplied migrations')
+
+    copy_user(user_id, target)
+    delete_user_rows(user_id, target, batch_size)
+
+    since = ChangeSequence.objects.using(source).filter(
+        user_id=user_id
+    ).values_list('last_seq', flat=True).first() or 0
+    copied = copy_user_rows(user_id, source, target, batch_size)
+    log(f'Copied {copied} rows from {source} to {target}')
+
+    ShardAssignment.objects.filter(user_id=user_id).update(moving=True)
+    try:
+        time.sleep(grace)
+        with transaction.atomic(using=target):
+            sync_changes(user_id, source, target, since)
+        ShardAssignment.objects.filter(user_id=user_id).update(alias=target)
+    finally:
+        ShardAssignment.objects.filter(user_id=user_id).update(moving=False)
+    log(f'Switched user {user_id} to {target}')
+
+    delete_user_rows(user_id, source, batch_size)
+    if source != DEFAULT_DB_ALIAS:
+        get_user_model().objects.using(source).filter(pk=user_id).delete()
+    log(f'Deleted the rows left on {source}')
@@ -0,0 +1,9 @@
+from jobs.queue import task
+
+from core import purge
+
+
+@task
+def purge_user(user_id):
+    """Delete a deactivated user and their data in batches"""
+    purge.purge_user(user_id)
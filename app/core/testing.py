@@ -0,0 +1,121 @@
+import re
+from contextlib import ExitStack, contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+
+from core.queries import QueryReport
+from core.routers import SHARDED_MODELS
+
+# Plan lines reading a whole per-user table or sorting rows in memory
+_SQLITE_BAD_PLAN_RE = re.compile(
+    r'^SCAN (?!CONSTANT ROW)(?P<table>\w+)'
+    r'|USE TEMP B-TREE FOR (?:ORDER BY|DISTINCT)'
+)
+_POSTGRES_BAD_PLAN_RE = re.compile(
+    r'Seq Scan on (?P<table>\w+)|->  Sort |^Sort '
+)
+
+
+def explain(queryset):
+    """Return the query plan for a queryset as text
+
+    Test databases are tiny, so Postgres would pick a sequential scan for
+    almost every query. Sequential scans are disabled while explaining so
+    the plan shows which index the query can use on production sized
+    tables.
+    """
+    connection = connections[queryset.db]
+
+    with transaction.atomic(using=queryset.db):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+        return queryset.explain()
+
+
+def per_user_tables():
+    """Return the tables holding rows of a single user"""
+    return {apps.get_model(label)._meta.db_table for label in SHARDED_MODELS}
+
+
+def unindexed_plans(connection, queries, tables):
+    """Return (sql, plan line) of queries scanning or sorting tables"""
+    found = []
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        # Subqueries are reported by alias, so only skip known tables
+        skipped = set(connection.introspection.table_names(cursor))
+        skipped -= set(tables)
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            prefix, pattern = 'EXPLAIN ', _POSTGRES_BAD_PLAN_RE
+        else:
+            prefix, pattern = 'EXPLAIN QUERY PLAN ', _SQLITE_BAD_PLAN_RE
+
+        for sql, params in queries:
+            cursor.execute(prefix + sql, params)
+            for row in cursor.fetchall():
+                line = row[-1].strip()
+                match = pattern.search(line)
+                if match and match.group('table') not in skipped:
+                    found.append((sql, line))
+
+    return found
+
+
+class QueryAssertionsMixin:
+    """TestCase mixin asserting on the queries a block executes"""
+
+    @contextmanager
+    def assertNoNPlusOne(self, threshold=None):
+        """Fail if any query fingerprint repeats threshold times or more"""
+        if threshold is None:
+            threshold = settings.QUERY_N_PLUS_ONE_THRESHOLD
+
+        report = QueryReport()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(report))
+            yield report
+
+        if report.repeated(threshold):
+            self.fail('Probable N+1 queries:\n' +
+                      report.describe_repeated(threshold))
+
+    @contextmanager
+    def assertIndexedQueries(self, tables=None):
+        """Fail if a select in the block scans or sorts a per-user table
+
+        Every select is explained after the block, so the plans show the
+        access path each query has over the seeded data.
+        """
+        if tables is None:
+            tables = per_user_tables()
+
+        queries = {connection.alias: [] for connection in connections.all()}
+
+        def record(alias):
+            def wrapper(execute, sql, params, many, context):
+                if sql.lstrip().upper().startswith('SELECT'):
+                    queries[alias].append((sql, params))
+                return execute(sql, params, many, context)
+            return wrapper
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(record(connection.alias))
+                )
+            yield queries
+
+        found = []
+        for alias, recorded in queries.items():
+            if recorded:
+                found += unindexed_plans(connections[alias], recorded, tables)
+        if found:
+            self.fail('Queries without an index:\n' + '\n'.join(
+                f'{line}: {sql}' for sql, line in found
+            ))
@@ -1,7 +1,10 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from core.admin import ScalableAdmin
+from core.models import Recipe, Tag
+
 
 class AdminSiteTest(TestCase):
 
@@ -38,3 +41,106 @@ class AdminSiteTest(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+
+class ScalableAdminTests(TestCase):
+    """Test the change lists of the large user owned tables"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='abc@123.com',
+            password='password123'
+        )
+        self.client.force_login(self.admin_user)
+        self.user = get_user_model().objects.create_user(
+            email='testuser@123.com',
+            password='pass123'
+        )
+        self.recipes = [
+            Recipe.objects.create(user=self.user, title=f'Recipe {i}',
+                                  time_minutes=5, price=5)
+            for i in range(5)
+        ]
+        self.url = reverse('admin:core_recipe_changelist')
+
+    def result_ids(self, res):
+        return [obj.pk for obj in res.context['cl'].result_list]
+
+    def test_change_pages(self):
+        """Test the recipe, tag and ingredient admin pages work"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        urls = [
+            reverse('admin:core_tag_changelist'),
+            reverse('admin:core_ingredients_changelist'),
+            reverse('admin:core_tag_change', args=[tag.id]),
+            reverse('admin:core_recipe_change', args=[self.recipes[0].id]),
+        ]
+        for url in urls:
+            res = self.client.get(url)
+
+            self.assertEqual(res.status_code, 200)
+
+    def test_cursor_pages(self):
+        """Test pages follow each other by primary key"""
+        first = self.client.get(self.url)
+        self.assertEqual(self.result_ids(first),
+                         [recipe.id for recipe in reversed(self.recipes)])
+
+        # session, admin user, one page of recipes with owners, capped count
+        with self.assertNumQueries(4):
+            res = self.client.get(self.url,
+                                  {'cursor': self.recipes[3].id})
+
+        self.assertEqual(self.result_ids(res),
+                         [self.recipes[2].id, self.recipes[1].id,
+                          self.recipes[0].id])
+
+    @override_settings(ADMIN_COUNT_LIMIT=3)
+    def test_capped_count(self):
+        """Test counts stop at the limit"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.context['cl'].result_count, 3)
+        self.assertContains(res, '3+ recipes')
+
+    def test_next_page_link(self):
+        """Test the next page link starts below the last row"""
+        per_page = ScalableAdmin.list_per_page
+        ScalableAdmin.list_per_page = 2
+        try:
+            res = self.client.get(self.url)
+        finally:
+            ScalableAdmin.list_per_page = per_page
+
+        self.assertEqual(res.context['cl'].next_page_url,
+                         f'?cursor={self.recipes[3].id}')
+
+    def test_search(self):
+        """Test searching by id, owner email and title prefix"""
+        other = get_user_model().objects.create_user(
+            email='other@123.com', password='pass123'
+        )
+        curry = Recipe.objects.create(user=other, title='Curry',
+                                      time_minutes=5, price=5)
+
+        by_id = self.client.get(self.url, {'q': str(curry.id)})
+        by_email = self.client.get(self.url, {'q': 'other@123.com'})
+        by_prefix = self.client.get(self.url, {'q': 'cur'})
+
+        for res in (by_id, by_email, by_prefix):
+            self.assertEqual(self.result_ids(res), [curry.id])
+
+    def test_user_filter(self):
+        """Test filtering by owner lists only the selected user"""
+        other = get_user_model().objects.create_user(
+            email='other@123.com', password='pass123'
+        )
+        Recipe.objects.create(user=other, title='Curry', time_minutes=5,
+                              price=5)
+
+        res = self.client.get(self.url, {'user': self.user.id})
+
+        self.assertEqual(len(self.result_ids(res)), 5)
+        self.assertContains(res, 'testuser@123.com')
+        self.assertNotContains(res, 'other@123.com')
@@ -0,0 +1,140 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+BATCH_URL = reverse('batch')
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class BatchApiTests(TestCase):
+    """Test running several requests in one batch"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+            name='Test',
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def batch(self, *requests, **params):
+        res = self.client.post(BATCH_URL, {'requests': list(requests),
+                                           **params}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return res.data['responses']
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = APIClient().post(BATCH_URL, {'requests': [{'path': ME_URL}]},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_batched_reads(self):
+        """Test every request returns its own status and body"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        responses = self.batch({'path': ME_URL}, {'path': TAGS_URL},
+                               {'path': '/api/missing/'})
+
+        self.assertEqual([item['status'] for item in responses],
+                         [200, 200, 404])
+        self.assertEqual(responses[0]['body']['email'], 'test@123.com')
+        self.assertEqual(responses[1]['body'][0]['name'], 'Vegan')
+        self.assertEqual(responses[0]['headers']['Content-Type'],
+                         'application/json')
+
+    def test_authenticates_once(self):
+        """Test sub-requests reuse the authentication of the batch"""
+        with self.assertNumQueries(3):
+            # token lookup, tags, ingredients
+            self.batch({'path': TAGS_URL},
+                       {'path': reverse('recipe:ingredients-list')})
+
+    def test_writes_in_order(self):
+        """Test writes run in order and report validation errors"""
+        responses = self.batch(
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'Vegan'}},
+            {'method': 'POST', 'path': RECIPES_URL, 'body': {'title': ''}},
+            {'path': f'{TAGS_URL}?assigned_only=0'},
+        )
+
+        self.assertEqual([item['status'] for item in responses],
+                         [201, 400, 200])
+        self.assertEqual(responses[2]['body'][0]['name'], 'Vegan')
+
+    def test_sub_request_headers(self):
+        """Test headers of an item are passed to its view"""
+        item = {'method': 'POST', 'path': RECIPES_URL, 'body': {
+            'title': 'Daal', 'time_minutes': 30, 'price': '5.00',
+            'tags': [], 'ingredients': [],
+        }, 'headers': {'Idempotency-Key': 'abc'}}
+
+        responses = self.batch(item, item)
+
+        self.assertEqual(responses[1]['headers']['Idempotent-Replayed'],
+                         'true')
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_nested_batch_rejected(self):
+        """Test a batch cannot contain another batch"""
+        responses = self.batch({'method': 'POST', 'path': BATCH_URL,
+                                'body': {'requests': []}})
+
+        self.assertEqual(responses[0]['status'], 400)
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_too_many_requests(self):
+        """Test batches over the limit are rejected"""
+        res = self.client.post(BATCH_URL, {
+            'requests': [{'path': ME_URL}] * 3
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_path(self):
+        """Test only API paths can be batched"""
+        res = self.client.post(BATCH_URL, {
+            'requests': [{'path': '/admin/'}]
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ParallelBatchApiTests(TransactionTestCase):
+    """Test concurrent reads, which query from the batch thread pool"""
+
+    def test_parallel_reads(self):
+        """Test parallel reads return the same results in order"""
+        user = get_user_model().objects.create_user('test@123.com',
+                                                    'test1234')
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        Recipe.objects.create(user=user, title='Daal', time_minutes=30,
+                              price='5.00')
+
+        res = client.post(BATCH_URL, {'parallel': True, 'requests': [
+            {'path': ME_URL},
+            {'path': RECIPES_URL},
+            {'path': reverse('recipe:async-tag-list')},
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'Vegan'}},
+            {'path': TAGS_URL},
+        ]}, format='json')
+
+        responses = res.data['responses']
+        self.assertEqual([item['status'] for item in responses],
+                         [200, 200, 200, 201, 200])
+        self.assertEqual(responses[1]['body'][0]['title'], 'Daal')
+        self.assertEqual(responses[4]['body'][0]['name'], 'Vegan')
@@ -1,9 +1,15 @@
+import os
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.db import connection
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from core.models import Tag, Recipe
+
 
 class CommandTests(TestCase):
 
@@ -21,3 +27,36 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+    def test_merge_duplicate_names(self):
+        """test merging tags a user created more than once"""
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX "tag_user_upper_name_uniq"')
+
+        user = get_user_model().objects.create_user('test@123.com', 'pass')
+        kept = Tag.objects.create(user=user, name='Vegan')
+        first = Tag.objects.create(user=user, name='vegan')
+        second = Tag.objects.create(user=user, name='VEGAN')
+        other = Tag.objects.create(user=user, name='Dessert')
+        recipe1 = Recipe.objects.create(user=user, title='Cake',
+                                        time_minutes=5, price=5)
+        recipe1.tags.add(kept, first, other)
+        recipe2 = Recipe.objects.create(user=user, title='Curry',
+                                        time_minutes=5, price=5)
+        recipe2.tags.add(first, second)
+
+        call_command('merge_duplicate_names', batch_size=1)
+
+        self.assertEqual(
+            set(Tag.objects.filter(user=user)), {kept, other}
+        )
+        self.assertEqual(set(recipe1.tags.all()), {kept, other})
+        self.assertEqual(list(recipe2.tags.all()), [kept])
+
+    def test_bench_startup(self):
+        """test startup of each settings module is measured"""
+        out = StringIO()
+        call_command('bench_startup', os.environ['DJANGO_SETTINGS_MODULE'],
+                     runs=1, stdout=out)
+
+        self.assertRegex(out.getvalue(), r'startup [\d.]+ ms, RSS [\d.]+ MiB')
@@ -0,0 +1,129 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+CREATE_USER_URL = reverse('user:create')
+
+
+class IdempotencyKeyTests(TestCase):
+    """Test retried writes carrying an Idempotency-Key"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+        self.payload = {'title': 'Daal', 'time_minutes': 30, 'price': 5}
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_retry_replays_response(self):
+        """Test a retried create returns the first response"""
+        res1 = self.client.post(RECIPES_URL, self.payload,
+                                HTTP_IDEMPOTENCY_KEY='abc')
+        res2 = self.client.post(RECIPES_URL, self.payload,
+                                HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(res1.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res2.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res1.data, res2.data)
+        self.assertEqual(res2['Idempotent-Replayed'], 'true')
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_without_key_creates_each_time(self):
+        """Test requests without a key are not deduplicated"""
+        self.client.post(RECIPES_URL, self.payload)
+        self.client.post(RECIPES_URL, self.payload)
+
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_key_reused_with_different_payload(self):
+        """Test reusing a key for another request is rejected"""
+        self.client.post(RECIPES_URL, self.payload,
+                         HTTP_IDEMPOTENCY_KEY='abc')
+        self.payload['title'] = 'Biryani'
+        res = self.client.post(RECIPES_URL, self.payload,
+                               HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_keys_scoped_to_user(self):
+        """Test the same key from another user is a new request"""
+        self.client.post(RECIPES_URL, self.payload,
+                         HTTP_IDEMPOTENCY_KEY='abc')
+        user2 = get_user_model().objects.create_user(
+            'test1@123.com',
+            'test12345',
+        )
+        self.client.force_authenticate(user2)
+        res = self.client.post(RECIPES_URL, self.payload,
+                               HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    @patch('core.idempotency.cache.add', return_value=False)
+    def test_in_flight_duplicate(self, mock_add):
+        """Test a duplicate of a running request does not execute"""
+        res = self.client.post(RECIPES_URL, self.payload,
+                               HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Retry-After'], '1')
+        self.assertEqual(Recipe.objects.count(), 0)
+
+    def test_response_stored_before_lock_taken(self):
+        """Test a response stored just before the lock is replayed"""
+        self.client.post(RECIPES_URL, self.payload,
+                         HTTP_IDEMPOTENCY_KEY='abc')
+        get = cache.get
+        misses = []
+
+        def first_read_misses(key, *args):
+            # As if the first request had not finished when first read
+            if key.endswith(':response') and not misses:
+                misses.append(key)
+                return None
+            return get(key, *args)
+
+        with patch('core.idempotency.cache.get', first_read_misses):
+            res = self.client.post(RECIPES_URL, self.payload,
+                                   HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(res['Idempotent-Replayed'], 'true')
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_create_user_retry(self):
+        """Test a retried sign up does not create a second user"""
+        client = APIClient()
+        payload = {
+            'email': 'new@123.com',
+            'password': 'pass12345',
+            'name': 'new user',
+        }
+        res1 = client.post(CREATE_USER_URL, payload,
+                           HTTP_IDEMPOTENCY_KEY='signup')
+        res2 = client.post(CREATE_USER_URL, payload,
+                           HTTP_IDEMPOTENCY_KEY='signup')
+
+        self.assertEqual(res1.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res2.data, res1.data)
+        self.assertEqual(
+            get_user_model().objects.filter(email=payload['email']).count(),
+            1
+        )
@@ -0,0 +1,166 @@
+import asyncio
+
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase, TransactionTestCase, \
+                       override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.metrics import Histogram, MetricsRegistry, registry
+from core.middleware import MetricsMiddleware
+from core.models import Recipe, Tag
+
+METRICS_URL = reverse('metrics')
+TAGS_URL = reverse('recipe:tag-list')
+ASYNC_RECIPES_URL = reverse('recipe:async-recipe-list')
+
+
+class HistogramTests(TestCase):
+    """Test the fixed bucket histograms"""
+
+    def test_observe(self):
+        """Test values are counted in cumulative buckets"""
+        histogram = Histogram((1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+
+        self.assertEqual(list(histogram.samples()),
+                         [(1, 2), (5, 3), ('+Inf', 4)])
+        self.assertEqual(histogram.sum, 14.5)
+        self.assertEqual(histogram.count, 4)
+
+    def test_render(self):
+        """Test rendering in the Prometheus text format"""
+        metrics = MetricsRegistry()
+        metrics.register('queries', 'Number of queries', (1,))
+        metrics.observe('queries', 'recipe:tag-list', 2)
+        metrics.register_collector(lambda: ['jobs_queued 3'])
+
+        self.assertEqual(metrics.render(), '\n'.join([
+            '# HELP queries Number of queries',
+            '# TYPE queries histogram',
+            'queries_bucket{route="recipe:tag-list",le="1"} 0',
+            'queries_bucket{route="recipe:tag-list",le="+Inf"} 1',
+            'queries_sum{route="recipe:tag-list"} 2',
+            'queries_count{route="recipe:tag-list"} 1',
+            'jobs_queued 3',
+        ]) + '\n')
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsMiddlewareTests(TestCase):
+    """Test request metrics are recorded by route"""
+
+    def setUp(self):
+        registry.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        registry.clear()
+
+    def test_request_recorded(self):
+        """Test wall time, queries, serializer time and size are kept"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL)
+
+        route = 'recipe:tag-list'
+        self.assertEqual(
+            registry.get('http_request_duration_seconds', route).count, 1
+        )
+        self.assertEqual(registry.get('http_request_queries', route).sum, 1)
+        self.assertGreater(
+            registry.get('http_request_serializer_seconds', route).sum, 0
+        )
+        self.assertEqual(registry.get('http_response_bytes', route).sum,
+                         len(res.content))
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        """Test nothing is recorded when metrics are disabled"""
+        self.client.get(TAGS_URL)
+
+        self.assertIsNone(
+            registry.get('http_request_duration_seconds', 'recipe:tag-list')
+        )
+
+
+@override_settings(METRICS_ENABLED=True)
+class AsyncMetricsMiddlewareTests(TransactionTestCase):
+    """Test request metrics of requests handled in async mode"""
+
+    def setUp(self):
+        registry.clear()
+        user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.token = Token.objects.create(user=user)
+        Recipe.objects.create(user=user, title='Daal', time_minutes=30,
+                              price='5.00')
+
+    def tearDown(self):
+        registry.clear()
+
+    def test_async_handler_kept(self):
+        """Test the middleware does not turn an async chain into sync"""
+        async def get_response(request):
+            pass
+
+        self.assertTrue(
+            asyncio.iscoroutinefunction(MetricsMiddleware(get_response))
+        )
+
+    async def test_thread_pool_queries_counted(self):
+        """Test queries async views run in the thread pool are counted"""
+        res = await AsyncClient().get(
+            ASYNC_RECIPES_URL, authorization=f'Token {self.token.key}'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        route = 'recipe:async-recipe-list'
+        # The token, the recipes and their tags and ingredients
+        self.assertEqual(registry.get('http_request_queries', route).sum, 4)
+        self.assertGreater(registry.get('http_request_db_seconds',
+                                        route).sum, 0)
+
+
+class MetricsApiTests(TestCase):
+    """Test the metrics endpoint is restricted to admins"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_admin_required(self):
+        """Test regular users cannot read metrics"""
+        user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_admin_reads_metrics(self):
+        """Test admins get the Prometheus text format"""
+        admin = get_user_model().objects.create_superuser(
+            'admin@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(admin)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('# TYPE http_request_duration_seconds histogram',
+                      res.content.decode())
@@ -1,4 +1,5 @@
 from unittest.mock import patch
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -51,6 +52,31 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(tag), tag.name)
 
+    def test_tag_name_unique_per_user(self):
+        """Test a user cannot have two tags differing only in case"""
+        user = sample_user()
+        models.Tag.objects.create(user=user, name='Vegan')
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            models.Tag.objects.create(user=user, name='VEGAN')
+
+        other = sample_user(email='other@123.com')
+        models.Tag.objects.create(user=other, name='Vegan')
+
+    def test_get_or_create_for_user(self):
+        """Test get or create matches names ignoring case"""
+        user = sample_user()
+        salt, created = models.Ingredients.objects.get_or_create_for_user(
+            user, 'Salt'
+        )
+        self.assertTrue(created)
+
+        same, created = models.Ingredients.objects.get_or_create_for_user(
+            user, 'salt'
+        )
+        self.assertFalse(created)
+        self.assertEqual(same, salt)
+
     def test_ingredient_str(self):
         """Test the ingredient string representation"""
 
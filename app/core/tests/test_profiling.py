@@ -0,0 +1,120 @@
+import os
+import tempfile
+import time
+from collections import Counter
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.async_views import run_sync
+from core.profiling import ProfileStore, StackSampler, profiling_token, \
+                           read_profile
+
+
+def busy_wait(seconds):
+    """Keep the current thread running for a while"""
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+class StackSamplerTests(TestCase):
+    """Test sampling the stack of the current thread"""
+
+    def test_samples_current_stack(self):
+        """Test the running function appears in the sampled stacks"""
+        with StackSampler(0.001) as sampler:
+            busy_wait(0.05)
+
+        self.assertTrue(sampler.stacks)
+        self.assertTrue(any(stack.endswith('test_profiling:busy_wait')
+                            for stack in sampler.stacks))
+
+    def test_follows_run_sync(self):
+        """Test blocking calls run in the thread pool are sampled"""
+        with StackSampler(0.001) as sampler:
+            async_to_sync(run_sync)(busy_wait, 0.05)
+
+        self.assertTrue(any(
+            'core.async_views:_call_closing_connections' in stack and
+            stack.endswith('test_profiling:busy_wait')
+            for stack in sampler.stacks
+        ))
+
+
+class ProfileStoreTests(TestCase):
+    """Test the bounded profile directory"""
+
+    def test_oldest_profiles_removed(self):
+        """Test only the newest profiles are kept"""
+        with tempfile.TemporaryDirectory() as directory:
+            store = ProfileStore(directory, max_profiles=2)
+            for count in (1, 2, 3):
+                store.save('recipe:recipe-list', Counter({'a;b': count}))
+
+            paths = store.paths()
+
+            self.assertEqual(len(paths), 2)
+            self.assertEqual(read_profile(paths[0]), {'a;b': 2})
+            self.assertEqual(read_profile(paths[1]), {'a;b': 3})
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Test profiling requests through the middleware"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            PROFILING_ENABLED=True,
+            PROFILING_SAMPLE_RATE=0,
+            PROFILING_INTERVAL=0.0005,
+            PROFILING_DIR=self.directory.name,
+        )
+        self.settings.enable()
+        user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.store = ProfileStore(self.directory.name, 10)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.directory.cleanup()
+
+    def test_signed_header_profiles_request(self):
+        """Test a signed X-Profile header forces a profile"""
+        for _ in range(5):
+            self.client.get(reverse('recipe:recipe-list'),
+                            HTTP_X_PROFILE=profiling_token())
+
+        self.assertTrue(self.store.paths())
+        self.assertIn('recipe.recipe-list', self.store.paths()[0])
+
+    def test_unsigned_header_ignored(self):
+        """Test a forged header does not profile the request"""
+        self.client.get(reverse('recipe:recipe-list'),
+                        HTTP_X_PROFILE='profile')
+
+        self.assertEqual(self.store.paths(), [])
+
+    def test_collapse_profiles(self):
+        """Test stored profiles are summed into one collapsed file"""
+        self.store.save('recipe:recipe-list', Counter({'a;b': 2, 'a': 1}))
+        self.store.save('recipe:tag-list', Counter({'a;b': 3}))
+        output = os.path.join(self.directory.name, 'out.txt')
+
+        call_command('collapse_profiles', output)
+        with open(output) as collapsed:
+            self.assertEqual(collapsed.read(), 'a 1\na;b 5\n')
+
+        call_command('collapse_profiles', output, route='recipe:tag-list')
+        with open(output) as collapsed:
+            self.assertEqual(collapsed.read(), 'a;b 3\n')
@@ -0,0 +1,150 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import (ChangeLog, Tag, Ingredients, Recipe, Job,
+                         UploadSession, UserPurge)
+from core.purge import purge_user, schedule_user_purge
+from recipe.uploads import create_session
+
+
+def sample_user(email='test@123.com'):
+    """Create a user owning a few recipes, tags and ingredients"""
+    user = get_user_model().objects.create_user(email, 'test1234')
+    for i in range(3):
+        recipe = Recipe.objects.create(user=user, title=f'Recipe {i}',
+                                       time_minutes=5, price=5)
+        recipe.tags.add(Tag.objects.create(user=user, name=f'Tag {i}'))
+        recipe.ingredients.add(
+            Ingredients.objects.create(user=user, name=f'Ingredient {i}')
+        )
+
+    return user
+
+
+class UserPurgeTests(TestCase):
+    """Test deleting users in batches"""
+
+    def setUp(self):
+        self.user = sample_user()
+        self.other = sample_user('other@123.com')
+
+    def test_schedule_deactivates_user(self):
+        """Test scheduling a purge deactivates the user immediately"""
+        Token.objects.create(user=self.user)
+
+        schedule_user_purge(self.user)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertTrue(Job.objects.filter(
+            task='core.tasks.purge_user', payload={'user_id': self.user.id}
+        ).exists())
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 3)
+
+    def test_purge_user(self):
+        """Test the user and all of their data is deleted"""
+        purge = purge_user(self.user.id, batch_size=2)
+
+        self.assertIsNotNone(purge.finished_at)
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists()
+        )
+        self.assertFalse(Recipe.objects.filter(user_id=self.user.id).exists())
+        self.assertFalse(Tag.objects.filter(user_id=self.user.id).exists())
+        self.assertEqual(Recipe.objects.filter(user=self.other).count(), 3)
+        self.assertEqual(Tag.objects.filter(user=self.other).count(), 3)
+        self.assertFalse(
+            ChangeLog.objects.filter(user_id=self.user.id).exists()
+        )
+
+    def test_purge_deletes_uploads(self):
+        """Test uploads in progress are deleted with their files"""
+        session = create_session(self.user, self.user.recipe_set.first(),
+                                 'curry.jpg', 100)
+        self.addCleanup(default_storage.delete, session.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purge_user(self.user.id, batch_size=2)
+
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(default_storage.exists(session.name))
+
+    def test_purge_skips_linked_recipes(self):
+        """Test deleted tags and ingredients do not look up their recipes"""
+        with patch('recipe.signals._linked_recipe_ids') as linked:
+            purge_user(self.user.id, batch_size=2)
+
+        linked.assert_not_called()
+        self.assertFalse(Job.objects.filter(
+            task='recipe.tasks.refresh_summaries'
+        ).exists())
+
+    def test_purge_resumes(self):
+        """Test an interrupted purge continues from its stage"""
+        Recipe.objects.filter(user=self.user).delete()
+        UserPurge.objects.create(user_id=self.user.id, stage='tags',
+                                 deleted_rows=9)
+        logged = ChangeLog.objects.filter(user=self.user).count()
+
+        purge = purge_user(self.user.id, batch_size=2)
+
+        self.assertEqual(purge.stage, 'done')
+        self.assertEqual(purge.deleted_rows, 15 + logged)
+        self.assertFalse(
+            Ingredients.objects.filter(user_id=self.user.id).exists()
+        )
+
+    def test_purge_users_command(self):
+        """Test the command finishes pending purges"""
+        schedule_user_purge(self.user)
+
+        call_command('purge_users', batch_size=1)
+
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists()
+        )
+
+
+class DeleteUserApiTests(TestCase):
+    """Test deleting users through the API and the admin"""
+
+    def test_delete_me(self):
+        """Test deleting the own account deactivates it at once"""
+        user = sample_user()
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.delete(reverse('user:me'))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        user.refresh_from_db()
+        self.assertFalse(user.is_active)
+        self.assertTrue(UserPurge.objects.filter(user_id=user.id).exists())
+
+    def test_admin_delete(self):
+        """Test deleting a user in the admin schedules a purge"""
+        admin = get_user_model().objects.create_superuser('admin@123.com',
+                                                          'test1234')
+        user = sample_user()
+        client = Client()
+        client.force_login(admin)
+        url = reverse('admin:core_user_delete', args=[user.id])
+
+        res = client.get(url)
+        self.assertContains(res, user.email)
+
+        client.post(url, {'post': 'yes'})
+
+        user.refresh_from_db()
+        self.assertFalse(user.is_active)
+        self.assertTrue(UserPurge.objects.filter(user_id=user.id).exists())
@@ -0,0 +1,98 @@
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.async_views import run_sync
+from core.models import Tag
+from core.queries import QueryReport, fingerprint, wrap_queries
+from core.testing import QueryAssertionsMixin
+
+
+class FingerprintTests(TestCase):
+    """Test normalizing SQL into fingerprints"""
+
+    def test_literals_normalized(self):
+        """Test string and number literals are replaced"""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x' AND b = 12"),
+            fingerprint("SELECT *  FROM t WHERE a = 'y''s' AND b = 3.5"),
+        )
+
+    def test_in_lists_collapsed(self):
+        """Test IN lists of any length share a fingerprint"""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            'SELECT * FROM t WHERE id IN (...)',
+        )
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+            'SELECT * FROM t WHERE id IN (...)',
+        )
+
+
+class QueryReportTests(QueryAssertionsMixin, TestCase):
+    """Test detecting repeated queries"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        for name in ('Vegan', 'Dessert', 'Spicy'):
+            Tag.objects.create(user=self.user, name=name)
+
+    def test_repeated_queries_reported(self):
+        """Test a query per row is reported with its origin"""
+        with self.assertRaises(AssertionError) as cm:
+            with self.assertNoNPlusOne(threshold=3):
+                for tag in Tag.objects.all():
+                    Tag.objects.get(id=tag.id)
+
+        self.assertIn('3x', str(cm.exception))
+        self.assertIn('core/tests/test_queries.py', str(cm.exception))
+
+    def test_single_query_passes(self):
+        """Test set based access is not reported"""
+        with self.assertNoNPlusOne(threshold=2) as report:
+            list(Tag.objects.filter(id__in=[1, 2, 3]))
+
+        self.assertIsInstance(report, QueryReport)
+        self.assertEqual(len(report.queries), 1)
+
+
+class WrapQueriesTests(TransactionTestCase):
+    """Test execute wrappers following the context of the request"""
+
+    def test_wrapper_follows_run_sync(self):
+        """Test queries sent to the async view thread pool are wrapped"""
+        report = QueryReport()
+        with wrap_queries(report):
+            async_to_sync(run_sync)(Tag.objects.count)
+
+        self.assertEqual(len(report.queries), 1)
+        self.assertIn('core_tag', report.queries[0][1])
+
+
+@override_settings(QUERY_INSPECTION_SAMPLE_RATE=1,
+                   QUERY_N_PLUS_ONE_THRESHOLD=2,
+                   SLOW_QUERY_SECONDS=0)
+class QueryInspectionMiddlewareTests(TestCase):
+    """Test requests are inspected for slow queries"""
+
+    def test_slow_query_logged(self):
+        """Test queries over the threshold are logged with the view"""
+        user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with self.assertLogs('core.queries', level='WARNING') as logs:
+            client.get(reverse('recipe:tag-list'))
+
+        self.assertIn('Slow query in recipe:tag-list', logs.output[0])
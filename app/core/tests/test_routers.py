@@ -0,0 +1,367 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import (ChangeLog, Ingredients, Recipe, RecipeSummary,
+                         ShardAssignment, Tag, UploadSession)
+from core.purge import purge_user
+from core.routers import (CrossShardQuery, copy_user, hash_shard,
+                          shard_for_user, use_shard)
+from core.shards import reserve_id_range
+from recipe.uploads import create_session
+
+SHARDS = ['shard1', 'shard2']
+
+RECIPES_URL = reverse('recipe:recipe-list')
+ASYNC_RECIPES_URL = reverse('recipe:async-recipe-list')
+CHANGES_URL = reverse('recipe:changes')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardTestCase(TransactionTestCase):
+    """Base class adding SQLite shard databases next to the default one
+
+    The shards are set up here rather than listed in databases, which the
+    test runner would look up in DATABASES before any test runs.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.databases = {'default', *SHARDS}
+        cls.shard_dir = tempfile.mkdtemp()
+        for alias in SHARDS:
+            connections.databases[alias] = {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.shard_dir, f'{alias}.sqlite3'),
+            }
+            connections.ensure_defaults(alias)
+            connections.prepare_test_settings(alias)
+            call_command('migrate', database=alias, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.shard_dir)
+
+    def create_user(self, email, alias):
+        """Create a user whose data lives on the given shard"""
+        user = get_user_model().objects.create_user(email, 'test1234')
+        ShardAssignment.objects.create(user=user, alias=alias)
+        copy_user(user.pk, alias)
+
+        return user
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+
+        return client
+
+
+class ShardRouterTests(ShardTestCase):
+    """Test per user data is routed to the shard of its owner"""
+
+    def setUp(self):
+        self.user = self.create_user('test@123.com', 'shard1')
+        self.client = self.client_for(self.user)
+
+    def test_hash_assignment(self):
+        """Test new users are placed by hash and copied to their shard"""
+        user = get_user_model().objects.create_user('new@123.com', 'pass')
+
+        alias = shard_for_user(user.pk)
+
+        self.assertEqual(alias, hash_shard(user.pk))
+        self.assertIn(alias, SHARDS)
+        self.assertEqual(ShardAssignment.objects.get(user=user).alias, alias)
+        self.assertTrue(get_user_model().objects.using(alias).filter(
+            pk=user.pk).exists())
+
+    def test_api_writes_to_user_shard(self):
+        """Test recipes created through the API go to the user's shard"""
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Daal', 'time_minutes': 30, 'price': '5.00',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Recipe.objects.using('shard1').filter(
+            id=res.data['id']).exists())
+        self.assertFalse(Recipe.objects.using('shard2').exists())
+        self.assertFalse(Recipe.objects.using('default').exists())
+        self.assertEqual(RecipeSummary.objects.using('shard1').count(), 1)
+        self.assertEqual(ChangeLog.objects.using('shard1').count(), 1)
+
+    def test_users_isolated_by_shard(self):
+        """Test each user reads only their own shard"""
+        other = self.create_user('other@123.com', 'shard2')
+        with use_shard('shard1'):
+            recipe = Recipe.objects.create(user=self.user, title='Daal',
+                                           time_minutes=30, price='5.00')
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual([item['id'] for item in res.data],
+                         [recipe.id])
+
+        other_client = self.client_for(other)
+        self.assertEqual(other_client.get(RECIPES_URL).data, [])
+        res = other_client.get(detail_url(recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_async_view_routed(self):
+        """Test async views read from the user's shard"""
+        with use_shard('shard1'):
+            Recipe.objects.create(user=self.user, title='Daal',
+                                  time_minutes=30, price='5.00')
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = client.get(ASYNC_RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()[0]['title'], 'Daal')
+
+    def test_cross_shard_query_forbidden(self):
+        """Test objects of one shard cannot be queried from another"""
+        with use_shard('shard1'):
+            recipe = Recipe.objects.create(user=self.user, title='Daal',
+                                           time_minutes=30, price='5.00')
+
+        with use_shard('shard2'):
+            with self.assertRaises(CrossShardQuery):
+                list(recipe.tags.all())
+
+        copy_user(self.user.pk, 'shard2')
+        with use_shard('shard2'):
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+        with self.assertRaises(ValueError):
+            recipe.tags.add(tag)
+
+    def test_writes_refused_while_moving(self):
+        """Test a user being moved can read but not write"""
+        ShardAssignment.objects.filter(user=self.user).update(moving=True)
+
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Daal', 'time_minutes': 30, 'price': '5.00',
+        })
+        self.assertEqual(res.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_purge_sharded_user(self):
+        """Test purging a user removes their shard data and copy"""
+        with use_shard('shard1'):
+            recipe = Recipe.objects.create(user=self.user, title='Daal',
+                                           time_minutes=30, price='5.00')
+            recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        purge_user(self.user.pk)
+
+        for model in (Recipe, Tag, ChangeLog):
+            self.assertFalse(model.objects.using('shard1').exists())
+        self.assertFalse(get_user_model().objects.using('shard1').exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_admin_lists_shard(self):
+        """Test the admin lists and edits rows of the picked shard"""
+        with use_shard('shard1'):
+            recipe = Recipe.objects.create(user=self.user, title='Daal',
+                                           time_minutes=30, price='5.00')
+        admin_user = get_user_model().objects.create_superuser(
+            'admin@123.com', 'test1234'
+        )
+        self.client.force_login(admin_user)
+
+        res = self.client.get(reverse('admin:core_recipe_changelist'),
+                              {'shard': 'shard1'})
+        self.assertContains(res, 'Daal')
+        res = self.client.get(reverse('admin:core_recipe_changelist'),
+                              {'shard': 'shard2'})
+        self.assertNotContains(res, 'Daal')
+
+        res = self.client.get(reverse('admin:core_recipe_change',
+                                      args=[recipe.id]))
+        self.assertContains(res, 'Daal')
+
+    def test_admin_writes_refused_while_moving(self):
+        """Test the admin does not write data of a user being moved"""
+        with use_shard('shard1'):
+            recipe = Recipe.objects.create(user=self.user, title='Daal',
+                                           time_minutes=30, price='5.00')
+        admin_user = get_user_model().objects.create_superuser(
+            'admin@123.com', 'test1234'
+        )
+        self.client.force_login(admin_user)
+        ShardAssignment.objects.filter(user=self.user).update(moving=True)
+
+        change_url = reverse('admin:core_recipe_change', args=[recipe.id])
+        res = self.client.post(change_url, {
+            'user': self.user.pk, 'title': 'Soup', 'time_minutes': 10,
+            'price': '2.00',
+        })
+        self.assertRedirects(res, change_url)
+        res = self.client.post(
+            reverse('admin:core_recipe_delete', args=[recipe.id]),
+            {'post': 'yes'}
+        )
+        self.assertEqual(res.status_code, 302)
+        res = self.client.post(reverse('admin:core_recipe_add'), {
+            'user': self.user.pk, 'title': 'Soup', 'time_minutes': 10,
+            'price': '2.00',
+        })
+        self.assertEqual(res.status_code, 302)
+
+        self.assertEqual(
+            list(Recipe.objects.using('shard1').values_list('title',
+                                                            flat=True)),
+            ['Daal']
+        )
+
+    @override_settings(SHARD_ID_SPACING=1000)
+    def test_reserve_id_range(self):
+        """Test shards hand out ids from separate ranges"""
+        reserve_id_range('shard2')
+        copy_user(self.user.pk, 'shard2')
+
+        with use_shard('shard2'):
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        self.assertGreater(tag.id, 1000)
+
+
+class MoveUserShardTests(ShardTestCase):
+    """Test moving a user's data between shards"""
+
+    def setUp(self):
+        self.user = self.create_user('test@123.com', 'shard1')
+        self.client = self.client_for(self.user)
+        with use_shard('shard1'):
+            self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+            self.salt = Ingredients.objects.create(user=self.user,
+                                                   name='Salt')
+            self.curry = Recipe.objects.create(user=self.user, title='Curry',
+                                               time_minutes=30, price='5.00')
+            self.curry.tags.add(self.vegan)
+            self.curry.ingredients.add(self.salt)
+            self.cake = Recipe.objects.create(user=self.user, title='Cake',
+                                              time_minutes=60, price='3.00')
+
+    def move(self, *args):
+        call_command('move_user_shard', self.user.pk, 'shard2', '--grace=0',
+                     *args, stdout=StringIO())
+
+    def snapshot(self, alias):
+        """Return the user's rows on a shard, for comparing shards"""
+        with use_shard(alias):
+            recipes = Recipe.objects.filter(user=self.user).order_by('id')
+            return {
+                'recipes': [
+                    (recipe.id, recipe.title,
+                     sorted(recipe.tags.values_list('id', flat=True)),
+                     sorted(recipe.ingredients.values_list('id', flat=True)))
+                    for recipe in recipes
+                ],
+                'tags': list(Tag.objects.order_by('id').values_list(
+                    'id', 'name')),
+                'summaries': list(RecipeSummary.objects.order_by(
+                    'recipe_id').values_list('recipe_id', 'title',
+                                             'tag_names')),
+                'changes': list(ChangeLog.objects.order_by('seq').values_list(
+                    'seq', 'model', 'object_id', 'deleted')),
+            }
+
+    def test_move_user(self):
+        """Test a user's data is moved and served from the new shard"""
+        before = self.snapshot('shard1')
+        cursor = self.client.get(CHANGES_URL).data['cursor']
+
+        self.move()
+
+        self.assertEqual(ShardAssignment.objects.get(user=self.user).alias,
+                         'shard2')
+        self.assertEqual(self.snapshot('shard2'), before)
+        for model in (Recipe, Tag, Ingredients, RecipeSummary, ChangeLog):
+            self.assertFalse(model.objects.using('shard1').exists())
+        self.assertFalse(get_user_model().objects.using('shard1').exists())
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 2)
+        res = self.client.get(CHANGES_URL, {'since': cursor})
+        self.assertEqual(res.data['changes'], [])
+
+    def test_changes_during_move_synced(self):
+        """Test writes made while rows are copied reach the new shard"""
+        def write_during_move(seconds):
+            with use_shard('shard1'):
+                self.vegan.name = 'Plant based'
+                self.vegan.save()
+                self.curry.ingredients.clear()
+                self.cake.delete()
+                recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                               time_minutes=10, price='2.00')
+                recipe.tags.add(self.vegan)
+
+        with mock.patch('core.shards.time.sleep',
+                        side_effect=write_during_move):
+            self.move()
+
+        self.assertEqual(self.snapshot('shard2')['recipes'], [
+            (self.curry.id, 'Curry', [self.vegan.id], []),
+            (self.curry.id + 2, 'Soup', [self.vegan.id], []),
+        ])
+        self.assertEqual(self.snapshot('shard2')['tags'],
+                         [(self.vegan.id, 'Plant based')])
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual([item['title'] for item in res.data],
+                         ['Soup', 'Curry'])
+        self.assertFalse(Recipe.objects.using('shard1').exists())
+
+    def test_upload_sessions_moved(self):
+        """Test uploads in progress move with the user, keeping their file"""
+        with use_shard('shard1'):
+            session = create_session(self.user, self.curry, 'curry.jpg', 100)
+        self.addCleanup(default_storage.delete, session.name)
+
+        def write_during_move(seconds):
+            UploadSession.objects.using('shard1').filter(
+                id=session.id
+            ).update(offset=50)
+
+        with mock.patch('core.shards.time.sleep',
+                        side_effect=write_during_move):
+            self.move()
+
+        self.assertFalse(UploadSession.objects.using('shard1').exists())
+        moved = UploadSession.objects.using('shard2').get()
+        self.assertEqual((moved.id, moved.name, moved.offset),
+                         (session.id, session.name, 50))
+        self.assertTrue(default_storage.exists(session.name))
+
+    def test_move_to_same_shard(self):
+        """Test moving a user to the shard they are on fails"""
+        with self.assertRaises(CommandError):
+            call_command('move_user_shard', self.user.pk, 'shard1',
+                         stdout=StringIO())
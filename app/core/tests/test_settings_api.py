@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from app import settings_api
+
+
+@override_settings(ROOT_URLCONF='app.urls_api',
+                   MIDDLEWARE=settings_api.MIDDLEWARE)
+class ApiSettingsTests(TestCase):
+    """Test the API-only profile serves the API without sessions"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+
+    def test_unused_apps_removed(self):
+        """Test the admin, sessions and CSRF are left out"""
+        self.assertNotIn('django.contrib.admin', settings_api.INSTALLED_APPS)
+        self.assertNotIn('django.middleware.csrf.CsrfViewMiddleware',
+                         settings_api.MIDDLEWARE)
+
+    def test_token_requests_served(self):
+        """Test token authenticated requests are served"""
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = self.client.get(reverse('recipe:tag-list'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_login(self):
+        """Test logging in works without CSRF or sessions"""
+        client = APIClient(enforce_csrf_checks=True)
+
+        res = client.post(reverse('user:token'), {
+            'email': 'test@123.com', 'password': 'test1234',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_admin_not_routed(self):
+        """Test the admin is not served"""
+        res = self.client.get('/admin/')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,42 @@
+from django.http import HttpResponse
+
+from rest_framework import authentication, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.batch import run_batch
+from core.metrics import registry
+from core.serializers import BatchSerializer
+
+
+class MetricsView(APIView):
+    """Expose request metrics in the Prometheus text format"""
+    authentication_classes = (authentication.TokenAuthentication,
+                              authentication.SessionAuthentication)
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class BatchView(APIView):
+    """Run several API requests in one round trip
+
+    Sub-requests share the authentication of the batch and skip the
+    middleware. Each returns its own status, headers and body.
+    """
+    authentication_classes = (authentication.TokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return Response({'responses': run_batch(
+            request,
+            serializer.validated_data['requests'],
+            serializer.validated_data['parallel'],
+        )})
@@ -0,0 +1,23 @@
+"""Gunicorn settings
+
+The app is loaded once in the master before workers are forked, so the
+imported modules live in memory pages every worker shares copy-on-write.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS',
+                             multiprocessing.cpu_count() * 2 + 1))
+wsgi_app = 'app.wsgi:application'
+preload_app = True
+
+
+def pre_fork(server, worker):
+    """Keep the objects of the loaded app away from the collector
+
+    A collection writes to the header of every object it visits, copying
+    the shared pages into each worker. Frozen objects are never visited.
+    """
+    gc.freeze()
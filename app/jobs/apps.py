@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+
+    def ready(self):
+        from core.metrics import registry
+        from jobs.queue import collect_metrics
+
+        registry.register_collector(collect_metrics)
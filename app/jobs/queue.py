@@ -0,0 +1,190 @@
+import datetime
+import random
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from core.models import Job
+
+TASKS = {}
+
+
+def task(func):
+    """Register a function as a task the workers can run
+
+    Tasks are called with the job payload as keyword arguments and are
+    referred to by their dotted path.
+    """
+    TASKS[f'{func.__module__}.{func.__name__}'] = func
+    func.task_name = f'{func.__module__}.{func.__name__}'
+
+    return func
+
+
+def enqueue(func, payload=None, priority=0, delay=0, idempotency_key=None,
+            max_attempts=None):
+    """Queue a call of a task with payload as kwargs, returning its job
+
+    Enqueueing again with the same idempotency_key returns the existing
+    job instead of queueing the work twice.
+    """
+    fields = {
+        'task': getattr(func, 'task_name', func),
+        'payload': payload or {},
+        'priority': priority,
+        'run_at': timezone.now() + datetime.timedelta(seconds=delay),
+        'max_attempts': max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    }
+    if idempotency_key is None:
+        return Job.objects.create(**fields)
+
+    job, _ = Job.objects.get_or_create(idempotency_key=idempotency_key,
+                                       defaults=fields)
+    return job
+
+
+def _ready_jobs():
+    return Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=timezone.now()
+    ).order_by('-priority', 'run_at', 'id')
+
+
+def claim(worker_name):
+    """Mark the next ready job as running for this worker and return it
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED where supported, so concurrent
+    workers never wait on each other. Other databases fall back to a
+    compare and set update on the job status.
+    """
+    now = timezone.now()
+    running = {
+        'status': Job.RUNNING,
+        'locked_by': worker_name,
+        'started_at': now,
+        'heartbeat_at': now,
+        'attempts': F('attempts') + 1,
+    }
+    db = router.db_for_write(Job)
+
+    if connections[db].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=db):
+            job_id = _ready_jobs().select_for_update(
+                skip_locked=True
+            ).values_list('id', flat=True).first()
+            if job_id is None:
+                return None
+            Job.objects.filter(id=job_id).update(**running)
+        return Job.objects.get(id=job_id)
+
+    for job_id in _ready_jobs().values_list('id', flat=True)[:10]:
+        if Job.objects.filter(id=job_id, status=Job.QUEUED).update(**running):
+            return Job.objects.get(id=job_id)
+
+    return None
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying after a number of failed attempts"""
+    delay = settings.JOBS_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+    delay = min(delay, settings.JOBS_RETRY_MAX_DELAY)
+
+    return delay * random.uniform(0.8, 1.2)
+
+
+def complete(job, worker_name):
+    """Mark a job as done, returning False if it was requeued meanwhile"""
+    return bool(Job.objects.filter(id=job.id, locked_by=worker_name).update(
+        status=Job.DONE, finished_at=timezone.now(), locked_by=''
+    ))
+
+
+def fail(job, error, worker_name):
+    """Schedule a retry of a failed job, or give up after max attempts
+
+    Returns False if the job was requeued meanwhile and left as it is.
+    """
+    claimed = Job.objects.filter(id=job.id, locked_by=worker_name)
+    if job.attempts < job.max_attempts:
+        return bool(claimed.update(
+            status=Job.QUEUED,
+            run_at=timezone.now() + datetime.timedelta(
+                seconds=backoff(job.attempts)
+            ),
+            locked_by='',
+            last_error=error,
+        ))
+
+    return bool(claimed.update(
+        status=Job.FAILED, finished_at=timezone.now(), locked_by='',
+        last_error=error,
+    ))
+
+
+def heartbeat(job, worker_name):
+    """Mark a job as still running, returning False if it was requeued"""
+    return bool(Job.objects.filter(
+        id=job.id, status=Job.RUNNING, locked_by=worker_name
+    ).update(heartbeat_at=timezone.now()))
+
+
+def requeue_stale():
+    """Return jobs of workers that died while running them to the queue
+
+    A job is stale once its worker sent no heartbeat for JOBS_LOCK_TIMEOUT
+    seconds, however long it has been running. The lost run counts as an
+    attempt, jobs out of attempts are failed instead, so a job killing
+    its workers is not retried forever.
+    """
+    now = timezone.now()
+    cutoff = now - datetime.timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    # Jobs claimed before heartbeats existed only have started_at
+    stale = Job.objects.filter(
+        Q(heartbeat_at__lt=cutoff) |
+        Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=Job.RUNNING,
+    )
+    error = 'The worker stopped while running the job'
+
+    # attempts was incremented when the lost run was claimed
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, locked_by='', last_error=error
+    )
+    return failed + stale.update(status=Job.QUEUED, locked_by='',
+                                 last_error=error)
+
+
+def prune_finished():
+    """Delete finished jobs older than JOBS_KEEP_FINISHED seconds"""
+    cutoff = timezone.now() - datetime.timedelta(
+        seconds=settings.JOBS_KEEP_FINISHED
+    )
+    ids = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED), finished_at__lt=cutoff
+    ).values_list('id', flat=True)[:1000]
+
+    return Job.objects.filter(id__in=list(ids)).delete()[0]
+
+
+def collect_metrics():
+    """Prometheus gauges for queue depth and the wait of the oldest job"""
+    depth = dict(Job.objects.values_list('status').annotate(Count('id')))
+    oldest = _ready_jobs().aggregate(oldest=Min('run_at'))['oldest']
+    wait = (timezone.now() - oldest).total_seconds() if oldest else 0
+
+    lines = [
+        '# HELP jobs_queue_depth Jobs by status',
+        '# TYPE jobs_queue_depth gauge',
+    ]
+    for status, _ in Job.STATUS_CHOICES:
+        lines.append(
+            f'jobs_queue_depth{{status="{status}"}} {depth.get(status, 0)}'
+        )
+    lines += [
+        '# HELP jobs_oldest_ready_seconds Wait of the oldest ready job',
+        '# TYPE jobs_oldest_ready_seconds gauge',
+        f'jobs_oldest_ready_seconds {wait}',
+    ]
+
+    return lines
@@ -0,0 +1,198 @@
+import datetime
+import time
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Job
+
+from jobs import queue
+from jobs.worker import Worker
+
+CALLS = []
+
+
+@queue.task
+def record(value):
+    """Task remembering the values it was called with"""
+    CALLS.append(value)
+
+
+@queue.task
+def wait(seconds):
+    """Task running for a while"""
+    time.sleep(seconds)
+
+
+@queue.task
+def explode():
+    """Task always failing"""
+    raise ValueError('boom')
+
+
+class QueueTests(TestCase):
+    """Test queueing and claiming jobs"""
+
+    def setUp(self):
+        CALLS.clear()
+
+    def test_enqueue(self):
+        """Test a job is queued with its task path and payload"""
+        job = queue.enqueue(record, {'value': 1})
+
+        self.assertEqual(job.task, 'jobs.tests.test_queue.record')
+        self.assertEqual(job.payload, {'value': 1})
+        self.assertEqual(job.status, Job.QUEUED)
+
+    def test_enqueue_idempotent(self):
+        """Test the same idempotency key queues the work once"""
+        job1 = queue.enqueue(record, {'value': 1}, idempotency_key='a')
+        job2 = queue.enqueue(record, {'value': 2}, idempotency_key='a')
+
+        self.assertEqual(job1, job2)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_claim_by_priority(self):
+        """Test higher priority jobs are claimed first"""
+        queue.enqueue(record, {'value': 'low'})
+        urgent = queue.enqueue(record, {'value': 'high'}, priority=10)
+
+        job = queue.claim('worker-1')
+
+        self.assertEqual(job, urgent)
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.locked_by, 'worker-1')
+
+    def test_claim_skips_delayed_and_claimed(self):
+        """Test delayed and already claimed jobs are not claimed"""
+        queue.enqueue(record, {'value': 1}, delay=60)
+        queue.enqueue(record, {'value': 2})
+
+        self.assertIsNotNone(queue.claim('worker-1'))
+        self.assertIsNone(queue.claim('worker-2'))
+
+    def test_run_job(self):
+        """Test running a job calls the task and completes it"""
+        job = queue.enqueue(record, {'value': 'done'})
+
+        self.assertTrue(Worker('w').run_once())
+
+        job.refresh_from_db()
+        self.assertEqual(CALLS, ['done'])
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_failed_job_retried_with_backoff(self):
+        """Test a failing job is queued again for later"""
+        job = queue.enqueue(explode, max_attempts=2)
+
+        with self.assertLogs('jobs.worker'):
+            Worker('w').run_once()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('ValueError: boom', job.last_error)
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        with self.assertLogs('jobs.worker'):
+            Worker('w').run_once()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    @override_settings(JOBS_LOCK_TIMEOUT=60)
+    def test_requeue_stale(self):
+        """Test jobs of dead workers are returned to the queue"""
+        job = queue.enqueue(record, {'value': 1})
+        queue.claim('dead-worker')
+        Job.objects.filter(id=job.id).update(
+            started_at=timezone.now() - datetime.timedelta(minutes=5),
+            heartbeat_at=timezone.now() - datetime.timedelta(minutes=5),
+        )
+
+        self.assertEqual(queue.requeue_stale(), 1)
+        self.assertEqual(queue.claim('worker').id, job.id)
+
+    @override_settings(JOBS_LOCK_TIMEOUT=60)
+    def test_stale_job_fails_after_max_attempts(self):
+        """Test a job whose workers keep dying is not requeued forever"""
+        job = queue.enqueue(record, {'value': 1}, max_attempts=2)
+        for worker in ('dead-worker', 'other-dead-worker'):
+            queue.claim(worker)
+            Job.objects.filter(id=job.id).update(
+                heartbeat_at=timezone.now() - datetime.timedelta(minutes=5)
+            )
+            self.assertEqual(queue.requeue_stale(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(queue.claim('worker'))
+
+    @override_settings(JOBS_LOCK_TIMEOUT=60)
+    def test_requeued_job_not_finished_by_old_worker(self):
+        """Test a worker that was presumed dead cannot finish its job"""
+        job = queue.enqueue(record, {'value': 1})
+        job = queue.claim('slow-worker')
+        Job.objects.filter(id=job.id).update(
+            heartbeat_at=timezone.now() - datetime.timedelta(minutes=5)
+        )
+        queue.requeue_stale()
+        queue.claim('worker')
+
+        self.assertFalse(queue.complete(job, 'slow-worker'))
+        self.assertFalse(queue.fail(job, 'boom', 'slow-worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by),
+                         (Job.RUNNING, 'worker'))
+
+    @override_settings(JOBS_LOCK_TIMEOUT=60)
+    def test_long_running_job_kept(self):
+        """Test a job with a recent heartbeat stays with its worker"""
+        job = queue.enqueue(record, {'value': 1})
+        queue.claim('busy-worker')
+        Job.objects.filter(id=job.id).update(
+            started_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+
+        self.assertTrue(queue.heartbeat(job, 'busy-worker'))
+        self.assertEqual(queue.requeue_stale(), 0)
+        self.assertFalse(queue.heartbeat(job, 'other-worker'))
+
+    @override_settings(JOBS_HEARTBEAT_INTERVAL=0.01)
+    def test_heartbeat_while_running(self):
+        """Test the worker sends heartbeats until the task returns"""
+        job = queue.enqueue(wait, {'seconds': 0.1})
+
+        with patch('jobs.queue.heartbeat', return_value=True) as heartbeat:
+            Worker('w').run_once()
+            calls = heartbeat.call_count
+            time.sleep(0.05)
+
+        self.assertGreater(calls, 1)
+        self.assertEqual(heartbeat.call_count, calls)
+        heartbeat.assert_called_with(job, 'w')
+
+    def test_run_workers_burst(self):
+        """Test the command runs queued jobs until the queue is empty"""
+        queue.enqueue(record, {'value': 1})
+        queue.enqueue(record, {'value': 2})
+
+        call_command('run_workers', workers=1, burst=True)
+
+        self.assertEqual(sorted(CALLS), [1, 2])
+        self.assertFalse(Job.objects.filter(status=Job.QUEUED).exists())
+
+    def test_metrics(self):
+        """Test queue depth and wait are exposed"""
+        queue.enqueue(record, {'value': 1})
+
+        lines = queue.collect_metrics()
+
+        self.assertIn('jobs_queue_depth{status="queued"} 1', lines)
+        self.assertTrue(any(line.startswith('jobs_oldest_ready_seconds ')
+                            for line in lines))
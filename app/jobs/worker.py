@@ -0,0 +1,104 @@
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils.module_loading import autodiscover_modules
+
+from jobs import queue
+
+logger = logging.getLogger(__name__)
+
+
+class Heartbeat:
+    """Refresh the heartbeat of a running job from a background thread
+
+    Jobs are requeued once their heartbeat stops, so long jobs keep their
+    lock for as long as their worker is alive.
+    """
+
+    def __init__(self, job, worker_name, interval):
+        self.job = job
+        self.worker_name = worker_name
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                if not queue.heartbeat(self.job, self.worker_name):
+                    logger.warning('Job %s (%s) was requeued while running',
+                                   self.job.id, self.job.task)
+                    break
+        except Exception:
+            logger.exception('Heartbeat of job %s failed', self.job.id)
+        finally:
+            connections.close_all()
+
+
+class Worker:
+    """Claim and run jobs until stopped"""
+
+    def __init__(self, name=None, poll_interval=None):
+        # Only workers run tasks, web processes enqueue them by name
+        autodiscover_modules('tasks')
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_interval = poll_interval or settings.JOBS_POLL_INTERVAL
+        self.stopping = False
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run_job(self, job):
+        func = queue.TASKS.get(job.task)
+        try:
+            if func is None:
+                raise LookupError(f'Unknown task {job.task}')
+            with Heartbeat(job, self.name, settings.JOBS_HEARTBEAT_INTERVAL):
+                func(**job.payload)
+        except Exception:
+            logger.exception('Job %s (%s) failed', job.id, job.task)
+            queue.fail(job, traceback.format_exc(), self.name)
+        else:
+            queue.complete(job, self.name)
+
+    def run_once(self):
+        """Run one ready job, returning False when the queue is empty"""
+        job = queue.claim(self.name)
+        if job is None:
+            return False
+
+        self.run_job(job)
+        return True
+
+    def run(self, burst=False):
+        """Run jobs until stopped, or until the queue is empty in burst mode"""
+        handlers = {signum: signal.signal(signum, self.stop)
+                    for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            while not self.stopping:
+                close_old_connections()
+                if self.run_once():
+                    continue
+                if burst:
+                    break
+                queue.requeue_stale()
+                queue.prune_finished()
+                time.sleep(self.poll_interval)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
@@ -0,0 +1,62 @@
+from rest_framework.request import Request
+
+from core.async_views import async_api_view, fetch_values, run_sync
+
+from recipe import serializers
+from recipe.views import TagViewSet, IngreidientViewSet, RecipeViewSet
+
+
+def _viewset(viewset_class, request, user, action, **kwargs):
+    """Return a viewset instance sharing the sync API's query logic"""
+    drf_request = Request(request)
+    drf_request.user = user
+
+    return viewset_class(request=drf_request, args=(), kwargs=kwargs,
+                         format_kwarg=None, action=action)
+
+
+def _list_recipes(request, user):
+    view = _viewset(RecipeViewSet, request, user, 'list')
+    queryset = view.get_queryset()
+    # Summary rows when ?summary=1 is passed, recipes otherwise
+    serializer_class = view.get_serializer_class()
+    context = view.get_serializer_context()
+
+    page = view.paginate_queryset(queryset)
+    if page is not None:
+        data = serializer_class(page, many=True, context=context).data
+        return view.get_paginated_response(data).data
+
+    return serializer_class(queryset, many=True, context=context).data
+
+
+def _retrieve_recipe(request, user, pk):
+    view = _viewset(RecipeViewSet, request, user, 'retrieve', pk=pk)
+
+    return serializers.RecipeDetailSerializer(view.get_object()).data
+
+
+@async_api_view
+async def recipe_list(request, user):
+    """List the users recipes with the same filters as the sync API"""
+    return await run_sync(_list_recipes, request, user)
+
+
+@async_api_view
+async def recipe_detail(request, user, pk):
+    """Return a recipe of the user with its tags and ingredients"""
+    return await run_sync(_retrieve_recipe, request, user, pk)
+
+
+@async_api_view
+async def tag_list(request, user):
+    """List the users tags"""
+    view = _viewset(TagViewSet, request, user, 'list')
+    return await fetch_values(view.get_queryset(), 'id', 'name')
+
+
+@async_api_view
+async def ingredient_list(request, user):
+    """List the users ingredients"""
+    view = _viewset(IngreidientViewSet, request, user, 'list')
+    return await fetch_values(view.get_queryset(), 'id', 'name')
@@ -0,0 +1,128 @@
+import threading
+import uuid
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import Lower
+
+
+class PrefixIndex:
+    """Sorted array of names answering case insensitive prefix lookups"""
+
+    def __init__(self, rows, version=None):
+        entries = sorted((name.lower(), pk, name) for pk, name in rows)
+        self.keys = [key for key, _, _ in entries]
+        self.items = [{'id': pk, 'name': name} for _, pk, name in entries]
+        self.version = version
+
+    def __len__(self):
+        return len(self.keys)
+
+    def search(self, prefix, limit):
+        """Return up to limit items whose name starts with prefix"""
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        results = []
+        for key, item in zip(self.keys[start:start + limit],
+                             self.items[start:start + limit]):
+            if not key.startswith(prefix):
+                break
+            results.append(item)
+
+        return results
+
+
+class _TooLarge:
+    """Cache entry of a user with too many names to index"""
+
+    def __init__(self, version):
+        self.version = version
+
+
+class PrefixIndexCache:
+    """Per process LRU of prefix indexes keyed by model and user
+
+    Indexes are built lazily on first lookup. A version stamp kept in the
+    shared Django cache lets a write in one process invalidate the indexes
+    held by every other process. Users found to have too many names are
+    remembered until their version changes, so they are not loaded again
+    on every lookup.
+    """
+
+    def __init__(self, max_indexes, max_entries):
+        self.max_indexes = max_indexes
+        self.max_entries = max_entries
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _version_key(self, model, user_id):
+        return f'autocomplete:{model._meta.label_lower}:{user_id}'
+
+    def invalidate(self, model, user_id):
+        """Drop the index for a user after their names changed"""
+        cache.set(self._version_key(model, user_id), uuid.uuid4().hex, None)
+        with self._lock:
+            self._indexes.pop((model, user_id), None)
+
+    def clear(self):
+        """Drop every index held by this process"""
+        with self._lock:
+            self._indexes.clear()
+
+    def get(self, model, user_id):
+        """Return the prefix index for a user, None if it is too large"""
+        key = (model, user_id)
+        version_key = self._version_key(model, user_id)
+        version = cache.get(version_key)
+
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None and index.version == version:
+                self._indexes.move_to_end(key)
+                return None if isinstance(index, _TooLarge) else index
+
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(version_key, version, None):
+                version = cache.get(version_key)
+
+        rows = list(
+            model.objects.filter(user_id=user_id).values_list('id', 'name')
+            [:self.max_entries + 1]
+        )
+        if len(rows) > self.max_entries:
+            index = _TooLarge(version)
+        else:
+            index = PrefixIndex(rows, version)
+        with self._lock:
+            self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+
+        return None if isinstance(index, _TooLarge) else index
+
+
+prefix_indexes = PrefixIndexCache(
+    max_indexes=settings.AUTOCOMPLETE_MAX_INDEXES,
+    max_entries=settings.AUTOCOMPLETE_MAX_ENTRIES,
+)
+
+
+def autocomplete(queryset, user, prefix, limit):
+    """Return the names owned by user starting with prefix
+
+    Served from the in memory prefix index, falling back to an indexed
+    case insensitive prefix query for users with too many names.
+    """
+    index = prefix_indexes.get(queryset.model, user.pk)
+    if index is not None:
+        return index.search(prefix, limit)
+
+    return list(
+        queryset.filter(user=user, name__istartswith=prefix)
+        .order_by(Lower('name'), 'id')
+        .values('id', 'name')[:limit]
+    )
@@ -0,0 +1,116 @@
+import random
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.models import Ingredients, Recipe, Tag
+from core.purge import purge_user
+from core.routers import shard_for_user, use_shard
+from recipe.similarity import similarity_indexes
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ('Time building the similar recipe index of a large library, '
+            'scoring queries and refreshing it after a change')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=50000)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--tags-per-recipe', type=int, default=3)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _create_library(self, user, options, rng):
+        """Bulk create a library, bypassing signals like a data import"""
+        Tag.objects.bulk_create(
+            Tag(user=user, name=f'Tag {i}') for i in range(options['tags'])
+        )
+        Ingredients.objects.bulk_create(
+            Ingredients(user=user, name=f'Ingredient {i}')
+            for i in range(options['ingredients'])
+        )
+        Recipe.objects.bulk_create(
+            (Recipe(user=user, title=f'Recipe {i}', time_minutes=10,
+                    price=5) for i in range(options['recipes'])),
+            batch_size=5000
+        )
+        # Bulk created rows only get their ids back on some databases
+        recipe_ids, tag_ids, ingredient_ids = (
+            list(model.objects.filter(user=user).values_list('id', flat=True))
+            for model in (Recipe, Tag, Ingredients)
+        )
+
+        Recipe.tags.through.objects.bulk_create(
+            (Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+             for recipe_id in recipe_ids
+             for tag_id in rng.sample(tag_ids, options['tags_per_recipe'])),
+            batch_size=5000
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            (Recipe.ingredients.through(recipe_id=recipe_id,
+                                        ingredients_id=ingredient_id)
+             for recipe_id in recipe_ids
+             for ingredient_id in rng.sample(
+                 ingredient_ids, options['ingredients_per_recipe'])),
+            batch_size=5000
+        )
+
+        return recipe_ids, tag_ids
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user = get_user_model().objects.create_user(
+            f'bench-{uuid.uuid4().hex}@example.com', uuid.uuid4().hex
+        )
+        shard = shard_for_user(user.pk)
+        try:
+            with use_shard(shard):
+                started = time.perf_counter()
+                recipe_ids, tag_ids = self._create_library(user, options, rng)
+                self.stdout.write(
+                    f'Created {len(recipe_ids)} recipes in '
+                    f'{time.perf_counter() - started:.1f}s'
+                )
+
+                similarity_indexes.clear()
+                started = time.perf_counter()
+                index = similarity_indexes.get(user.pk)
+                self.stdout.write(
+                    f'Built index of {len(index)} recipes and '
+                    f'{len(index.link_recipes)} links in '
+                    f'{(time.perf_counter() - started) * 1000:.0f} ms'
+                )
+
+                latencies = []
+                for recipe_id in rng.sample(recipe_ids, options['queries']):
+                    started = time.perf_counter()
+                    index.similar(recipe_id, 10)
+                    latencies.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f'Scored {options["queries"]} queries: '
+                    f'p50 {percentile(latencies, 0.5) * 1000:.2f} ms, '
+                    f'p99 {percentile(latencies, 0.99) * 1000:.2f} ms'
+                )
+
+                recipe = Recipe.objects.get(id=recipe_ids[0])
+                recipe.tags.set(
+                    rng.sample(tag_ids, options['tags_per_recipe'])
+                )
+                started = time.perf_counter()
+                similarity_indexes.get(user.pk)
+                self.stdout.write(
+                    f'Refreshed index after a change in '
+                    f'{(time.perf_counter() - started) * 1000:.0f} ms'
+                )
+        finally:
+            similarity_indexes.clear()
+            purge_user(user.pk)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.routers import each_shard
+from recipe.summaries import check, refresh
+
+
+class Command(BaseCommand):
+    help = 'Compare the recipe summary table with the recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--fix', action='store_true',
+                            help='Rewrite the summaries that differ')
+
+    def handle(self, *args, **options):
+        stale = 0
+        for _ in each_shard():
+            recipe_ids = set()
+            for recipe_id, problem in check(options['batch_size']):
+                self.stdout.write(f'Recipe {recipe_id}: {problem}')
+                recipe_ids.add(recipe_id)
+            if options['fix']:
+                refresh(sorted(recipe_ids))
+            stale += len(recipe_ids)
+
+        if not stale:
+            self.stdout.write(self.style.SUCCESS('Recipe summaries match'))
+            return
+
+        if not options['fix']:
+            raise CommandError(f'{stale} recipe summaries differ')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed {stale} recipe summaries'
+        ))
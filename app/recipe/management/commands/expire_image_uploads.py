@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.routers import each_shard
+from recipe.uploads import expire_sessions
+
+
+class Command(BaseCommand):
+    help = ('Delete resumable image uploads that received no chunk within '
+            'IMAGE_UPLOAD_TTL, along with their partial files')
+
+    def handle(self, *args, **options):
+        expired = sum(expire_sessions() for _ in each_shard())
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {expired} expired uploads'
+        ))
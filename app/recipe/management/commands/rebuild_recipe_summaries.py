@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.routers import each_shard
+from recipe.summaries import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the recipe summary table from the recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = sum(rebuild(options['batch_size']) for _ in each_shard())
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {total} recipe summaries'
+        ))
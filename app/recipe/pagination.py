@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination over the recipe ordering
+
+    Pagination is opt in, responses are only paginated when the client
+    asks for a page size.
+    """
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        """Paginate using the ordering chosen by the view"""
+        return view.get_ordering()
@@ -1,34 +1,132 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from django.core.validators import get_available_image_extensions
+from django.db import router, transaction
 from rest_framework import serializers
-from core.models import Tag, Ingredients, Recipe
+from rest_framework.relations import MANY_RELATION_KWARGS
+from core.metrics import TimedListSerializer, TimedSerializerMixin
+from core.models import (Tag, Ingredients, Recipe, RecipeSummary,
+                         UploadSession)
+from recipe.signals import recipe_links_changed
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for tag objects"""
 
     class Meta:
         model = Tag
         fields = ('id', 'name')
         read_only_fields = ('id',)
+        list_serializer_class = TimedListSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for ingredients"""
 
     class Meta:
         model = Ingredients
         fields = ('id', 'name')
         read_only_fields = ('id',)
+        list_serializer_class = TimedListSerializer
+
+
+class UserManyRelatedField(serializers.ManyRelatedField):
+    """List of primary keys resolved with a single id__in query"""
+    default_error_messages = {
+        'does_not_exist': 'Invalid pks {pk_values} - objects do not exist.',
+    }
+
+    def _to_pk(self, item):
+        pk_field = self.child_relation.queryset.model._meta.pk
+        try:
+            if isinstance(item, bool):
+                raise TypeError
+            return pk_field.to_python(item)
+        except (TypeError, DjangoValidationError):
+            self.child_relation.fail('incorrect_type',
+                                     data_type=type(item).__name__)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        pks = list(dict.fromkeys(self._to_pk(item) for item in data))
+        objects = self.child_relation.get_queryset().in_bulk(pks)
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            self.fail('does_not_exist',
+                      pk_values=', '.join(f'"{pk}"' for pk in missing))
+
+        return [objects[pk] for pk in pks]
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key of an object owned by the requesting user
+
+    With many=True the whole list is fetched in one query, and missing or
+    foreign ids are reported together.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+
+        return UserManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None:
+            return self.queryset.none()
 
+        return self.queryset.filter(user=request.user)
 
-class RecipeSerailizer(serializers.ModelSerializer):
+
+def set_links(recipe, name, objects):
+    """Link recipe to exactly objects through its name m2m field
+
+    The current links are read once and only the difference is written,
+    with one bulk delete and one bulk insert at most. No m2m_changed
+    signal is sent. Returns whether any link changed.
+    """
+    field = Recipe._meta.get_field(name)
+    through = field.remote_field.through
+    recipe_column = field.m2m_column_name()
+    target_column = field.m2m_reverse_name()
+
+    links = through.objects.filter(**{recipe_column: recipe.pk})
+    current = set(links.values_list(target_column, flat=True))
+    wanted = {obj.pk for obj in objects}
+    removed = current - wanted
+    added = wanted - current
+
+    if removed:
+        links.filter(**{f'{target_column}__in': removed}).delete()
+    if added:
+        through.objects.bulk_create([
+            through(**{recipe_column: recipe.pk, target_column: pk})
+            for pk in sorted(added)
+        ])
+
+    return bool(removed or added)
+
+
+class RecipeSerailizer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Recipes"""
 
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = UserPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredients.objects.all()
     )
 
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
@@ -38,6 +136,41 @@ class RecipeSerailizer(serializers.ModelSerializer):
         fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes',
                   'price', 'link')
         read_only_fields = ('id',)
+        list_serializer_class = TimedListSerializer
+
+    def create(self, validated_data):
+        """Create the recipe and its links in one transaction
+
+        Its summary is then written once, when the transaction commits.
+        """
+        with transaction.atomic(using=router.db_for_write(Recipe)):
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        """Write only the fields and links that differ from instance"""
+        links = {name: validated_data.pop(name)
+                 for name in ('tags', 'ingredients') if name in validated_data}
+        changed_fields = [attr for attr, value in validated_data.items()
+                          if getattr(instance, attr) != value]
+
+        with transaction.atomic(using=router.db_for_write(Recipe,
+                                                          instance=instance)):
+            links_changed = False
+            for name, objects in links.items():
+                links_changed = set_links(instance, name, objects) or \
+                    links_changed
+
+            if changed_fields:
+                for attr in changed_fields:
+                    setattr(instance, attr, validated_data[attr])
+                # The post_save handlers also cover the new links
+                instance.save(update_fields=changed_fields)
+            elif links_changed:
+                recipe_links_changed.send(sender=Recipe,
+                                          user_id=instance.user_id,
+                                          recipe_ids=[instance.pk])
+
+        return instance
 
 
 class RecipeDetailSerializer(RecipeSerailizer):
@@ -47,10 +180,86 @@ class RecipeDetailSerializer(RecipeSerailizer):
     tags = TagSerializer(many=True, read_only=True)
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeCloneSerializer(serializers.Serializer):
+    """Serializer for the recipes copied by a bulk clone"""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+
+
+class RecipeImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """serializer for uploading images to recipe model"""
 
     class Meta:
         model = Recipe
         fields = ('id', 'image')
         read_only_fields = ('id',)
+        list_serializer_class = TimedListSerializer
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for resumable recipe image uploads"""
+
+    recipe = UserPrimaryKeyRelatedField(queryset=Recipe.objects.all())
+    filename = serializers.CharField(write_only=True, max_length=255)
+    size = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'recipe', 'filename', 'size', 'offset',
+                  'expires_at')
+        read_only_fields = ('id', 'offset', 'expires_at')
+
+    def validate_filename(self, value):
+        extension = Path(value).suffix[1:].lower()
+        if extension not in get_available_image_extensions():
+            raise serializers.ValidationError(
+                f'File extension "{extension}" is not an image.'
+            )
+
+        return value
+
+    def validate_size(self, value):
+        if value > settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Images are at most {settings.IMAGE_UPLOAD_MAX_SIZE} bytes.'
+            )
+
+        return value
+
+
+class RecipeSummarySerializer(TimedSerializerMixin,
+                              serializers.ModelSerializer):
+    """Serializer for recipe cards read from the summary table"""
+
+    id = serializers.IntegerField(source='recipe_id', read_only=True)
+    tags = serializers.SerializerMethodField()
+    ingredients = serializers.SerializerMethodField()
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecipeSummary
+        fields = ('id', 'title', 'ingredients', 'tags', 'time_minutes',
+                  'price', 'image')
+        read_only_fields = fields
+        list_serializer_class = TimedListSerializer
+
+    def _named(self, ids, names):
+        return [{'id': obj_id, 'name': name}
+                for obj_id, name in zip(ids, names)]
+
+    def get_tags(self, obj):
+        return self._named(obj.tag_ids, obj.tag_names)
+
+    def get_ingredients(self, obj):
+        return self._named(obj.ingredient_ids, obj.ingredient_names)
+
+    def get_image(self, obj):
+        if not obj.image:
+            return None
+        url = default_storage.url(obj.image)
+        request = self.context.get('request')
+
+        return request.build_absolute_uri(url) if request else url
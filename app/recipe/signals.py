@@ -0,0 +1,148 @@
+from functools import partial
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import Signal, receiver
+
+from core import changes
+from core.models import ChangeLog, Tag, Ingredients, Recipe, UploadSession
+from jobs.queue import enqueue
+from recipe import summaries
+from recipe.autocomplete import prefix_indexes
+
+CHANGELOG_MODELS = {
+    Recipe: ChangeLog.RECIPE,
+    Tag: ChangeLog.TAG,
+    Ingredients: ChangeLog.INGREDIENT,
+}
+
+# Sent with user_id and recipe_ids after recipes and their links were
+# inserted in bulk, without the save and m2m_changed signals
+recipes_bulk_created = Signal()
+
+# Sent with user_id and recipe_ids after links of saved recipes were
+# rewritten in bulk, without m2m_changed signals
+recipe_links_changed = Signal()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredients)
+def invalidate_prefix_index(sender, instance, using, **kwargs):
+    """Drop the autocomplete index of the owner of a changed name
+
+    Done once the change is committed, or another process could rebuild
+    the index from the old names under the new version.
+    """
+    transaction.on_commit(
+        partial(prefix_indexes.invalidate, sender, instance.user_id),
+        using=using,
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredients)
+def record_save(sender, instance, **kwargs):
+    """Log a created or updated object in the owner's change feed"""
+    changes.record(instance.user_id, CHANGELOG_MODELS[sender], [instance.pk])
+
+
+def _linked_recipe_ids(sender, instance):
+    field = 'tags' if sender is Tag else 'ingredients'
+    return list(Recipe.objects.filter(
+        **{field: instance}
+    ).values_list('id', flat=True))
+
+
+def _queue_summary_refresh(user_id, recipe_ids, batch_size=1000):
+    for start in range(0, len(recipe_ids), batch_size):
+        enqueue('recipe.tasks.refresh_summaries',
+                {'recipe_ids': recipe_ids[start:start + batch_size],
+                 'user_id': user_id})
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_summary(sender, instance, **kwargs):
+    """Rewrite the summary of a saved recipe once it is committed"""
+    summaries.refresh_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredients)
+def refresh_renamed_summaries(sender, instance, created, **kwargs):
+    """Queue a refresh of the summaries showing an updated name"""
+    if not created:
+        _queue_summary_refresh(instance.user_id,
+                               _linked_recipe_ids(sender, instance))
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredients)
+def record_delete(sender, instance, **kwargs):
+    """Log a tombstone for a deleted object"""
+    changes.record(instance.user_id, CHANGELOG_MODELS[sender], [instance.pk],
+                   deleted=True)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredients)
+def record_unlinked_recipes(sender, instance, **kwargs):
+    """Log recipes losing a link when a tag or ingredient is deleted
+
+    Their summaries are refreshed by a job running once the delete has
+    been committed. Skipped while changes are muted, where the recipes
+    are purged or moved along with the tags and ingredients.
+    """
+    if changes.is_muted():
+        return
+
+    recipe_ids = _linked_recipe_ids(sender, instance)
+    changes.record(instance.user_id, ChangeLog.RECIPE, recipe_ids)
+    _queue_summary_refresh(instance.user_id, recipe_ids)
+
+
+@receiver(post_delete, sender=UploadSession)
+def delete_upload_file(sender, instance, using, **kwargs):
+    """Delete the bytes of an upload discarded, expired or cascaded
+
+    Finalized uploads hand their file to the recipe and have no name.
+    """
+    if instance.name:
+        transaction.on_commit(partial(default_storage.delete, instance.name),
+                              using=using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def record_links(sender, instance, action, reverse, pk_set, **kwargs):
+    """Log and summarize recipes whose tags or ingredients changed"""
+    if action == 'pre_clear' and reverse:
+        # Changed from the tag or ingredient side, remember the recipes
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('id', flat=True)
+        )
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'post_clear':
+        recipe_ids = instance.__dict__.pop('_cleared_recipe_ids', [])
+    else:
+        recipe_ids = list(pk_set)
+
+    changes.record(instance.user_id, ChangeLog.RECIPE, recipe_ids)
+    summaries.refresh_on_commit(recipe_ids)
+
+
+@receiver(recipes_bulk_created)
+@receiver(recipe_links_changed)
+def record_bulk_changes(sender, user_id, recipe_ids, **kwargs):
+    """Log and summarize recipes created or relinked in bulk"""
+    changes.record(user_id, ChangeLog.RECIPE, recipe_ids)
+    summaries.refresh_on_commit(recipe_ids)
@@ -0,0 +1,199 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from core.models import ChangeLog, ChangeSequence, Recipe
+
+# Feature keys interleave tag and ingredient ids so they never collide
+TAG = 0
+INGREDIENT = 1
+
+LINKS = (
+    (TAG, Recipe.tags.through, 'tag_id'),
+    (INGREDIENT, Recipe.ingredients.through, 'ingredients_id'),
+)
+
+
+def load_links(user_id, recipe_ids=None):
+    """Return (recipe ids, feature keys) arrays of a user's recipe links"""
+    recipes, features = [], []
+    for kind, through, field in LINKS:
+        queryset = through.objects.filter(recipe__user_id=user_id)
+        if recipe_ids is not None:
+            queryset = queryset.filter(recipe_id__in=recipe_ids)
+        pairs = np.array(list(queryset.values_list('recipe_id', field)),
+                         dtype=np.int64).reshape(-1, 2)
+        recipes.append(pairs[:, 0])
+        features.append(pairs[:, 1] * 2 + kind)
+
+    return np.concatenate(recipes), np.concatenate(features)
+
+
+def _indptr(groups, size):
+    return np.concatenate(
+        ([0], np.cumsum(np.bincount(groups, minlength=size)))
+    ).astype(np.int64)
+
+
+class SimilarityIndex:
+    """Sparse recipe by feature incidence matrix of one user
+
+    Rows are recipes with at least one tag or ingredient, columns are
+    tags and ingredients weighted by kind. The matrix is held both row
+    wise (features of a recipe) and column wise (recipes of a feature),
+    like scipy's CSR and CSC formats.
+    """
+
+    def __init__(self, link_recipes, link_features, seq=0,
+                 tag_weight=None, ingredient_weight=None):
+        self.link_recipes = link_recipes
+        self.link_features = link_features
+        self.seq = seq
+        self.tag_weight = (settings.SIMILAR_RECIPES_TAG_WEIGHT
+                           if tag_weight is None else tag_weight)
+        self.ingredient_weight = (
+            settings.SIMILAR_RECIPES_INGREDIENT_WEIGHT
+            if ingredient_weight is None else ingredient_weight
+        )
+
+        self.recipe_ids, rows = np.unique(link_recipes, return_inverse=True)
+        features, cols = np.unique(link_features, return_inverse=True)
+        self.feature_weights = np.where(features % 2 == TAG,
+                                        self.tag_weight,
+                                        self.ingredient_weight)
+
+        by_col = np.argsort(cols, kind='stable')
+        self.col_rows = rows[by_col]
+        self.col_indptr = _indptr(cols, len(features))
+
+        by_row = np.argsort(rows, kind='stable')
+        self.row_cols = cols[by_row]
+        self.row_indptr = _indptr(rows, len(self.recipe_ids))
+
+        self.row_weights = np.bincount(
+            rows, weights=self.feature_weights[cols],
+            minlength=len(self.recipe_ids)
+        )
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def patched(self, recipe_ids, link_recipes, link_features, seq):
+        """Return an index with the links of recipe_ids replaced"""
+        keep = ~np.isin(self.link_recipes, recipe_ids)
+
+        return SimilarityIndex(
+            np.concatenate((self.link_recipes[keep], link_recipes)),
+            np.concatenate((self.link_features[keep], link_features)),
+            seq, self.tag_weight, self.ingredient_weight,
+        )
+
+    def _row(self, recipe_id):
+        row = np.searchsorted(self.recipe_ids, recipe_id)
+        if row < len(self.recipe_ids) and self.recipe_ids[row] == recipe_id:
+            return row
+
+        return None
+
+    def scores(self, recipe_id):
+        """Return the weighted Jaccard similarity of every row to a recipe"""
+        scores = np.zeros(len(self.recipe_ids))
+        row = self._row(recipe_id)
+        if row is None:
+            return scores
+
+        cols = self.row_cols[self.row_indptr[row]:self.row_indptr[row + 1]]
+        starts = self.col_indptr[cols]
+        lengths = self.col_indptr[cols + 1] - starts
+        offsets = np.cumsum(lengths) - lengths
+        positions = (np.arange(lengths.sum())
+                     + np.repeat(starts - offsets, lengths))
+
+        shared = np.bincount(
+            self.col_rows[positions],
+            weights=np.repeat(self.feature_weights[cols], lengths),
+            minlength=len(self.recipe_ids),
+        )
+        union = self.row_weights + self.row_weights[row] - shared
+        np.divide(shared, union, out=scores, where=union > 0)
+        scores[row] = 0
+
+        return scores
+
+    def similar(self, recipe_id, limit):
+        """Return up to limit (recipe id, score), best first then by id"""
+        scores = self.scores(recipe_id)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            # Keep every candidate tied with the last one for a stable order
+            cutoff = np.partition(scores[candidates], -limit)[-limit]
+            candidates = candidates[scores[candidates] >= cutoff]
+
+        order = np.lexsort((self.recipe_ids[candidates],
+                            -scores[candidates]))[:limit]
+
+        return [(int(self.recipe_ids[i]), float(scores[i]))
+                for i in candidates[order]]
+
+
+class SimilarityIndexCache:
+    """Per process LRU of similarity indexes keyed by user
+
+    Freshness follows the user's change feed: an index built at sequence
+    n only reloads the links of recipes changed after n. A full rebuild
+    happens when too many recipes changed or the feed was compacted past
+    the index.
+    """
+
+    def __init__(self, max_indexes, max_delta):
+        self.max_indexes = max_indexes
+        self.max_delta = max_delta
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def _update(self, index, user_id, seq, horizon):
+        if index is None or index.seq < horizon:
+            return None
+
+        changed = list(ChangeLog.objects.filter(
+            user_id=user_id, model=ChangeLog.RECIPE,
+            seq__gt=index.seq, seq__lte=seq,
+        ).values_list('object_id', flat=True).distinct()[:self.max_delta + 1])
+        if len(changed) > self.max_delta:
+            return None
+
+        return index.patched(np.array(changed, dtype=np.int64),
+                             *load_links(user_id, changed), seq)
+
+    def get(self, user_id):
+        """Return an up to date similarity index of a user"""
+        seq, horizon = ChangeSequence.objects.filter(
+            user_id=user_id
+        ).values_list('last_seq', 'compacted_seq').first() or (0, 0)
+
+        with self._lock:
+            index = self._indexes.get(user_id)
+        if index is None or index.seq != seq:
+            index = self._update(index, user_id, seq, horizon)
+            if index is None:
+                index = SimilarityIndex(*load_links(user_id), seq)
+
+        with self._lock:
+            self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+
+        return index
+
+
+similarity_indexes = SimilarityIndexCache(
+    max_indexes=settings.SIMILAR_RECIPES_MAX_INDEXES,
+    max_delta=settings.SIMILAR_RECIPES_MAX_DELTA,
+)
@@ -0,0 +1,138 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from core.models import Recipe, RecipeSummary
+
+# Fields compared by the consistency check
+SUMMARY_FIELDS = ('user_id', 'title', 'time_minutes', 'price', 'image',
+                  'tag_ids', 'tag_names', 'ingredient_ids',
+                  'ingredient_names')
+
+
+def _links(through, field, recipe_ids):
+    """Return (ids, names) of linked objects per recipe, ordered by name"""
+    rows = through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by(f'{field}__name', f'{field}_id').values_list(
+        'recipe_id', f'{field}_id', f'{field}__name'
+    )
+    links = defaultdict(lambda: ([], []))
+    for recipe_id, obj_id, name in rows:
+        links[recipe_id][0].append(obj_id)
+        links[recipe_id][1].append(name)
+
+    return links
+
+
+def build(recipe_ids):
+    """Return unsaved summaries of the existing recipes among recipe_ids"""
+    recipe_ids = list(recipe_ids)
+    recipes = Recipe.objects.filter(id__in=recipe_ids).values_list(
+        'id', 'user_id', 'title', 'time_minutes', 'price', 'image'
+    )
+    tags = _links(Recipe.tags.through, 'tag', recipe_ids)
+    ingredients = _links(Recipe.ingredients.through, 'ingredients',
+                         recipe_ids)
+
+    summaries = []
+    for recipe_id, user_id, title, time_minutes, price, image in recipes:
+        tag_ids, tag_names = tags[recipe_id]
+        ingredient_ids, ingredient_names = ingredients[recipe_id]
+        summaries.append(RecipeSummary(
+            recipe_id=recipe_id, user_id=user_id, title=title,
+            time_minutes=time_minutes, price=price, image=image or '',
+            tag_ids=tag_ids, tag_names=tag_names,
+            ingredient_ids=ingredient_ids,
+            ingredient_names=ingredient_names,
+        ))
+
+    return summaries
+
+
+def refresh(recipe_ids):
+    """Rewrite the summaries of recipes, dropping those of deleted ones"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    with transaction.atomic(using=RecipeSummary.objects.db):
+        # Concurrent refreshes of a recipe wait for each other here, or
+        # both would insert its summary. Locked in id order against
+        # deadlocks between overlapping batches
+        list(Recipe.objects.select_for_update().filter(
+            id__in=recipe_ids
+        ).order_by('id').values_list('id', flat=True))
+        RecipeSummary.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSummary.objects.bulk_create(build(recipe_ids))
+
+
+class _PendingRefresh:
+    """Commit callback refreshing the recipes queued in a transaction"""
+
+    def __init__(self):
+        self.recipe_ids = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        refresh(sorted(self.recipe_ids))
+
+
+def refresh_on_commit(recipe_ids):
+    """Refresh summaries once the current transaction commits
+
+    Recipes queued within one transaction are refreshed together, so a
+    recipe saved along with its tags and ingredients is summarized once.
+    Outside a transaction the summaries are refreshed right away.
+    """
+    using = RecipeSummary.objects.db
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        refresh(recipe_ids)
+        return
+
+    pending = getattr(connection, '_pending_summaries', None)
+    # A rolled back transaction or savepoint drops its callbacks
+    if pending is None or pending.done or not any(
+        func is pending for _, func in connection.run_on_commit
+    ):
+        pending = connection._pending_summaries = _PendingRefresh()
+        transaction.on_commit(pending, using=using)
+    pending.recipe_ids.update(recipe_ids)
+
+
+def _recipe_id_batches(batch_size):
+    last_id = 0
+    while True:
+        ids = list(Recipe.objects.filter(
+            id__gt=last_id
+        ).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def rebuild(batch_size=1000):
+    """Regenerate every summary in batches, returning the number written"""
+    total = 0
+    for ids in _recipe_id_batches(batch_size):
+        refresh(ids)
+        total += len(ids)
+
+    return total
+
+
+def check(batch_size=1000):
+    """Yield (recipe_id, problem) for summaries differing from recipes"""
+    for ids in _recipe_id_batches(batch_size):
+        stored = RecipeSummary.objects.in_bulk(ids)
+        for expected in build(ids):
+            summary = stored.get(expected.recipe_id)
+            if summary is None:
+                yield expected.recipe_id, 'missing'
+                continue
+            for field in SUMMARY_FIELDS:
+                if getattr(summary, field) != getattr(expected, field):
+                    yield expected.recipe_id, f'{field} differs'
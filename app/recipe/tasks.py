@@ -0,0 +1,18 @@
+from jobs.queue import task
+
+from core.routers import shard_for_user, use_shard
+from recipe import summaries, warmup
+
+
+@task
+def refresh_summaries(recipe_ids, user_id=None):
+    """Rewrite the summaries of recipes after a tag or ingredient change"""
+    shard = shard_for_user(user_id) if user_id else None
+    with use_shard(shard):
+        summaries.refresh(recipe_ids)
+
+
+@task
+def warm_user(user_id, host, scheme):
+    """Cache the first reads of a user who logged in"""
+    warmup.warm_user(user_id, host, scheme)
@@ -0,0 +1,125 @@
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredients
+
+from recipe.serializers import RecipeSerailizer, RecipeDetailSerializer
+
+RECIPES_URL = reverse('recipe:async-recipe-list')
+TAGS_URL = reverse('recipe:async-tag-list')
+INGREDIENTS_URL = reverse('recipe:async-ingredients-list')
+
+
+def detail_url(recipe_id):
+    """return async recipe detail url"""
+    return reverse('recipe:async-recipe-detail', args=[recipe_id])
+
+
+class AsyncRecipeApiTests(TransactionTestCase):
+    """Test the async read endpoints
+
+    The async views query from their own thread pool, so the data has to
+    be committed to be visible to them.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredients.objects.create(user=self.user,
+                                                     name='Salt')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Daal', time_minutes=30, price='5.00'
+        )
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+
+    def test_auth_required(self):
+        """Test that a valid token is required"""
+        res = APIClient().get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        res = APIClient().get(RECIPES_URL, HTTP_AUTHORIZATION='Token bad')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_recipe_list(self):
+        """Test the async list matches the sync serializer"""
+        other = get_user_model().objects.create_user(
+            'test1@123.com',
+            'test12345',
+        )
+        Recipe.objects.create(user=other, title='Other', time_minutes=1,
+                              price=1)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.json(),
+            [dict(RecipeSerailizer(self.recipe).data)]
+        )
+
+    def test_recipe_list_summaries(self):
+        """Test the async list can read the summary table"""
+        res = self.client.get(RECIPES_URL, {'summary': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()[0]['tags'],
+                         [{'id': self.tag.id, 'name': 'Vegan'}])
+        self.assertEqual(res.json()[0]['ingredients'],
+                         [{'id': self.ingredient.id, 'name': 'Salt'}])
+
+    def test_recipe_list_filters(self):
+        """Test the async list applies the sync API filters"""
+        res = self.client.get(RECIPES_URL, {'time_max': 10})
+        self.assertEqual(res.json(), [])
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'title'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recipe_detail(self):
+        """Test the async detail includes tags and ingredients"""
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['tags'],
+                         RecipeDetailSerializer(self.recipe).data['tags'])
+
+    def test_recipe_detail_not_found(self):
+        """Test other users recipes are not found"""
+        other = get_user_model().objects.create_user(
+            'test1@123.com',
+            'test12345',
+        )
+        recipe = Recipe.objects.create(user=other, title='Other',
+                                       time_minutes=1, price=1)
+
+        res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tags_and_ingredients(self):
+        """Test listing tags and ingredients asynchronously"""
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.json(), [{'id': self.tag.id, 'name': 'Vegan'}])
+
+        res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+        self.assertEqual(res.json(),
+                         [{'id': self.ingredient.id, 'name': 'Salt'}])
+
+    def test_read_only(self):
+        """Test writes are not allowed on async endpoints"""
+        res = self.client.post(TAGS_URL, {'name': 'Sweet'})
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -0,0 +1,153 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredients
+
+from recipe.autocomplete import PrefixIndex, prefix_indexes
+
+TAG_AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
+INGREDIENT_AUTOCOMPLETE_URL = reverse('recipe:ingredients-autocomplete')
+
+
+class PrefixIndexTests(TestCase):
+    """Test the in memory prefix index"""
+
+    def test_search_case_insensitive(self):
+        """Test prefix search ignores case and keeps order"""
+        index = PrefixIndex([(1, 'Salt'), (2, 'sage'), (3, 'Sugar'),
+                             (4, 'salmon')])
+
+        self.assertEqual(index.search('SAL', 10), [
+            {'id': 4, 'name': 'salmon'},
+            {'id': 1, 'name': 'Salt'},
+        ])
+
+    def test_search_limit(self):
+        """Test the number of results is limited"""
+        index = PrefixIndex([(i, f'name {i}') for i in range(20)])
+
+        self.assertEqual(len(index.search('name', 5)), 5)
+        self.assertEqual(index.search('other', 5), [])
+
+
+class PublicAutocompleteApiTests(TestCase):
+    """Test unauthenticated access to autocomplete"""
+
+    def test_login_required(self):
+        """Test that login is required"""
+        res = APIClient().get(TAG_AUTOCOMPLETE_URL, {'q': 'a'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateAutocompleteApiTests(TestCase):
+    """Test autocompleting tag and ingredient names"""
+
+    def setUp(self):
+        cache.clear()
+        prefix_indexes.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        prefix_indexes.clear()
+        cache.clear()
+
+    def test_autocomplete_tags(self):
+        """Test tag names are matched by prefix"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Dessert')
+
+        res = self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 've'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{'id': vegan.id, 'name': 'Vegan'}])
+
+    def test_autocomplete_limited_to_user(self):
+        """Test other users names are not suggested"""
+        user2 = get_user_model().objects.create_user(
+            'other@123.com',
+            'test1234',
+        )
+        Ingredients.objects.create(user=user2, name='Salt')
+
+        res = self.client.get(INGREDIENT_AUTOCOMPLETE_URL, {'q': 'sa'})
+
+        self.assertEqual(res.data, [])
+
+    def test_autocomplete_served_from_memory(self):
+        """Test repeated lookups do not hit the database"""
+        Ingredients.objects.create(user=self.user, name='Salt')
+        self.client.get(INGREDIENT_AUTOCOMPLETE_URL, {'q': 's'})
+
+        with self.assertNumQueries(0):
+            res = self.client.get(INGREDIENT_AUTOCOMPLETE_URL, {'q': 'sa'})
+
+        self.assertEqual(len(res.data), 1)
+
+    def test_autocomplete_invalidated_on_create_and_delete(self):
+        """Test new and deleted names are reflected"""
+        salt = Ingredients.objects.create(user=self.user, name='Salt')
+        self.client.get(INGREDIENT_AUTOCOMPLETE_URL, {'q': 's'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sage = Ingredients.objects.create(user=self.user, name='Sage')
+            salt.delete()
+            # Not invalidated before the names are committed
+            self.assertIsNotNone(prefix_indexes._indexes.get(
+                (Ingredients, self.user.pk)
+            ))
+        res = self.client.get(INGREDIENT_AUTOCOMPLETE_URL, {'q': 's'})
+
+        self.assertEqual(res.data, [{'id': sage.id, 'name': 'Sage'}])
+
+    def test_autocomplete_falls_back_to_database(self):
+        """Test users with too many names are served from the database"""
+        for name in ('Salt', 'Sage', 'Sugar'):
+            Ingredients.objects.create(user=self.user, name=name)
+
+        with patch.object(prefix_indexes, 'max_entries', 2):
+            res = self.client.get(
+                INGREDIENT_AUTOCOMPLETE_URL, {'q': 'sa', 'limit': 1}
+            )
+
+        self.assertEqual([item['name'] for item in res.data], ['Sage'])
+
+    def test_too_many_names_not_reloaded(self):
+        """Test users with too many names only run the prefix query"""
+        for name in ('Salt', 'Sage', 'Sugar'):
+            Ingredients.objects.create(user=self.user, name=name)
+
+        with patch.object(prefix_indexes, 'max_entries', 2):
+            self.client.get(INGREDIENT_AUTOCOMPLETE_URL, {'q': 's'})
+            with self.assertNumQueries(1):
+                res = self.client.get(INGREDIENT_AUTOCOMPLETE_URL,
+                                      {'q': 'su'})
+            self.assertEqual([item['name'] for item in res.data], ['Sugar'])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Ingredients.objects.filter(name='Sugar').delete()
+            res = self.client.get(INGREDIENT_AUTOCOMPLETE_URL, {'q': 's'})
+
+        self.assertEqual([item['name'] for item in res.data],
+                         ['Sage', 'Salt'])
+        self.assertIsNotNone(prefix_indexes.get(Ingredients, self.user.pk))
+
+    def test_autocomplete_requires_prefix(self):
+        """Test an empty prefix returns no suggestions"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAG_AUTOCOMPLETE_URL)
+
+        self.assertEqual(res.data, [])
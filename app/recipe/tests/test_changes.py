@@ -0,0 +1,219 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import changes
+from core.models import ChangeLog, Recipe, Tag, Ingredients
+
+CHANGES_URL = reverse('recipe:changes')
+
+
+def sample_recipe(user, **params):
+    """Create and return a simple recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 5,
+        'price': '10'
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PublicChangeFeedApiTests(TestCase):
+    """Test unauthorized access to the change feed"""
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = APIClient().get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateChangeFeedApiTests(TestCase):
+    """Test syncing changes for an authenticated user"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+
+    def changes(self, since=0, **params):
+        res = self.client.get(CHANGES_URL, {'since': since, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return res.data
+
+    def test_initial_sync(self):
+        """Test syncing from 0 returns every object once"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(tag)
+
+        data = self.changes()
+
+        self.assertFalse(data['has_more'])
+        self.assertEqual(
+            [(change['type'], change['id']) for change in data['changes']],
+            [('tag', tag.id), ('recipe', recipe.id)]
+        )
+        self.assertEqual(data['changes'][1]['data']['tags'], [tag.id])
+        self.assertEqual(data['cursor'], data['changes'][-1]['seq'])
+
+    def test_changes_since_cursor(self):
+        """Test only changes after the cursor are returned"""
+        recipe = sample_recipe(self.user)
+        other = sample_recipe(self.user, title='Other')
+        cursor = self.changes()['cursor']
+
+        recipe.title = 'Updated'
+        recipe.save()
+        salt = Ingredients.objects.create(user=self.user, name='Salt')
+        other.ingredients.add(salt)
+
+        data = self.changes(cursor)
+
+        self.assertEqual(
+            [(change['type'], change['id']) for change in data['changes']],
+            [('recipe', recipe.id), ('ingredient', salt.id),
+             ('recipe', other.id)]
+        )
+        self.assertEqual(data['changes'][0]['data']['title'], 'Updated')
+        self.assertEqual(self.changes(data['cursor'])['changes'], [])
+
+    def test_deletes_are_tombstones(self):
+        """Test deleting objects logs tombstones and unlinks recipes"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(tag)
+        deleted = sample_recipe(self.user, title='Deleted')
+        cursor = self.changes()['cursor']
+        tag_id, deleted_id = tag.id, deleted.id
+
+        tag.delete()
+        deleted.delete()
+
+        changes = self.changes(cursor)['changes']
+
+        self.assertEqual(
+            [(change['type'], change['id'], change['deleted'])
+             for change in changes],
+            [('recipe', recipe.id, False), ('tag', tag_id, True),
+             ('recipe', deleted_id, True)]
+        )
+        self.assertEqual(changes[0]['data']['tags'], [])
+        self.assertIsNone(changes[1]['data'])
+
+    def test_reverse_m2m_changes(self):
+        """Test linking recipes from the tag side logs the recipes"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = sample_recipe(self.user)
+        cursor = self.changes()['cursor']
+
+        tag.recipe_set.add(recipe)
+        cursor_after_add = self.changes(cursor)['cursor']
+        tag.recipe_set.clear()
+
+        changes = self.changes(cursor_after_add)['changes']
+
+        self.assertEqual([change['id'] for change in changes], [recipe.id])
+        self.assertEqual(changes[0]['data']['tags'], [])
+
+    def test_batches(self):
+        """Test changes are returned in batches of the limit"""
+        recipes = [sample_recipe(self.user, title=f'Recipe {i}')
+                   for i in range(5)]
+
+        first = self.changes(limit=3)
+        second = self.changes(first['cursor'], limit=3)
+
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual(
+            [change['id'] for change in first['changes'] + second['changes']],
+            [recipe.id for recipe in recipes]
+        )
+
+    def test_cost_scales_with_changes(self):
+        """Test an incremental sync does not depend on library size"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(20):
+            sample_recipe(self.user, title=f'Recipe {i}').tags.add(tag)
+        recipe = sample_recipe(self.user)
+        cursor = self.changes()['cursor']
+        recipe.title = 'Updated'
+        recipe.save()
+
+        # horizon, entries, recipes and their two prefetches
+        with self.assertNumQueries(5):
+            changes = self.changes(cursor)['changes']
+
+        self.assertEqual([change['id'] for change in changes], [recipe.id])
+
+    def test_other_users_changes_hidden(self):
+        """Test changes of other users are not returned"""
+        other = get_user_model().objects.create_user('other@123.com',
+                                                     'test1234')
+        sample_recipe(other)
+
+        self.assertEqual(self.changes()['changes'], [])
+
+    def test_invalid_cursor(self):
+        """Test a non numeric cursor is rejected"""
+        res = self.client.get(CHANGES_URL, {'since': 'abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compaction(self):
+        """Test compaction keeps the latest entries and moves the horizon"""
+        recipe = sample_recipe(self.user)
+        deleted = sample_recipe(self.user, title='Deleted')
+        stale_cursor = self.changes()['cursor']
+        for i in range(3):
+            recipe.title = f'Title {i}'
+            recipe.save()
+        deleted.delete()
+        ChangeLog.objects.filter(deleted=True).update(
+            created_at=timezone.now() - datetime.timedelta(days=60)
+        )
+
+        call_command('compact_changelog', stdout=StringIO())
+
+        entries = ChangeLog.objects.filter(user=self.user)
+        self.assertEqual(
+            list(entries.values_list('object_id', flat=True)), [recipe.id]
+        )
+        res = self.client.get(CHANGES_URL, {'since': stale_cursor})
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+        changes = self.changes()['changes']
+        self.assertEqual([change['id'] for change in changes], [recipe.id])
+        self.assertEqual(changes[0]['data']['title'], 'Title 2')
+
+    def test_drop_superseded_in_pages(self):
+        """Test superseded entries are dropped across pages of the log"""
+        recipes = [sample_recipe(self.user, title=f'Recipe {i}')
+                   for i in range(3)]
+        for recipe in recipes + recipes[:1]:
+            recipe.title = 'Renamed'
+            recipe.save()
+        latest = {}
+        for object_id, seq in ChangeLog.objects.values_list('object_id',
+                                                            'seq'):
+            latest[object_id] = max(seq, latest.get(object_id, 0))
+
+        self.assertEqual(changes.drop_superseded(batch_size=2), 4)
+
+        self.assertEqual(
+            dict(ChangeLog.objects.values_list('object_id', 'seq')), latest
+        )
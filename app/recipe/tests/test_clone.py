@@ -0,0 +1,138 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChangeLog, Recipe, RecipeSummary, Tag, Ingredients
+
+BULK_CLONE_URL = reverse('recipe:recipe-bulk-clone')
+
+
+def clone_url(recipe_id):
+    """Return the clone URL of a recipe"""
+    return reverse('recipe:recipe-clone', args=[recipe_id])
+
+
+def sample_recipe(user, **params):
+    """Create and return a simple recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 5,
+        'price': '10'
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeCloneApiTests(TestCase):
+    """Test copying recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = sample_recipe(self.user, title='Curry',
+                                        link='https://example.com/curry',
+                                        image='uploads/recipe/curry.jpg')
+            self.recipe.tags.add(Tag.objects.create(user=self.user,
+                                                    name='Vegan'))
+            self.recipe.ingredients.add(
+                Ingredients.objects.create(user=self.user, name='Salt'),
+                Ingredients.objects.create(user=self.user, name='Rice'),
+            )
+
+    def test_clone_recipe(self):
+        """Test a clone copies the row, links and image reference"""
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(clone_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        clone = Recipe.objects.get(id=res.data['id'])
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(clone.id, self.recipe.id)
+        for field in ('user_id', 'title', 'time_minutes', 'price', 'link',
+                      'image'):
+            self.assertEqual(getattr(clone, field),
+                             getattr(self.recipe, field))
+        self.assertEqual(set(clone.tags.all()), set(self.recipe.tags.all()))
+        self.assertEqual(set(clone.ingredients.all()),
+                         set(self.recipe.ingredients.all()))
+        self.assertEqual([tag['name'] for tag in res.data['tags']],
+                         ['Vegan'])
+
+        summary = RecipeSummary.objects.get(recipe=clone)
+        self.assertEqual(sorted(summary.ingredient_names), ['Rice', 'Salt'])
+        self.assertTrue(ChangeLog.objects.filter(
+            model=ChangeLog.RECIPE, object_id=clone.id
+        ).exists())
+
+    def test_clone_cost_independent_of_links(self):
+        """Test cloning runs the same queries for any number of links"""
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(clone_url(self.recipe.id))
+
+        self.recipe.tags.add(*(
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+            for i in range(20)
+        ))
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(clone_url(self.recipe.id))
+
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(Recipe.objects.last().tags.count(), 21)
+
+    def test_clone_other_users_recipe(self):
+        """Test recipes of other users cannot be cloned"""
+        other = get_user_model().objects.create_user('other@123.com',
+                                                     'test1234')
+        recipe = sample_recipe(other)
+
+        res = self.client.post(clone_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Recipe.objects.filter(user=other).count(), 1)
+
+    def test_bulk_clone(self):
+        """Test several recipes are cloned in the requested order"""
+        cake = sample_recipe(self.user, title='Cake')
+
+        res = self.client.post(BULK_CLONE_URL, {
+            'recipes': [cake.id, self.recipe.id, cake.id]
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['title'] for item in res.data],
+                         ['Cake', 'Curry'])
+        self.assertEqual(len(res.data[1]['ingredients']), 2)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 4)
+
+    def test_bulk_clone_unknown_recipe(self):
+        """Test nothing is cloned when a recipe is not the user's"""
+        other = get_user_model().objects.create_user('other@123.com',
+                                                     'test1234')
+        recipe = sample_recipe(other)
+
+        res = self.client.post(BULK_CLONE_URL, {
+            'recipes': [self.recipe.id, recipe.id]
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_bulk_clone_limit(self):
+        """Test bulk clones over the limit are rejected"""
+        res = self.client.post(BULK_CLONE_URL, {
+            'recipes': list(range(1, 102))
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,236 @@
+import base64
+import datetime
+import hashlib
+import io
+import os
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeSummary, UploadSession
+from recipe import uploads
+
+UPLOADS_URL = reverse('recipe:uploadsession-list')
+
+
+def upload_url(upload_id):
+    """Return the URL of an upload"""
+    return reverse('recipe:uploadsession-detail', args=[upload_id])
+
+
+def finalize_url(upload_id):
+    """Return the URL finalizing an upload"""
+    return reverse('recipe:uploadsession-finalize', args=[upload_id])
+
+
+def sample_image():
+    """Return the bytes of a small JPEG"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'red').save(buffer, format='JPEG')
+
+    return buffer.getvalue()
+
+
+def digest(data):
+    """Return the Content-Digest header value of data"""
+    return 'sha-256=:' + base64.b64encode(
+        hashlib.sha256(data).digest()
+    ).decode() + ':'
+
+
+class UploadSessionApiTests(TestCase):
+    """Test resumable recipe image uploads"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = Recipe.objects.create(user=self.user,
+                                                title='Curry',
+                                                time_minutes=5, price=5)
+        self.image = sample_image()
+        self.names = []
+
+    def tearDown(self):
+        for name in self.names:
+            default_storage.delete(name)
+
+    def start(self, size=None, filename='curry.jpg'):
+        res = self.client.post(UPLOADS_URL, {
+            'recipe': self.recipe.id,
+            'filename': filename,
+            'size': len(self.image) if size is None else size,
+        })
+        if res.status_code == status.HTTP_201_CREATED:
+            self.names.append(UploadSession.objects.get(id=res.data['id'])
+                              .name)
+
+        return res
+
+    def put(self, upload_id, start, data, checksum=None):
+        return self.client.generic(
+            'PUT', upload_url(upload_id), data,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=(f'bytes {start}-{start + len(data) - 1}/'
+                                f'{len(self.image)}'),
+            HTTP_CONTENT_DIGEST=checksum or digest(data),
+        )
+
+    def test_chunked_upload(self):
+        """Test chunks are assembled and attached to the recipe"""
+        upload_id = self.start().data['id']
+        half = len(self.image) // 2
+
+        res = self.put(upload_id, 0, self.image[:half])
+        self.assertEqual(res.data['offset'], half)
+        self.assertEqual(self.client.get(upload_url(upload_id)).data['offset'],
+                         half)
+        self.put(upload_id, half, self.image[half:])
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        with open(self.recipe.image.path, 'rb') as image:
+            self.assertEqual(image.read(), self.image)
+        self.assertIn(self.recipe.image.name, res.data['image'])
+        self.assertEqual(RecipeSummary.objects.get(recipe=self.recipe).image,
+                         self.recipe.image.name)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_retried_chunk_acknowledged(self):
+        """Test resending a received chunk leaves the upload as is"""
+        upload_id = self.start().data['id']
+        self.put(upload_id, 0, self.image[:100])
+
+        res = self.put(upload_id, 0, self.image[:100])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], 100)
+
+    def test_chunk_past_offset_rejected(self):
+        """Test a chunk leaving a gap is a conflict"""
+        upload_id = self.start().data['id']
+
+        res = self.put(upload_id, 100, self.image[100:200])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(UploadSession.objects.get().offset, 0)
+
+    def test_checksum_mismatch(self):
+        """Test a chunk not matching its digest is not counted"""
+        upload_id = self.start().data['id']
+
+        res = self.put(upload_id, 0, self.image[:100],
+                       checksum=digest(b'other bytes'))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(UploadSession.objects.get().offset, 0)
+
+    def test_malformed_digest(self):
+        """Test a digest that is not base64 is a bad request"""
+        upload_id = self.start().data['id']
+
+        res = self.put(upload_id, 0, self.image[:100],
+                       checksum='sha-256=:abc:')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_offset_moved_while_receiving(self):
+        """Test a chunk never overwrites bytes another one wrote"""
+        self.start()
+        stale = UploadSession.objects.get()
+        data = self.image[:100]
+        uploads.write_chunk(UploadSession.objects.get(), io.BytesIO(data),
+                            0, 100, hashlib.sha256(data).digest())
+
+        other = b'x' * 150
+        uploads.write_chunk(stale, io.BytesIO(other), 0, 100,
+                            hashlib.sha256(other[:100]).digest())
+        with self.assertRaises(uploads.UploadConflict):
+            uploads.write_chunk(stale, io.BytesIO(other), 0, 150,
+                                hashlib.sha256(other).digest())
+
+        self.assertEqual(UploadSession.objects.get().offset, 100)
+        with default_storage.open(self.names[0]) as upload:
+            self.assertEqual(upload.read(100), data)
+
+    def test_recipe_delete_removes_file(self):
+        """Test uploads deleted with their recipe leave no file behind"""
+        upload_id = self.start().data['id']
+        self.put(upload_id, 0, self.image[:100])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(default_storage.exists(self.names[0]))
+
+    def test_finalize_incomplete(self):
+        """Test an upload missing bytes cannot be finalized"""
+        upload_id = self.start().data['id']
+        self.put(upload_id, 0, self.image[:100])
+
+        res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+    def test_finalize_not_an_image(self):
+        """Test bytes that are not an image are discarded"""
+        self.image = b'not an image at all'
+        upload_id = self.start().data['id']
+        self.put(upload_id, 0, self.image)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(finalize_url(upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(default_storage.exists(self.names[0]))
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_invalid_sessions(self):
+        """Test uploads of other recipes, other files or too large fail"""
+        other = get_user_model().objects.create_user('other@123.com',
+                                                     'test1234')
+        self.recipe = Recipe.objects.create(user=other, title='Cake',
+                                            time_minutes=5, price=5)
+
+        self.assertEqual(self.start().status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.recipe = Recipe.objects.create(user=self.user, title='Pie',
+                                            time_minutes=5, price=5)
+        self.assertEqual(self.start(filename='curry.exe').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.start(size=10 ** 9).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_uploads_removed(self):
+        """Test abandoned uploads are hidden and deleted with their file"""
+        upload_id = self.start().data['id']
+        self.put(upload_id, 0, self.image[:100])
+        UploadSession.objects.update(
+            expires_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+
+        res = self.client.get(upload_url(upload_id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('expire_image_uploads', stdout=io.StringIO())
+
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(default_storage.path(self.names[0])))
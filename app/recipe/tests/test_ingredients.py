@@ -84,6 +84,18 @@ class PrivateIngredientApiTests(TestCase):
 
         self.assertTrue(exists)
 
+    def test_create_ingredient_existing_name(self):
+        """Test creating a known ingredient returns the existing one"""
+        ingredient = Ingredients.objects.create(user=self.user, name='Salt')
+
+        res = self.client.post(INGREDIENT_URL, {'name': 'SALT'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], ingredient.id)
+        self.assertEqual(
+            Ingredients.objects.filter(user=self.user).count(), 1
+        )
+
     def test_create_ingredient_invalid(self):
         """test that a invalid ingredient fails"""
         payload = {
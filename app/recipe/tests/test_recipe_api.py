@@ -179,6 +179,27 @@ class PrivateRecipeApiTest(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
 
+    def test_create_recipe_invalid_links(self):
+        """Test missing and other users' ids are rejected together"""
+        other = get_user_model().objects.create_user('other@123.com',
+                                                     'test1234')
+        own = sample_tag(user=self.user)
+        foreign = sample_tag(user=other, name='Secret')
+        payload = {
+            'title': 'chicken aloo',
+            'tags': [own.id, foreign.id, 9999],
+            'time_minutes': 20,
+            'price': 50.2
+        }
+
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['tags'], [
+            f'Invalid pks "{foreign.id}", "9999" - objects do not exist.'
+        ])
+        self.assertFalse(Recipe.objects.exists())
+
     def test_partial_update_recipe(self):
         """test updating a recipe with patch"""
         recipe = sample_recipe(user=self.user)
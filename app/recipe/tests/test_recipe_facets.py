@@ -0,0 +1,120 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredients
+
+FACETS_URL = reverse('recipe:recipe-facets')
+
+
+def sample_recipe(user, **params):
+    """Create and return a simple recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 5,
+        'price': '10'
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PublicRecipeFacetsApiTests(TestCase):
+    """Test unauthorized access to recipe facets"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """Test that authentication is required"""
+        res = self.client.get(FACETS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateRecipeFacetsApiTests(TestCase):
+    """Test the recipe facet counts for an authenticated user"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dessert = Tag.objects.create(user=self.user, name='Dessert')
+        self.salt = Ingredients.objects.create(user=self.user, name='Salt')
+        self.sugar = Ingredients.objects.create(user=self.user, name='Sugar')
+
+        self.curry = sample_recipe(self.user, title='Chickpea curry')
+        self.curry.tags.add(self.vegan)
+        self.curry.ingredients.add(self.salt)
+
+        self.cake = sample_recipe(self.user, title='Vegan cake')
+        self.cake.tags.add(self.vegan, self.dessert)
+        self.cake.ingredients.add(self.salt, self.sugar)
+
+    def test_facet_counts(self):
+        """Test counting tags and ingredients over all recipes"""
+        res = self.client.get(FACETS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'], [
+            {'id': self.vegan.id, 'name': 'Vegan', 'count': 2},
+            {'id': self.dessert.id, 'name': 'Dessert', 'count': 1},
+        ])
+        self.assertEqual(res.data['ingredients'], [
+            {'id': self.salt.id, 'name': 'Salt', 'count': 2},
+            {'id': self.sugar.id, 'name': 'Sugar', 'count': 1},
+        ])
+
+    def test_facet_counts_follow_filters(self):
+        """Test that facet counts only cover the filtered recipes"""
+        res = self.client.get(FACETS_URL, {'tags': f'{self.dessert.id}'})
+
+        self.assertEqual(res.data['tags'], [
+            {'id': self.dessert.id, 'name': 'Dessert', 'count': 1},
+            {'id': self.vegan.id, 'name': 'Vegan', 'count': 1},
+        ])
+
+        res = self.client.get(FACETS_URL, {'search': 'curry'})
+
+        self.assertEqual(res.data['ingredients'], [
+            {'id': self.salt.id, 'name': 'Salt', 'count': 1},
+        ])
+
+    def test_facet_counts_limited_to_user(self):
+        """Test that other users recipes are not counted"""
+        user2 = get_user_model().objects.create_user(
+            'test1@123.com',
+            'test12345',
+        )
+        recipe = sample_recipe(user2)
+        recipe.tags.add(Tag.objects.create(user=user2, name='Spicy'))
+
+        res = self.client.get(FACETS_URL)
+
+        self.assertEqual(len(res.data['tags']), 2)
+
+    def test_facet_counts_single_query(self):
+        """Test that the counts are computed in one round trip"""
+        with self.assertNumQueries(1):
+            self.client.get(FACETS_URL)
+
+    @override_settings(RECIPE_FACETS_CACHE_TIMEOUT=30)
+    def test_facet_counts_cached(self):
+        """Test that cached counts are served without querying"""
+        cache.clear()
+        self.client.get(FACETS_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(FACETS_URL)
+
+        self.assertEqual(res.data['tags'][0]['count'], 2)
+        cache.clear()
@@ -0,0 +1,192 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import ChangeLog, Recipe, RecipeSummary, Tag, Ingredients
+from core.testing import QueryAssertionsMixin
+
+
+class RecipeApiQueryTests(QueryAssertionsMixin, TestCase):
+    """Test the recipe API endpoints do not issue N+1 queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+
+        for i in range(10):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=i, price=i
+            )
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f't{i}'))
+            recipe.ingredients.add(
+                Ingredients.objects.create(user=self.user, name=f'i{i}')
+            )
+        self.recipe = recipe
+
+    def test_list_endpoints(self):
+        """Test list endpoints query a fixed number of times"""
+        urls = [
+            reverse('recipe:recipe-list'),
+            reverse('recipe:recipe-facets'),
+            reverse('recipe:tag-list'),
+            reverse('recipe:ingredients-list'),
+        ]
+        for url in urls:
+            with self.subTest(url=url), self.assertNoNPlusOne(threshold=2):
+                self.client.get(url)
+
+    def test_detail_endpoint(self):
+        """Test the recipe detail queries a fixed number of times"""
+        url = reverse('recipe:recipe-detail', args=[self.recipe.id])
+
+        with self.assertNoNPlusOne(threshold=2):
+            self.client.get(url)
+
+    def test_create_with_many_links(self):
+        """Test creating runs the same queries for any number of links"""
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredients.objects.values_list('id', flat=True))
+
+        counts = []
+        for size in (1, 10):
+            payload = {
+                'title': 'Everything', 'time_minutes': 5, 'price': '5.00',
+                'tags': tag_ids[:size], 'ingredients': ingredient_ids[:size],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(reverse('recipe:recipe-list'), payload)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 10)
+        self.assertEqual(recipe.ingredients.count(), 10)
+
+
+class RecipeUpdateQueryTests(TestCase):
+    """Test updates write only the links that changed"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+
+        self.tags = [Tag.objects.create(user=self.user, name=f't{i}')
+                     for i in range(10)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = Recipe.objects.create(user=self.user,
+                                                title='Curry',
+                                                time_minutes=5, price=5)
+            self.recipe.tags.add(*self.tags[:3])
+        self.url = reverse('recipe:recipe-detail', args=[self.recipe.id])
+
+    def patch_tags(self, tags):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(self.url,
+                                     {'tags': [tag.id for tag in tags]})
+
+    def test_unchanged_update_skips_writes(self):
+        """Test an update matching the recipe writes nothing"""
+        logged = ChangeLog.objects.count()
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(self.url, {
+                'title': 'Curry',
+                'tags': [tag.id for tag in reversed(self.tags[:3])],
+            })
+
+        self.assertEqual(res.status_code, 200)
+        writes = [query['sql'] for query in queries
+                  if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+        self.assertEqual(ChangeLog.objects.count(), logged)
+
+    def test_changed_links_bulk_written(self):
+        """Test a link change costs the same queries whatever its size"""
+        logged = ChangeLog.objects.count()
+        # recipe and 2 prefetches, tag ids, current links, delete, insert,
+        # change log (3), summary (6), 2 for the response, 6 savepoints
+        with self.assertNumQueries(24):
+            res = self.patch_tags(self.tags[2:4])
+        with self.assertNumQueries(24):
+            self.patch_tags(self.tags[4:])
+
+        self.assertEqual(sorted(res.data['tags']),
+                         [tag.id for tag in self.tags[2:4]])
+        self.assertEqual(set(self.recipe.tags.all()), set(self.tags[4:]))
+        summary = RecipeSummary.objects.get(recipe=self.recipe)
+        self.assertEqual(summary.tag_ids, [tag.id for tag in self.tags[4:]])
+        self.assertEqual(ChangeLog.objects.count(), logged + 2)
+
+    def test_fields_and_links_updated(self):
+        """Test a field change saves once with the new links"""
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(self.url, {
+                'title': 'Daal', 'tags': [self.tags[0].id],
+            })
+
+        self.assertEqual(res.data['title'], 'Daal')
+        self.assertEqual(res.data['tags'], [self.tags[0].id])
+        summary = RecipeSummary.objects.get(recipe=self.recipe)
+        self.assertEqual((summary.title, summary.tag_ids),
+                         ('Daal', [self.tags[0].id]))
+
+
+class RecipeApiIndexTests(QueryAssertionsMixin, TestCase):
+    """Test every per-user query of the endpoints has an index"""
+
+    def setUp(self):
+        self.client = APIClient()
+        users = [
+            get_user_model().objects.create_user(f'user{i}@123.com',
+                                                 'test1234')
+            for i in range(5)
+        ]
+        for user in users:
+            tags = [Tag.objects.create(user=user, name=f't{i}')
+                    for i in range(5)]
+            ingredients = [Ingredients.objects.create(user=user, name=f'i{i}')
+                           for i in range(5)]
+            for i in range(5):
+                recipe = Recipe.objects.create(
+                    user=user, title=f'Recipe {i}', time_minutes=i, price=i
+                )
+                recipe.tags.add(*tags[i:])
+                recipe.ingredients.add(*ingredients[:i])
+        self.user = users[0]
+        self.client.force_authenticate(self.user)
+
+    def test_endpoints_use_indexes(self):
+        """Test endpoint queries neither scan nor sort per-user tables"""
+        recipe = Recipe.objects.filter(user=self.user).first()
+        tag = Tag.objects.filter(user=self.user).first()
+        urls = [
+            reverse('recipe:tag-list'),
+            reverse('recipe:tag-list') + '?assigned_only=1',
+            reverse('recipe:ingredients-list'),
+            reverse('recipe:ingredients-list') + '?assigned_only=1',
+            reverse('recipe:recipe-list'),
+            reverse('recipe:recipe-list') + '?ordering=price',
+            reverse('recipe:recipe-list') + '?ordering=-time_minutes',
+            reverse('recipe:recipe-list') + f'?tags={tag.id}',
+            reverse('recipe:recipe-list') + '?summary=1',
+            reverse('recipe:recipe-list') + '?summary=1&ordering=price',
+            reverse('recipe:recipe-list') + f'?summary=1&tags={tag.id}',
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+            reverse('recipe:changes'),
+        ]
+        for url in urls:
+            with self.subTest(url=url), self.assertIndexedQueries():
+                res = self.client.get(url)
+                self.assertEqual(res.status_code, 200)
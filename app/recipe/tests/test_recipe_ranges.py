@@ -0,0 +1,125 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.testing import explain
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def sample_recipe(user, **params):
+    """Create and return a simple recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 5,
+        'price': '10'
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeRangeFilterApiTests(TestCase):
+    """Test filtering and ordering recipes by price and time"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+
+        self.quick = sample_recipe(self.user, time_minutes=10, price='4.50')
+        self.cheap = sample_recipe(self.user, time_minutes=45, price='3.00')
+        self.fancy = sample_recipe(self.user, time_minutes=20, price='25.00')
+
+    def test_filter_price_and_time(self):
+        """Test filtering recipes under 30 minutes and under $10"""
+        res = self.client.get(RECIPES_URL, {'time_max': 30, 'price_max': 10})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [self.quick.id])
+
+    def test_filter_minimums(self):
+        """Test filtering recipes by lower bounds"""
+        res = self.client.get(RECIPES_URL, {'time_min': 15, 'price_min': 5})
+
+        self.assertEqual([r['id'] for r in res.data], [self.fancy.id])
+
+    def test_filter_invalid_value(self):
+        """Test that an invalid bound is rejected"""
+        res = self.client.get(RECIPES_URL, {'price_min': 'cheap'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('price_min', res.data)
+
+    def test_ordering(self):
+        """Test ordering recipes by price and time"""
+        res = self.client.get(RECIPES_URL, {'ordering': 'price'})
+        self.assertEqual(
+            [r['id'] for r in res.data],
+            [self.cheap.id, self.quick.id, self.fancy.id]
+        )
+
+        res = self.client.get(RECIPES_URL, {'ordering': '-time_minutes'})
+        self.assertEqual(
+            [r['id'] for r in res.data],
+            [self.cheap.id, self.fancy.id, self.quick.id]
+        )
+
+    def test_ordering_invalid_field(self):
+        """Test that ordering by an unindexed field is rejected"""
+        res = self.client.get(RECIPES_URL, {'ordering': 'title'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_keyset_pagination(self):
+        """Test paging through recipes with a cursor"""
+        res = self.client.get(
+            RECIPES_URL, {'ordering': 'price', 'page_size': 2}
+        )
+
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [self.cheap.id, self.quick.id]
+        )
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [self.fancy.id]
+        )
+        self.assertIsNone(res.data['next'])
+
+
+class RecipeRangeIndexTests(TestCase):
+    """Test that range filters and orderings can use the indexes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.recipes = Recipe.objects.filter(user=self.user)
+
+    def test_price_range_uses_index(self):
+        """Test filtering by price uses the price index"""
+        plan = explain(self.recipes.filter(
+            price__gte=1, price__lte=10
+        ).order_by('price', 'id'))
+
+        self.assertIn('recipe_user_price_id_idx', plan)
+
+    def test_time_range_uses_index(self):
+        """Test filtering by time uses the time index"""
+        plan = explain(self.recipes.filter(
+            time_minutes__lte=30
+        ).order_by('-time_minutes', '-id'))
+
+        self.assertIn('recipe_user_time_id_idx', plan)
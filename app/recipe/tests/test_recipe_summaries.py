@@ -0,0 +1,174 @@
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeSummary, Tag, Ingredients
+from jobs.worker import Worker
+from recipe import summaries
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def sample_recipe(user, **params):
+    """Create and return a simple recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 5,
+        'price': '10'
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeSummaryTests(TestCase):
+    """Test the recipe summary table is kept up to date"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.salt = Ingredients.objects.create(user=self.user, name='Salt')
+
+    def test_summary_written_on_create(self):
+        """Test creating a recipe writes its summary once, on commit"""
+        with patch('recipe.summaries.refresh',
+                   wraps=summaries.refresh) as refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(RECIPES_URL, {
+                'title': 'Curry',
+                'tags': [self.vegan.id],
+                'ingredients': [self.salt.id],
+                'time_minutes': 20,
+                'price': '5.00',
+            })
+            self.assertFalse(RecipeSummary.objects.exists())
+
+        refresh.assert_called_once_with([res.data['id']])
+
+        summary = RecipeSummary.objects.get(recipe_id=res.data['id'])
+        self.assertEqual(summary.title, 'Curry')
+        self.assertEqual(summary.tag_ids, [self.vegan.id])
+        self.assertEqual(summary.tag_names, ['Vegan'])
+        self.assertEqual(summary.ingredient_names, ['Salt'])
+
+    def test_summary_follows_links(self):
+        """Test adding and clearing links updates the summary"""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = sample_recipe(self.user)
+            self.vegan.recipe_set.add(recipe)
+        self.assertEqual(
+            RecipeSummary.objects.get(recipe=recipe).tag_ids, [self.vegan.id]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.tags.clear()
+
+        self.assertEqual(RecipeSummary.objects.get(recipe=recipe).tag_ids, [])
+
+    def test_rename_refreshed_by_job(self):
+        """Test renaming a tag queues a refresh of linked summaries"""
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(self.vegan)
+
+        self.vegan.name = 'Plant based'
+        self.vegan.save()
+        self.assertTrue(Worker('w').run_once())
+
+        self.assertEqual(
+            RecipeSummary.objects.get(recipe=recipe).tag_names,
+            ['Plant based']
+        )
+
+    def test_delete_refreshed_by_job(self):
+        """Test deleting an ingredient removes it from summaries"""
+        recipe = sample_recipe(self.user)
+        recipe.ingredients.add(self.salt)
+
+        self.salt.delete()
+        Worker('w').run_once()
+
+        self.assertEqual(
+            RecipeSummary.objects.get(recipe=recipe).ingredient_ids, []
+        )
+
+    def test_list_from_summaries(self):
+        """Test lists read from summaries match filters and ordering"""
+        with self.captureOnCommitCallbacks(execute=True):
+            curry = sample_recipe(self.user, title='Curry', price='8')
+            curry.tags.add(self.vegan)
+            cake = sample_recipe(self.user, title='Cake', price='3')
+            cake.tags.add(self.vegan)
+            sample_recipe(self.user, title='Steak', price='20')
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, {
+                'summary': 1, 'tags': self.vegan.id, 'ordering': 'price',
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data],
+                         [cake.id, curry.id])
+        self.assertEqual(res.data[0]['tags'],
+                         [{'id': self.vegan.id, 'name': 'Vegan'}])
+
+    def test_list_from_summaries_paginated(self):
+        """Test cursor pagination works over summaries"""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipes = [sample_recipe(self.user, title=f'Recipe {i}')
+                       for i in range(3)]
+
+        res = self.client.get(RECIPES_URL, {'summary': 1, 'page_size': 2})
+        second = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results'] +
+             second.data['results']],
+            [recipe.id for recipe in reversed(recipes)]
+        )
+
+    def test_rebuild_and_check(self):
+        """Test the checker finds stale summaries and rebuild fixes them"""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = sample_recipe(self.user)
+            other = sample_recipe(self.user, title='Other')
+        RecipeSummary.objects.filter(recipe=recipe).update(title='Stale')
+        RecipeSummary.objects.filter(recipe=other).delete()
+
+        with self.assertRaises(CommandError):
+            call_command('check_recipe_summaries', stdout=StringIO())
+
+        call_command('rebuild_recipe_summaries', stdout=StringIO())
+        call_command('check_recipe_summaries', stdout=StringIO())
+        self.assertEqual(
+            RecipeSummary.objects.get(recipe=recipe).title, 'Sample recipe'
+        )
+
+    def test_migration_backfills_summaries(self):
+        """Test the migration creating summaries writes existing ones"""
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(self.vegan)
+        RecipeSummary.objects.all().delete()
+        migration = import_module('core.migrations.0009_recipesummary')
+
+        migration.backfill_summaries(apps,
+                                     SimpleNamespace(connection=connection))
+
+        call_command('check_recipe_summaries', stdout=StringIO())
+        self.assertEqual(RecipeSummary.objects.get(recipe=recipe).tag_names,
+                         ['Vegan'])
@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Ingredients
+
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
+
+
+def sample_recipe(user, **params):
+    """Create and return a simple recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 5,
+        'price': '10'
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ShoppingListApiTests(TestCase):
+    """Test building a shopping list from selected recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+
+        self.salt = Ingredients.objects.create(user=self.user, name='Salt')
+        self.rice = Ingredients.objects.create(user=self.user, name='Rice')
+        self.oil = Ingredients.objects.create(user=self.user, name='Oil')
+
+        self.curry = sample_recipe(self.user, title='Curry')
+        self.curry.ingredients.add(self.salt, self.rice)
+        self.risotto = sample_recipe(self.user, title='Risotto')
+        self.risotto.ingredients.add(self.rice, self.oil)
+        self.cake = sample_recipe(self.user, title='Cake')
+        self.cake.ingredients.add(self.salt)
+
+    def test_merged_ingredients(self):
+        """Test ingredients are deduplicated with recipe counts"""
+        with self.assertNumQueries(1):
+            res = self.client.get(SHOPPING_LIST_URL, {
+                'recipes': f'{self.curry.id},{self.risotto.id}'
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': self.oil.id, 'name': 'Oil', 'recipe_count': 1},
+            {'id': self.rice.id, 'name': 'Rice', 'recipe_count': 2},
+            {'id': self.salt.id, 'name': 'Salt', 'recipe_count': 1},
+        ])
+
+    def test_other_users_recipes_ignored(self):
+        """Test recipes of other users add nothing to the list"""
+        other = get_user_model().objects.create_user('other@123.com',
+                                                     'test1234')
+        recipe = sample_recipe(other)
+        recipe.ingredients.add(
+            Ingredients.objects.create(user=other, name='Secret')
+        )
+
+        res = self.client.get(SHOPPING_LIST_URL, {
+            'recipes': f'{self.cake.id},{recipe.id}'
+        })
+
+        self.assertEqual(res.data, [
+            {'id': self.salt.id, 'name': 'Salt', 'recipe_count': 1},
+        ])
+
+    def test_invalid_recipes_param(self):
+        """Test a missing or malformed recipes param is rejected"""
+        for params in ({}, {'recipes': '1,a'}):
+            res = self.client.get(SHOPPING_LIST_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,130 @@
+import random
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredients
+from recipe.similarity import SimilarityIndex, similarity_indexes
+
+
+def similar_url(recipe_id):
+    """Return the similar recipes URL of a recipe"""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+def sample_recipe(user, **params):
+    """Create and return a simple recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 5,
+        'price': '10'
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class SimilarityIndexTests(TestCase):
+    """Test the vectorized similarity scores"""
+
+    def test_matches_weighted_jaccard(self):
+        """Test scores equal a direct weighted Jaccard computation"""
+        rng = random.Random(1)
+        features = {
+            recipe_id: set(rng.sample(range(40), rng.randint(1, 6)))
+            for recipe_id in range(1, 60)
+        }
+        pairs = [(recipe_id, feature)
+                 for recipe_id, keys in features.items() for feature in keys]
+        index = SimilarityIndex(
+            np.array([recipe_id for recipe_id, _ in pairs]),
+            np.array([feature for _, feature in pairs]),
+            tag_weight=0.5, ingredient_weight=1.0,
+        )
+
+        def weight(keys):
+            return sum(0.5 if key % 2 == 0 else 1.0 for key in keys)
+
+        scores = index.scores(7)
+        for row, recipe_id in enumerate(index.recipe_ids):
+            if recipe_id == 7:
+                continue
+            expected = (weight(features[7] & features[recipe_id]) /
+                        weight(features[7] | features[recipe_id]))
+            self.assertAlmostEqual(scores[row], expected)
+
+    def test_ties_ordered_by_id(self):
+        """Test equally similar recipes are returned by id"""
+        index = SimilarityIndex(np.array([1, 2, 3, 4]),
+                                np.array([1, 1, 1, 1]))
+
+        self.assertEqual(index.similar(1, 2), [(2, 1.0), (3, 1.0)])
+
+
+class SimilarRecipesApiTests(TestCase):
+    """Test the similar recipes action"""
+
+    def setUp(self):
+        similarity_indexes.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.salt = Ingredients.objects.create(user=self.user, name='Salt')
+        self.rice = Ingredients.objects.create(user=self.user, name='Rice')
+
+        self.curry = sample_recipe(self.user, title='Curry')
+        self.curry.tags.add(self.vegan)
+        self.curry.ingredients.add(self.salt, self.rice)
+
+    def tearDown(self):
+        similarity_indexes.clear()
+
+    def test_similar_recipes(self):
+        """Test recipes are ranked by weighted overlap"""
+        risotto = sample_recipe(self.user, title='Risotto')
+        risotto.ingredients.add(self.salt, self.rice)
+        salad = sample_recipe(self.user, title='Salad')
+        salad.tags.add(self.vegan)
+        sample_recipe(self.user, title='Steak')
+
+        res = self.client.get(similar_url(self.curry.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data],
+                         [risotto.id, salad.id])
+        self.assertEqual(res.data[0]['score'], 0.8)
+        self.assertEqual(res.data[1]['score'], 0.2)
+
+    def test_index_follows_link_changes(self):
+        """Test a cached index picks up changed links"""
+        risotto = sample_recipe(self.user, title='Risotto')
+        self.client.get(similar_url(self.curry.id))
+
+        risotto.ingredients.add(self.rice)
+        res = self.client.get(similar_url(self.curry.id))
+
+        self.assertEqual([item['id'] for item in res.data], [risotto.id])
+
+        risotto.delete()
+        res = self.client.get(similar_url(self.curry.id))
+
+        self.assertEqual(res.data, [])
+
+    def test_other_users_recipe_not_found(self):
+        """Test recipes of other users cannot be queried"""
+        other = get_user_model().objects.create_user('other@123.com',
+                                                     'test1234')
+        recipe = sample_recipe(other)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
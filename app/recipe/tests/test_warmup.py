@@ -0,0 +1,140 @@
+import threading
+from unittest.mock import Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.metrics import registry
+from core.models import Job, Recipe, Tag
+from recipe import warmup
+
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+TOKEN_URL = reverse('user:token')
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=60)
+class ResponseCacheTests(TestCase):
+    """Test reads are cached until the user changes their data"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.client.force_authenticate(self.user)
+        Tag.objects.create(user=self.user, name='Vegan')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cached_until_change(self):
+        """Test a cached list is replaced once the user writes"""
+        self.client.get(TAGS_URL)
+        # Only the change sequence is read on a hit
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL)
+        self.assertEqual([tag['name'] for tag in res.data], ['Vegan'])
+
+        self.client.post(TAGS_URL, {'name': 'Dessert'})
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual([tag['name'] for tag in res.data],
+                         ['Vegan', 'Dessert'])
+
+    def test_query_params_not_cached(self):
+        """Test filtered reads always run their queries"""
+        url = TAGS_URL + '?assigned_only=1'
+        self.client.get(url)
+
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+    def test_warm_user(self):
+        """Test warming caches the first reads of the user"""
+        Recipe.objects.create(user=self.user, title='Curry',
+                              time_minutes=5, price=5)
+
+        warmed = warmup.warm_user(self.user.pk, 'testserver', 'http')
+
+        self.assertEqual(warmed, list(warmup.WARM_URL_NAMES))
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['title'], 'Curry')
+
+    @override_settings(LOGIN_WARMUP_BUDGET=0)
+    def test_warm_user_budget(self):
+        """Test no read is started once the budget is spent"""
+        self.assertEqual(
+            warmup.warm_user(self.user.pk, 'testserver', 'http'), []
+        )
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=60)
+class LoginWarmupTests(TestCase):
+    """Test logging in warms the response cache when enabled"""
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@123.com',
+            'test1234',
+        )
+        self.credentials = {'email': 'test@123.com', 'password': 'test1234'}
+
+    def tearDown(self):
+        cache.clear()
+        registry.clear()
+
+    @override_settings(LOGIN_WARMUP='queue')
+    def test_login_queues_warmup(self):
+        """Test a login queues a warm-up job for the user"""
+        res = self.client.post(TOKEN_URL, self.credentials)
+
+        self.assertIn('token', res.data)
+        job = Job.objects.get(task='recipe.tasks.warm_user')
+        self.assertEqual(job.payload, {
+            'user_id': self.user.pk, 'host': 'testserver', 'scheme': 'http',
+        })
+
+    @override_settings(LOGIN_WARMUP='')
+    def test_warmup_disabled(self):
+        """Test nothing is warmed unless enabled"""
+        self.client.post(TOKEN_URL, self.credentials)
+
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(LOGIN_WARMUP='thread')
+    def test_thread_warmups_bounded(self):
+        """Test logins over the concurrency limit are not warmed"""
+        executor = Mock()
+        slots = threading.BoundedSemaphore(1)
+        with patch('recipe.warmup._get_executor',
+                   return_value=(executor, slots)):
+            self.client.post(TOKEN_URL, self.credentials)
+            self.client.post(TOKEN_URL, self.credentials)
+
+        self.assertEqual(executor.submit.call_count, 1)
+
+    @override_settings(METRICS_ENABLED=True, LOGIN_WARMUP='queue')
+    def test_first_request_timed(self):
+        """Test only the first request after a login is timed by state"""
+        token = self.client.post(TOKEN_URL, self.credentials).data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL)
+
+        histogram = registry.get('http_first_request_warm_seconds',
+                                 'recipe:tag-list')
+        self.assertEqual(histogram.count, 1)
+        self.assertIsNone(registry.get('http_first_request_cold_seconds',
+                                       'recipe:tag-list'))
@@ -0,0 +1,206 @@
+import base64
+import binascii
+import datetime
+import hashlib
+import os
+import re
+import tempfile
+
+from PIL import Image, UnidentifiedImageError
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from rest_framework import exceptions, status
+
+from core.models import UploadSession, recipe_image_filepath
+
+BLOCK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+_DIGEST_RE = re.compile(r'(?:^|,)\s*sha-256=:([A-Za-z0-9+/]+=*):')
+
+
+class UploadConflict(exceptions.APIException):
+    """Raised for a chunk or finalize not matching the received bytes"""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The upload is not at this offset.'
+
+
+def _expiry():
+    return timezone.now() + datetime.timedelta(
+        seconds=settings.IMAGE_UPLOAD_TTL
+    )
+
+
+def create_session(user, recipe, filename, size):
+    """Start an upload, reserving the file the chunks are written to"""
+    name = default_storage.save(recipe_image_filepath(recipe, filename),
+                                ContentFile(b''))
+
+    return UploadSession.objects.create(user=user, recipe=recipe, name=name,
+                                        size=size, expires_at=_expiry())
+
+
+def parse_range(header, size):
+    """Return (start, end) of a Content-Range header, end exclusive"""
+    match = _RANGE_RE.match(header or '')
+    if match is None:
+        raise exceptions.ValidationError(
+            {'Content-Range': 'Expected bytes <start>-<end>/<size>.'}
+        )
+    start, last, total = match.groups()
+    start, end = int(start), int(last) + 1
+    if end <= start or end > size or total not in ('*', str(size)):
+        raise exceptions.ValidationError(
+            {'Content-Range': f'Range outside the {size} bytes upload.'}
+        )
+    if end - start > settings.IMAGE_UPLOAD_MAX_CHUNK:
+        raise exceptions.ValidationError({'Content-Range': (
+            f'Chunks are at most {settings.IMAGE_UPLOAD_MAX_CHUNK} bytes.'
+        )})
+
+    return start, end
+
+
+def parse_digest(header):
+    """Return the SHA-256 digest of a Content-Digest header"""
+    match = _DIGEST_RE.search(header or '')
+    if match is None:
+        raise exceptions.ValidationError(
+            {'Content-Digest': 'A sha-256 digest of the chunk is required.'}
+        )
+
+    try:
+        return base64.b64decode(match.group(1), validate=True)
+    except (binascii.Error, ValueError):
+        raise exceptions.ValidationError(
+            {'Content-Digest': 'The sha-256 digest is not valid base64.'}
+        )
+
+
+def _receive(stream, size, digest):
+    """Return a temporary file holding size bytes of stream
+
+    The bytes are hashed while they are read and rejected unless they
+    match digest.
+    """
+    chunk = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    sha256 = hashlib.sha256()
+    received = 0
+    while received < size:
+        block = stream.read(min(BLOCK_SIZE, size - received))
+        if not block:
+            chunk.close()
+            raise exceptions.ValidationError(
+                {'detail': 'The body is shorter than the range.'}
+            )
+        sha256.update(block)
+        chunk.write(block)
+        received += len(block)
+
+    if sha256.digest() != digest:
+        chunk.close()
+        raise exceptions.ValidationError(
+            {'Content-Digest': 'The chunk does not match its digest.'}
+        )
+    chunk.seek(0)
+
+    return chunk
+
+
+def write_chunk(session, stream, start, end, digest):
+    """Write a chunk read from stream at its offset in the file
+
+    The chunk is received into a temporary file and checked against its
+    digest without holding any lock. It is then copied into the upload
+    under the session's row lock, only if the offset still equals start,
+    so a chunk can never overwrite bytes already counted as received.
+    Chunks must follow the bytes received so far, a retried chunk that was
+    already received is acknowledged as is.
+    """
+    if end <= session.offset:
+        return session
+    if start != session.offset:
+        raise UploadConflict(
+            f'Expected a chunk starting at {session.offset}.'
+        )
+
+    with _receive(stream, end - start, digest) as chunk, \
+            transaction.atomic(using=UploadSession.objects.db):
+        session = UploadSession.objects.select_for_update().get(
+            id=session.id
+        )
+        if end <= session.offset:
+            return session
+        if start != session.offset:
+            raise UploadConflict(
+                f'Expected a chunk starting at {session.offset}.'
+            )
+
+        fd = os.open(default_storage.path(session.name), os.O_WRONLY)
+        try:
+            position = start
+            for block in iter(lambda: chunk.read(BLOCK_SIZE), b''):
+                os.pwrite(fd, block, position)
+                position += len(block)
+        finally:
+            os.close(fd)
+
+        session.offset = end
+        session.expires_at = _expiry()
+        session.save(update_fields=['offset', 'expires_at'])
+
+    return session
+
+
+def finalize(session):
+    """Attach a complete upload to its recipe and return the recipe
+
+    The image is identified from its header, the file itself stays where
+    the chunks were written.
+    """
+    if session.offset != session.size:
+        raise UploadConflict(
+            f'Only {session.offset} of {session.size} bytes were received.'
+        )
+    try:
+        with Image.open(default_storage.path(session.name)):
+            pass
+    except (UnidentifiedImageError, OSError):
+        discard(session)
+        raise exceptions.ValidationError(
+            {'image': 'The upload is not a valid image.'}
+        )
+
+    recipe = session.recipe
+    with transaction.atomic(using=UploadSession.objects.db):
+        recipe.image.name = session.name
+        recipe.save(update_fields=['image'])
+        # The file now belongs to the recipe, not to the upload
+        session.name = ''
+        session.delete()
+
+    return recipe
+
+
+def discard(session):
+    """Delete an upload, its file is removed with it"""
+    session.delete()
+
+
+def expire_sessions(now=None):
+    """Discard uploads that received no chunk in time, returning how many"""
+    expired = UploadSession.objects.filter(expires_at__lte=now or
+                                           timezone.now())
+    count = 0
+    for session in expired.iterator():
+        discard(session)
+        count += 1
+
+    return count
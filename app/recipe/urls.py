@@ -2,15 +2,24 @@ from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
 
-from recipe import views
+from recipe import async_views, views
 
 router = DefaultRouter()
 router.register('tags', views.TagViewSet)
 router.register('ingredients', views.IngreidientViewSet)
 router.register('recipe', views.RecipeViewSet)
+router.register('uploads', views.UploadSessionViewSet)
 
 app_name = 'recipe'
 
 urlpatterns = [
+    path('async/recipe/', async_views.recipe_list,
+         name='async-recipe-list'),
+    path('async/recipe/<int:pk>/', async_views.recipe_detail,
+         name='async-recipe-detail'),
+    path('async/tags/', async_views.tag_list, name='async-tag-list'),
+    path('async/ingredients/', async_views.ingredient_list,
+         name='async-ingredients-list'),
+    path('changes/', views.ChangeFeedView.as_view(), name='changes'),
     path('', include(router.urls))
 ]
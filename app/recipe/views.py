@@ -1,16 +1,71 @@
+import hashlib
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Count, Exists, OuterRef, Value
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from rest_framework import viewsets, mixins, status
+from rest_framework import viewsets, mixins, status, fields
 from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core import changes
+from core.idempotency import idempotent
+from core.models import (ChangeLog, Tag, Ingredients, Recipe,
+                         RecipeSummary, UploadSession)
+from core.routers import UserShardMixin
+
+from recipe import serializers, uploads
+from recipe.autocomplete import autocomplete
+from recipe.clone import clone_recipes
+from recipe.pagination import RecipeCursorPagination
+
+
+class CachedResponseMixin:
+    """Serve reads without query params from the response cache
 
-from core.models import Tag, Ingredients, Recipe
+    Keys include the users change sequence, so any change to their
+    recipes, tags or ingredients leaves the old entries unused.
+    """
 
-from recipe import serializers
+    def _response_cache_key(self):
+        request = self.request
+        seq = changes.last_seq(request.user.pk)
+        origin = hashlib.md5(
+            request.build_absolute_uri('/').encode()
+        ).hexdigest()
 
+        return (f'response:{self.basename}-{self.action}:'
+                f'{request.user.pk}:{seq}:{origin}')
 
-class BaseAttrViewSet(viewsets.GenericViewSet,
+    def cached_response(self, build):
+        """Return the cached data of this read, calling build on a miss"""
+        timeout = settings.RESPONSE_CACHE_TIMEOUT
+        if not timeout or self.request.query_params:
+            return build()
+
+        key = self._response_cache_key()
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, timeout)
+
+        return response
+
+
+class BaseAttrViewSet(UserShardMixin,
+                      CachedResponseMixin,
+                      viewsets.GenericViewSet,
                       mixins.ListModelMixin,
                       mixins.CreateModelMixin):
 
@@ -26,15 +81,56 @@ class BaseAttrViewSet(viewsets.GenericViewSet,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            # Exists instead of a join, which needed distinct() and a sort
+            field = Recipe._meta.get_field(self.recipe_field)
+            queryset = queryset.filter(Exists(
+                field.remote_field.through.objects.filter(
+                    **{field.m2m_reverse_name(): OuterRef('pk')}
+                )
+            ))
+
+        return queryset.filter(user=self.request.user).order_by('-name')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            partial(super().list, request, *args, **kwargs)
+        )
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-name').distinct()
+    def create(self, request, *args, **kwargs):
+        """Create an object, returning the existing one for a known name"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        created = self.perform_create(serializer)
+
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
     def perform_create(self, serializer):
-        """Create a new object"""
-        serializer.save(user=self.request.user)
+        """Create a new object unless the user already has the name"""
+        model = self.queryset.model
+        serializer.instance, created = model.objects.get_or_create_for_user(
+            self.request.user, serializer.validated_data['name']
+        )
+
+        return created
+
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request):
+        """Return names starting with the q query param"""
+        prefix = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+
+        if not prefix or limit < 1:
+            return Response([])
+
+        return Response(
+            autocomplete(self.queryset, request.user, prefix, limit)
+        )
 
 
 class TagViewSet(BaseAttrViewSet):
@@ -42,6 +138,7 @@ class TagViewSet(BaseAttrViewSet):
 
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    recipe_field = 'tags'
 
 
 class IngreidientViewSet(BaseAttrViewSet):
@@ -49,23 +146,112 @@ class IngreidientViewSet(BaseAttrViewSet):
 
     queryset = Ingredients.objects.all()
     serializer_class = serializers.IngredientSerializer
+    recipe_field = 'ingredients'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(UserShardMixin, CachedResponseMixin,
+                    viewsets.ModelViewSet):
     """Manage Recipes in database"""
     serializer_class = serializers.RecipeSerailizer
     queryset = Recipe.objects.all()
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeCursorPagination
+
+    # Each ordering is backed by a (user, field, id) index in core.models
+    ordering_fields = ('id', 'price', 'time_minutes')
+    default_ordering = '-id'
+
+    shopping_list_max_recipes = 100
+    clone_max_recipes = 100
+
+    range_filters = (
+        ('price_min', 'price__gte',
+         fields.DecimalField(max_digits=None, decimal_places=None)),
+        ('price_max', 'price__lte',
+         fields.DecimalField(max_digits=None, decimal_places=None)),
+        ('time_min', 'time_minutes__gte', fields.IntegerField()),
+        ('time_max', 'time_minutes__lte', fields.IntegerField()),
+    )
 
     def _params_to_ints(self, qs):
 
         return [int(str_id) for str_id in qs.split(',')]
 
+    def get_ordering(self):
+        """Return the requested ordering with id as tie breaker"""
+        ordering = self.request.query_params.get(
+            'ordering', self.default_ordering
+        )
+        field = ordering.lstrip('-')
+        if field not in self.ordering_fields:
+            raise ValidationError({'ordering': f'Invalid ordering {ordering}'})
+
+        direction = '-' if ordering.startswith('-') else ''
+        # The summary primary key is the recipe id
+        id_field = 'recipe_id' if self._use_summaries() else 'id'
+        if field == 'id':
+            return (f'{direction}{id_field}',)
+
+        return (f'{direction}{field}', f'{direction}{id_field}')
+
+    def _filter_ranges(self, queryset):
+        """Apply the price and time range query params"""
+        for param, lookup, field in self.range_filters:
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                value = field.to_internal_value(value)
+            except ValidationError as exc:
+                raise ValidationError({param: exc.detail})
+            queryset = queryset.filter(**{lookup: value})
+
+        return queryset
+
+    def _use_summaries(self):
+        """Whether a list is read from the summary table"""
+        return self.action == 'list' and bool(
+            int(self.request.query_params.get('summary', 0))
+        )
+
+    def _get_summary_queryset(self):
+        """Return summaries filtered like get_queryset filters recipes"""
+        tags = self.request.query_params.get('tags')
+        ingredients = self.request.query_params.get('ingredients')
+        search = self.request.query_params.get('search')
+        queryset = RecipeSummary.objects.all()
+
+        if tags:
+            queryset = queryset.filter(
+                recipe_id__in=Recipe.tags.through.objects.filter(
+                    tag_id__in=self._params_to_ints(tags)
+                ).values('recipe_id')
+            )
+
+        if ingredients:
+            queryset = queryset.filter(
+                recipe_id__in=Recipe.ingredients.through.objects.filter(
+                    ingredients_id__in=self._params_to_ints(ingredients)
+                ).values('recipe_id')
+            )
+
+        if search:
+            queryset = queryset.filter(title__icontains=search)
+
+        queryset = self._filter_ranges(queryset)
+
+        return queryset.filter(
+            user=self.request.user
+        ).order_by(*self.get_ordering())
+
     def get_queryset(self):
+        if self._use_summaries():
+            return self._get_summary_queryset()
 
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        search = self.request.query_params.get('search')
         queryset = self.queryset
 
         if tags:
@@ -76,7 +262,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
             ingredient_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
 
-        return queryset.filter(user=self.request.user)
+        if search:
+            queryset = queryset.filter(title__icontains=search)
+
+        queryset = self._filter_ranges(queryset)
+
+        return queryset.filter(
+            user=self.request.user
+        ).prefetch_related('tags', 'ingredients').order_by(
+            *self.get_ordering()
+        )
 
     def get_serializer_class(self):
 
@@ -86,13 +281,192 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if self.action == 'upload_image':
             return serializers.RecipeImageSerializer
 
+        if self.action == 'bulk_clone':
+            return serializers.RecipeCloneSerializer
+
+        if self._use_summaries():
+            return serializers.RecipeSummarySerializer
+
         return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            partial(super().list, request, *args, **kwargs)
+        )
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """Create a recipe, replaying the response for a retried key"""
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Create a recipe with authenticated user"""
         serializer.save(user=self.request.user)
 
+    def _facets_cache_key(self):
+        """Return the per user cache key for the current filter state"""
+        params = sorted(
+            (key, value)
+            for key, values in self.request.query_params.lists()
+            for value in values
+        )
+        digest = hashlib.md5(repr(params).encode()).hexdigest()
+
+        return f'recipe-facets:{self.request.user.pk}:{digest}'
+
+    def _count_facets(self):
+        """Count tags and ingredients over the filtered recipes"""
+        recipe_ids = self.get_queryset().values('id')
+
+        tags = Recipe.tags.through.objects.filter(
+            recipe__in=recipe_ids
+        ).values('tag_id').annotate(
+            kind=Value('tags', output_field=CharField()),
+            count=Count('recipe_id'),
+        ).values_list('tag_id', 'tag__name', 'kind', 'count')
+
+        ingredients = Recipe.ingredients.through.objects.filter(
+            recipe__in=recipe_ids
+        ).values('ingredients_id').annotate(
+            kind=Value('ingredients', output_field=CharField()),
+            count=Count('recipe_id'),
+        ).values_list('ingredients_id', 'ingredients__name', 'kind', 'count')
+
+        facets = {'tags': [], 'ingredients': []}
+        for obj_id, name, kind, count in tags.union(ingredients, all=True):
+            facets[kind].append({'id': obj_id, 'name': name, 'count': count})
+
+        for counts in facets.values():
+            counts.sort(key=lambda item: (-item['count'], item['name'],
+                                          item['id']))
+
+        return facets
+
+    @action(methods=['GET'], detail=False)
+    def facets(self, request):
+        """Return tag and ingredient counts for the filtered recipes"""
+        return self.cached_response(self._facets_response)
+
+    def _facets_response(self):
+        timeout = getattr(settings, 'RECIPE_FACETS_CACHE_TIMEOUT', 0)
+        if not timeout:
+            return Response(self._count_facets())
+
+        key = self._facets_cache_key()
+        facets = cache.get(key)
+        if facets is None:
+            facets = self._count_facets()
+            cache.set(key, facets, timeout)
+
+        return Response(facets)
+
+    @action(methods=['GET'], detail=False, url_path='shopping-list')
+    def shopping_list(self, request):
+        """Return the ingredients of the recipes in the recipes param
+
+        Each ingredient appears once with the number of selected recipes
+        using it. Recipes of other users are ignored.
+        """
+        try:
+            recipe_ids = self._params_to_ints(
+                request.query_params.get('recipes', '')
+            )
+        except ValueError:
+            raise ValidationError(
+                {'recipes': 'A comma separated list of ids is required.'}
+            )
+        if len(recipe_ids) > self.shopping_list_max_recipes:
+            raise ValidationError({'recipes': (
+                f'At most {self.shopping_list_max_recipes} recipes can be '
+                f'selected.'
+            )})
+
+        ingredients = Recipe.ingredients.through.objects.filter(
+            recipe_id__in=recipe_ids, recipe__user=request.user
+        ).values('ingredients_id').annotate(
+            recipe_count=Count('recipe_id')
+        ).order_by('ingredients__name', 'ingredients_id').values_list(
+            'ingredients_id', 'ingredients__name', 'recipe_count'
+        )
+
+        return Response([
+            {'id': ingredient_id, 'name': name, 'recipe_count': count}
+            for ingredient_id, name, count in ingredients
+        ])
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """Return the recipes sharing the most ingredients and tags"""
+        # Imported here so workers that never serve it skip loading numpy
+        from recipe.similarity import similarity_indexes
+
+        recipe = self.get_object()
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+
+        index = similarity_indexes.get(request.user.pk)
+        scores = dict(index.similar(recipe.pk, max(limit, 0)))
+        recipes = Recipe.objects.filter(
+            user=request.user, id__in=scores
+        ).prefetch_related('tags', 'ingredients').in_bulk()
+
+        results = serializers.RecipeSerailizer(
+            [recipes[pk] for pk in scores if pk in recipes], many=True
+        ).data
+        for item in results:
+            item['score'] = round(scores[item['id']], 4)
+
+        return Response(results)
+
+    @action(methods=['POST'], detail=True)
+    @idempotent
+    def clone(self, request, pk=None):
+        """Copy a recipe with its tags, ingredients and image"""
+        recipe = self.get_object()
+        clone_ids = clone_recipes(request.user, [recipe.pk])
+        clone = get_object_or_404(
+            Recipe.objects.prefetch_related('tags', 'ingredients'),
+            pk=clone_ids.get(recipe.pk)
+        )
+
+        return Response(serializers.RecipeDetailSerializer(clone).data,
+                        status=status.HTTP_201_CREATED)
+
+    @action(methods=['POST'], detail=False, url_path='clone')
+    @idempotent
+    def bulk_clone(self, request):
+        """Copy the recipes listed in recipes, in that order"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        if len(recipe_ids) > self.clone_max_recipes:
+            raise ValidationError({'recipes': (
+                f'At most {self.clone_max_recipes} recipes can be cloned.'
+            )})
+
+        owned = set(Recipe.objects.filter(
+            user=request.user, id__in=recipe_ids
+        ).values_list('id', flat=True))
+        missing = [pk for pk in recipe_ids if pk not in owned]
+        if missing:
+            raise ValidationError({'recipes': (
+                f'Unknown recipes: {", ".join(map(str, missing))}.'
+            )})
+
+        clone_ids = clone_recipes(request.user, recipe_ids)
+        clones = Recipe.objects.prefetch_related(
+            'tags', 'ingredients'
+        ).in_bulk(clone_ids.values())
+
+        return Response(serializers.RecipeSerailizer(
+            [clones[clone_ids[pk]] for pk in recipe_ids if pk in clone_ids],
+            many=True
+        ).data, status=status.HTTP_201_CREATED)
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
+    @idempotent
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
 
@@ -114,3 +488,151 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class UploadSessionViewSet(UserShardMixin,
+                           viewsets.GenericViewSet,
+                           mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin):
+    """Upload recipe images in resumable chunks
+
+    Create an upload for a recipe, PUT byte ranges of the file with
+    Content-Range and Content-Digest headers, then finalize it. Reading
+    an upload returns the offset to resume from.
+    """
+    serializer_class = serializers.UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        """Return the unexpired uploads of the authenticated user"""
+        return self.queryset.filter(user=self.request.user,
+                                    expires_at__gt=timezone.now())
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = uploads.create_session(
+            self.request.user, data['recipe'], data['filename'], data['size']
+        )
+
+    def update(self, request, *args, **kwargs):
+        """Write the byte range of the body into the uploaded file"""
+        upload = self.get_object()
+        start, end = uploads.parse_range(
+            request.META.get('HTTP_CONTENT_RANGE'), upload.size
+        )
+        if int(request.META.get('CONTENT_LENGTH') or 0) != end - start:
+            raise ValidationError(
+                {'Content-Length': 'The body must be the whole range.'}
+            )
+        digest = uploads.parse_digest(request.META.get('HTTP_CONTENT_DIGEST'))
+
+        # Streamed from the request, the body is never buffered whole
+        upload = uploads.write_chunk(upload, request.stream, start, end,
+                                     digest)
+
+        return Response(self.get_serializer(upload).data)
+
+    @action(methods=['POST'], detail=True)
+    def finalize(self, request, pk=None):
+        """Attach the complete upload to its recipe as the image"""
+        recipe = uploads.finalize(self.get_object())
+
+        return Response(serializers.RecipeImageSerializer(
+            recipe, context=self.get_serializer_context()
+        ).data)
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+
+
+class ChangeFeedView(UserShardMixin, APIView):
+    """Return changes to the user's library after the since cursor"""
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    cursor_field = fields.IntegerField(min_value=0)
+    limit_field = fields.IntegerField(min_value=1)
+
+    # Objects of each changed model and how they are serialized
+    sources = {
+        ChangeLog.RECIPE: (
+            Recipe.objects.prefetch_related('tags', 'ingredients'),
+            serializers.RecipeSerailizer,
+        ),
+        ChangeLog.TAG: (Tag.objects.all(), serializers.TagSerializer),
+        ChangeLog.INGREDIENT: (Ingredients.objects.all(),
+                               serializers.IngredientSerializer),
+    }
+
+    def _param(self, name, field, default):
+        try:
+            return field.to_internal_value(
+                self.request.query_params.get(name, default)
+            )
+        except ValidationError as exc:
+            raise ValidationError({name: exc.detail})
+
+    def _serialize(self, entries):
+        """Return current data of the changed objects by model and id"""
+        data = {}
+        for model, (queryset, serializer_class) in self.sources.items():
+            ids = [entry.object_id for entry in entries
+                   if entry.model == model and not entry.deleted]
+            if not ids:
+                continue
+            objects = queryset.filter(user=self.request.user, id__in=ids)
+            for item in serializer_class(objects, many=True).data:
+                data[model, item['id']] = item
+
+        return data
+
+    def get(self, request):
+        since = self._param('since', self.cursor_field, 0)
+        limit = min(
+            self._param('limit', self.limit_field,
+                        settings.CHANGE_FEED_PAGE_SIZE),
+            settings.CHANGE_FEED_MAX_PAGE_SIZE
+        )
+
+        if since and since < changes.horizon(request.user.pk):
+            return Response(
+                {'detail': 'Changes since this cursor were compacted, '
+                           'sync again from 0.',
+                 'reset': True},
+                status=status.HTTP_410_GONE
+            )
+
+        entries = list(ChangeLog.objects.filter(
+            user=request.user, seq__gt=since
+        ).order_by('seq')[:limit + 1])
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        # Only the latest entry of an object in the batch matters
+        latest = {}
+        for entry in entries:
+            latest[entry.model, entry.object_id] = entry
+        data = self._serialize(latest.values())
+
+        results = []
+        for entry in sorted(latest.values(), key=lambda entry: entry.seq):
+            item = data.get((entry.model, entry.object_id))
+            if item is None and not entry.deleted:
+                # Deleted since, its tombstone follows in a later batch
+                continue
+            results.append({
+                'seq': entry.seq,
+                'type': entry.model,
+                'id': entry.object_id,
+                'deleted': entry.deleted,
+                'data': item,
+            })
+
+        return Response({
+            'cursor': entries[-1].seq if entries else since,
+            'has_more': has_more,
+            'changes': results,
+        })
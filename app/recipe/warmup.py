@@ -0,0 +1,125 @@
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.urls import reverse
+
+from core.batch import dispatch
+from core.metrics import mark_login
+from jobs.queue import enqueue
+
+logger = logging.getLogger(__name__)
+
+# Reads a client makes right after logging in, warmed in this order
+WARM_URL_NAMES = (
+    'recipe:tag-list',
+    'recipe:ingredients-list',
+    'recipe:recipe-list',
+    'recipe:recipe-facets',
+)
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    """Return the thread pool and the semaphore bounding its warm-ups"""
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _slots = threading.BoundedSemaphore(
+                settings.LOGIN_WARMUP_CONCURRENCY
+            )
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.LOGIN_WARMUP_CONCURRENCY,
+                thread_name_prefix='warmup',
+            )
+
+    return _executor, _slots
+
+
+def _build_request(user, path, host, scheme):
+    """Return a GET request for path authenticated as user"""
+    request = WSGIRequest({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'HTTP_HOST': host,
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.url_scheme': scheme,
+    })
+    request._force_auth_user = user
+
+    return request
+
+
+def warm_user(user_id, host, scheme):
+    """Run the first reads of a user so their responses get cached
+
+    No read is started once LOGIN_WARMUP_BUDGET seconds have passed.
+    Returns the url names that were warmed.
+    """
+    deadline = time.monotonic() + settings.LOGIN_WARMUP_BUDGET
+    user = get_user_model().objects.filter(pk=user_id,
+                                           is_active=True).first()
+    if user is None:
+        return []
+
+    warmed = []
+    for name in WARM_URL_NAMES:
+        if time.monotonic() >= deadline:
+            logger.info('Warm-up of user %s out of time before %s',
+                        user_id, name)
+            break
+        request = _build_request(user, reverse(name), host, scheme)
+        if dispatch(request)['status'] == 200:
+            warmed.append(name)
+
+    return warmed
+
+
+def _warm_in_thread(slots, user_id, host, scheme):
+    try:
+        warm_user(user_id, host, scheme)
+    except Exception:
+        logger.exception('Warm-up of user %s failed', user_id)
+    finally:
+        slots.release()
+        close_old_connections()
+
+
+def warm_after_login(request, user):
+    """Warm the response cache of a user who just logged in
+
+    LOGIN_WARMUP picks 'thread' to warm in this process or 'queue' for a
+    background job. Logins past LOGIN_WARMUP_CONCURRENCY running thread
+    warm-ups are not warmed. Returns whether a warm-up was started.
+    """
+    mode = settings.LOGIN_WARMUP
+    warmed = False
+    if mode and settings.RESPONSE_CACHE_TIMEOUT:
+        host, scheme = request.get_host(), request.scheme
+        if mode == 'queue':
+            enqueue('recipe.tasks.warm_user', {
+                'user_id': user.pk, 'host': host, 'scheme': scheme,
+            })
+            warmed = True
+        else:
+            executor, slots = _get_executor()
+            if slots.acquire(blocking=False):
+                executor.submit(_warm_in_thread, slots, user.pk, host,
+                                scheme)
+                warmed = True
+
+    if settings.METRICS_ENABLED:
+        mark_login(user.pk, warmed)
+
+    return warmed
@@ -0,0 +1,9 @@
+from core.async_views import async_api_view
+
+from user.serializers import UserSerialiser
+
+
+@async_api_view
+async def manage_user(request, user):
+    """Return the authenticated user"""
+    return UserSerialiser(user).data
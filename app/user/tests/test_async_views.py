@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+ME_ASYNC_URL = reverse('user:me-async')
+
+
+class AsyncManageUserTests(TransactionTestCase):
+    """Test the async profile endpoint"""
+
+    def test_retrieve_profile(self):
+        """Test retrieving the authenticated users profile"""
+        user = get_user_model().objects.create_user(
+            email='zohaib@123.com',
+            password='zohaib123',
+            name='zohaib',
+        )
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = client.get(ME_ASYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), {'name': user.name, 'email': user.email})
+
+    def test_login_required(self):
+        """Test that authentication is required"""
+        res = APIClient().get(ME_ASYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from user import views
+from user import async_views, views
 
 app_name = 'user'
 
@@ -8,4 +8,5 @@ urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name="create"),
     path('token/', views.CreateTokenView.as_view(), name="token"),
     path('me/', views.ManageUserView.as_view(), name='me'),
+    path('me/async/', async_views.manage_user, name='me-async'),
 ]
@@ -1,7 +1,10 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, authentication, permissions, status
+from rest_framework.response import Response
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core.idempotency import idempotent
 from user.serializers import UserSerialiser, AuthTokkenSerializer
 
 
@@ -9,14 +12,31 @@ class CreateUserView(generics.CreateAPIView):
     """Creates a new user in the system"""
     serializer_class = UserSerialiser
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """Create a user, replaying the response for a retried key"""
+        return super().create(request, *args, **kwargs)
+
 
 class CreateTokenView(ObtainAuthToken):
     """"Create a new auth token for the user"""
     serializer_class = AuthTokkenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        """Create a token and warm the caches the client reads next"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, _ = Token.objects.get_or_create(user=user)
+
+        from recipe.warmup import warm_after_login
+        warm_after_login(request, user)
+
+        return Response({'token': token.key})
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserSerialiser
     authentication_classes = (authentication.TokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
@@ -24,3 +44,10 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         """Retrieve and return authentivate user"""
         return self.request.user
+
+    def destroy(self, request, *args, **kwargs):
+        """Deactivate the user, their data is deleted in the background"""
+        from core.purge import schedule_user_purge
+        schedule_user_purge(self.get_object())
+
+        return Response(status=status.HTTP_202_ACCEPTED)